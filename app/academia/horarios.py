@@ -0,0 +1,243 @@
+'''
+Detecção de conflitos nos horários das turmas.
+
+Um professor não pode dar duas aulas ao mesmo tempo: dois Horario
+activos de turmas activas do mesmo professor, no mesmo dia da semana,
+não se podem sobrepor. As aulas ocupam [hora_inicio, hora_fim): quem
+acaba às 10:00 não colide com quem começa às 10:00.
+
+IndiceHorarios guarda os horários em memória, numa árvore de intervalos
+por (professor, dia da semana), e responde a "com que aulas colide este
+horário?" em O(log n + k) sem voltar à base de dados. É usado de duas
+formas:
+  - ao gravar: um listener before_flush recusa (HorarioSobreposto)
+    qualquer Horario novo ou alterado que colida com outro, e também
+    uma Turma que mude de professor ou volte a estar activa se os seus
+    horários colidirem com os do professor;
+  - em lote: relatorio_conflitos() lista todas as sobreposições já
+    existentes (comando `flask validar-horarios`).
+'''
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import time
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.academia.models import DiaSemanaEnum, Horario, Turma
+
+# (id, turma_id, professor_id, dia_semana, hora_inicio, hora_fim)
+LinhaHorario = Tuple[int, int, int, DiaSemanaEnum, time, time]
+
+
+def _segundos(hora: time) -> int:
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+class ArvoreIntervalos:
+    '''
+    Árvore de intervalos [inicio, fim) construída de uma vez.
+
+    Os intervalos ficam ordenados pelo início em listas paralelas; a
+    árvore é implícita (a raiz de [lo, hi) é o elemento do meio) e cada
+    nó guarda o maior fim da sua subárvore. A procura desce só pelas
+    subárvores que podem ter sobreposições: O(log n + k), com k o número
+    de intervalos encontrados.
+    '''
+
+    def __init__(self, intervalos: Iterable[Tuple[int, int, int]]):
+        # (inicio, fim, id)
+        ordenados = sorted(intervalos)
+        self._inicios = [i for i, _, _ in ordenados]
+        self._fins = [f for _, f, _ in ordenados]
+        self._ids = [ident for _, _, ident in ordenados]
+        self._max_fim = [0] * len(ordenados)
+        self._construir(0, len(ordenados))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _construir(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return -1
+        meio = (lo + hi) // 2
+        self._max_fim[meio] = max(self._fins[meio],
+                                  self._construir(lo, meio),
+                                  self._construir(meio + 1, hi))
+        return self._max_fim[meio]
+
+    def sobrepostos(self, inicio: int, fim: int) -> List[int]:
+        '''Ids dos intervalos que se sobrepõem a [inicio, fim).'''
+        encontrados = []
+        pilha = [(0, len(self._ids))]
+        while pilha:
+            lo, hi = pilha.pop()
+            if lo >= hi:
+                continue
+            meio = (lo + hi) // 2
+            # nada nesta subárvore acaba depois de `inicio`
+            if self._max_fim[meio] <= inicio:
+                continue
+            pilha.append((lo, meio))
+            # à direita todos começam depois deste; se este já começa
+            # depois de `fim`, também eles
+            if self._inicios[meio] < fim:
+                if self._fins[meio] > inicio:
+                    encontrados.append(self._ids[meio])
+                pilha.append((meio + 1, hi))
+        return encontrados
+
+
+@dataclass(frozen=True)
+class ConflitoHorario:
+    professor_id: int
+    dia_semana: DiaSemanaEnum
+    horario_id: int
+    outro_id: int
+
+    def to_dict(self):
+        return {
+            'professor_id': self.professor_id,
+            'dia_semana': self.dia_semana.value,
+            'horario_id': self.horario_id,
+            'outro_id': self.outro_id,
+        }
+
+
+class HorarioSobreposto(ValueError):
+    '''Um horário colide com outro do mesmo professor no mesmo dia.'''
+
+    def __init__(self, conflitos: Sequence[ConflitoHorario]):
+        self.conflitos = list(conflitos)
+        descricao = ', '.join(
+            f'{c.horario_id or "novo"} com {c.outro_id or "novo"} ({c.dia_semana.value})'
+            for c in self.conflitos)
+        super().__init__(f'Horários sobrepostos para o professor: {descricao}.')
+
+
+def consulta_horarios_activos():
+    '''SELECT das linhas (LinhaHorario) dos horários activos de turmas activas.'''
+    return (select(Horario.id, Horario.turma_id, Turma.professor_id,
+                   Horario.dia_semana, Horario.hora_inicio, Horario.hora_fim)
+            .join(Turma, Horario.turma_id == Turma.id)
+            .where(Horario.activo.is_(True), Turma.activo.is_(True),
+                   Turma.professor_id.is_not(None)))
+
+
+class IndiceHorarios:
+    '''
+    Horários activos por (professor, dia da semana), em memória.
+
+    Uso:
+        indice = IndiceHorarios.carregar()
+        indice.conflitos(professor_id, DiaSemanaEnum.segunda,
+                         time(9), time(10))
+    '''
+
+    def __init__(self, linhas: Iterable[LinhaHorario] = ()):
+        self._horarios: Dict[int, LinhaHorario] = {}
+        por_chave: Dict[Tuple[int, DiaSemanaEnum], List] = defaultdict(list)
+        for linha in linhas:
+            horario_id, _, professor_id, dia, inicio, fim = linha
+            self._horarios[horario_id] = linha
+            por_chave[(professor_id, dia)].append(
+                (_segundos(inicio), _segundos(fim), horario_id))
+        self._arvores = {chave: ArvoreIntervalos(intervalos)
+                         for chave, intervalos in por_chave.items()}
+
+    @classmethod
+    def carregar(cls, professor_ids: Optional[Iterable[int]] = None) -> 'IndiceHorarios':
+        '''Lê numa só consulta os horários activos (de todos ou só destes professores).'''
+        stmt = consulta_horarios_activos()
+        if professor_ids is not None:
+            stmt = stmt.where(Turma.professor_id.in_(list(professor_ids)))
+        return cls(db.session.execute(stmt).tuples())
+
+    def conflitos(self, professor_id: int, dia: DiaSemanaEnum, inicio: time,
+                  fim: time, ignorar: Optional[int] = None) -> List[int]:
+        '''Ids dos horários do professor, nesse dia, que colidem com [inicio, fim).'''
+        arvore = self._arvores.get((professor_id, dia))
+        if arvore is None:
+            return []
+        return sorted(h for h in arvore.sobrepostos(_segundos(inicio), _segundos(fim))
+                      if h != ignorar)
+
+    def todos_conflitos(self) -> List[ConflitoHorario]:
+        '''Cada par de horários sobrepostos, uma vez (horario_id < outro_id).'''
+        resultado = []
+        for horario_id, _, professor_id, dia, inicio, fim in self._horarios.values():
+            resultado.extend(
+                ConflitoHorario(professor_id, dia, horario_id, outro)
+                for outro in self.conflitos(professor_id, dia, inicio, fim)
+                if outro > horario_id)
+        return sorted(resultado, key=lambda c: (c.professor_id, c.horario_id, c.outro_id))
+
+
+def relatorio_conflitos() -> List[ConflitoHorario]:
+    '''Valida o horário inteiro: todas as sobreposições entre horários activos.'''
+    return IndiceHorarios.carregar().todos_conflitos()
+
+
+def validar_horarios(session, horarios: Sequence[Horario]) -> None:
+    '''
+    Levanta ValueError se algum dos horários (por gravar) tiver hora_fim
+    antes de hora_inicio, ou HorarioSobreposto se colidir com um horário
+    já gravado ou com outro da mesma lista.
+    '''
+    pendentes: List[LinhaHorario] = []
+    for n, horario in enumerate(horarios):
+        if horario.hora_inicio is None or horario.hora_fim is None:
+            continue
+        if horario.hora_fim <= horario.hora_inicio:
+            raise ValueError('A hora de fim deve ser posterior à hora de início.')
+        turma = horario.turma or (session.get(Turma, horario.turma_id)
+                                  if horario.turma_id else None)
+        if turma is None or turma.activo is False or turma.professor_id is None:
+            continue
+        # os horários novos ainda não têm id; ids negativos não colidem
+        pendentes.append((horario.id or -(n + 1), turma.id, turma.professor_id,
+                          horario.dia_semana, horario.hora_inicio, horario.hora_fim))
+    if not pendentes:
+        return
+
+    ids = {linha[0] for linha in pendentes}
+    stmt = consulta_horarios_activos().where(
+        Turma.professor_id.in_({linha[2] for linha in pendentes}),
+        Horario.dia_semana.in_({linha[3] for linha in pendentes}))
+    gravados = [linha for linha in session.execute(stmt).tuples()
+                if linha[0] not in ids]
+    indice = IndiceHorarios(chain(gravados, pendentes))
+
+    # nos conflitos, um horário novo (id negativo) aparece com id 0
+    conflitos = [ConflitoHorario(professor_id, dia, max(horario_id, 0), max(outro, 0))
+                 for horario_id, _, professor_id, dia, inicio, fim in pendentes
+                 for outro in indice.conflitos(professor_id, dia, inicio, fim,
+                                               ignorar=horario_id)]
+    if conflitos:
+        raise HorarioSobreposto(conflitos)
+
+
+def _turma_reatribuida(turma: Turma) -> bool:
+    '''True se a turma mudou de professor ou de estado (activo) por gravar.'''
+    estado = inspect(turma)
+    return any(estado.attrs[nome].history.has_changes()
+               for nome in ('professor_id', 'activo'))
+
+
+@event.listens_for(Session, 'before_flush')
+def _validar_ao_gravar(session, flush_context, instances):
+    with session.no_autoflush:
+        horarios = [obj for obj in chain(session.new, session.dirty)
+                    if isinstance(obj, Horario) and obj.activo is not False]
+        # os horários de uma turma que muda de professor ou é reactivada
+        # passam a contar para o professor (novo)
+        for turma in session.dirty:
+            if (isinstance(turma, Turma) and turma.activo is not False
+                    and _turma_reatribuida(turma)):
+                horarios.extend(h for h in turma.horarios
+                                if h.activo is not False and h not in horarios)
+        if horarios:
+            validar_horarios(session, horarios)
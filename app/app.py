@@ -4,8 +4,25 @@ from app.extensions import db, ma, migrate, jwt, login_manager, admin, mail
 from app.autenticacao.routes import autenticacao_bp
 from app.publico.routes import publico_bp
 from app.relatorios.routes import relatorio_bp
-
-from app.cli import criar_admin  # importa o comando
+from app.utilizadores.routes import utilizadores_bp
+from app.hotel.routes import hotel_bp
+from app.hotel.cache import cache_hotel
+from app.hotel.libertacao import libertacao_quartos
+from app.relatorios.cache import cache_relatorios
+from app.historico.outbox import outbox_historico
+from app.academia import horarios  # noqa: F401  (valida os horários ao gravar)
+
+from app.cli import (  # importa os comandos
+    criar_admin,
+    reconstruir_resumo_pagamentos,
+    exportar_pagamentos_parquet,
+    importar_pagamentos_cmd,
+    gerar_mensalidades_cmd,
+    reconciliar_pagamentos_cmd,
+    recalcular_tarifas_cmd,
+    libertar_quartos_cmd,
+    validar_horarios_cmd,
+)
 from datetime import datetime
 
 
@@ -28,7 +45,19 @@ def create_app(config_name='desenvolvimento'):
     login_manager.init_app(app)
     admin.init_app(app)
     app.cli.add_command(criar_admin)
+    app.cli.add_command(reconstruir_resumo_pagamentos)
+    app.cli.add_command(exportar_pagamentos_parquet)
+    app.cli.add_command(importar_pagamentos_cmd)
+    app.cli.add_command(gerar_mensalidades_cmd)
+    app.cli.add_command(reconciliar_pagamentos_cmd)
+    app.cli.add_command(recalcular_tarifas_cmd)
+    app.cli.add_command(libertar_quartos_cmd)
+    app.cli.add_command(validar_horarios_cmd)
     mail.init_app(app)
+    cache_relatorios.init_app(app)
+    cache_hotel.init_app(app)
+    outbox_historico.init_app(app)
+    libertacao_quartos.init_app(app)
 
     @login_manager.user_loader
     def load_user(user_id):
@@ -63,6 +92,8 @@ def create_app(config_name='desenvolvimento'):
 
     # Registar os blueprints das outras rotas
     app.register_blueprint(relatorio_bp, url_prefix='/perfil')
+    app.register_blueprint(utilizadores_bp, url_prefix='/utilizadores')
+    app.register_blueprint(hotel_bp)
 
     from datetime import datetime, timezone
 
@@ -47,3 +47,178 @@ def criar_admin(nome, sobrenome, email, telefone, senha_hash, data_nascimento):
         click.echo('Já existe um administrador')
     except:
         db.session.rollback()
+
+
+@click.command('reconstruir-resumo-pagamentos')
+@with_appcontext
+def reconstruir_resumo_pagamentos():
+    '''Recalcula do zero os resumos de pagamentos (mensal e por utilizador)'''
+
+    from app.relatorios.services import reconstruir_resumo_mensal
+    from app.pagamentos.services import reconstruir_resumo_utilizadores
+
+    linhas = reconstruir_resumo_mensal()
+    click.echo(f'Resumo mensal reconstruído: {linhas} linhas.')
+
+    utilizadores = reconstruir_resumo_utilizadores()
+    click.echo(f'Resumo por utilizador reconstruído: {utilizadores} utilizadores.')
+
+
+@click.command('exportar-pagamentos-parquet')
+@click.argument('inicio')
+@click.argument('fim')
+@click.argument('destino', type=click.Path(dir_okay=False, writable=True))
+@with_appcontext
+def exportar_pagamentos_parquet(inicio, fim, destino):
+    '''Exporta os pagamentos entre INICIO e FIM (AAAA-MM-DD) para Parquet'''
+
+    from app.relatorios.services import exportar_parquet
+    from datetime import datetime, time
+
+    inicio = datetime.strptime(inicio, '%Y-%m-%d')
+    fim = datetime.combine(datetime.strptime(fim, '%Y-%m-%d'), time.max)
+
+    total = exportar_parquet(inicio, fim, destino)
+    click.echo(f'{total} pagamentos exportados para {destino}')
+
+
+@click.command('importar-pagamentos')
+@click.argument('ficheiro', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--lote', default=1000, show_default=True,
+              help='Pagamentos gravados por transacção.')
+@with_appcontext
+def importar_pagamentos_cmd(ficheiro, lote):
+    '''Importa pagamentos de um CSV (utilizador_id,valor,tipo_servico,metodo_pagamento,data_pagamento)'''
+
+    import csv
+    import time
+    from app.pagamentos.services import importar_pagamentos
+
+    inicio = time.perf_counter()
+    resultado = importar_pagamentos(csv.DictReader(ficheiro), tamanho_lote=lote)
+    duracao = time.perf_counter() - inicio
+
+    click.echo(f"{resultado['importados']} pagamentos importados, "
+               f"{resultado['rejeitados']} rejeitados em {duracao:.1f}s.")
+    for numero, motivo in resultado['erros'][:50]:
+        click.echo(f'  linha {numero}: {motivo}')
+    if len(resultado['erros']) > 50:
+        click.echo(f"  ... e mais {len(resultado['erros']) - 50} erros.")
+
+
+@click.command('gerar-mensalidades')
+@click.argument('referencia', metavar='ANO-MES')
+@click.option('--lote', default=1000, show_default=True,
+              help='Inscrições gravadas por transacção.')
+@click.option('--trabalhadores', default=4, show_default=True,
+              help='Threads a gravar blocos em paralelo.')
+@with_appcontext
+def gerar_mensalidades_cmd(referencia, lote, trabalhadores):
+    '''Gera as mensalidades do mês ANO-MES (AAAA-MM) para as inscrições activas'''
+
+    from app.pagamentos.mensalidades import gerar_mensalidades, ler_referencia
+
+    try:
+        ano, mes = ler_referencia(referencia)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='ANO-MES')
+
+    resultado = gerar_mensalidades(ano, mes, tamanho_bloco=lote,
+                                   trabalhadores=trabalhadores)
+
+    click.echo(f'{ano}-{mes:02d}: {resultado.criadas} mensalidades geradas, '
+               f'{resultado.existentes} já existentes, '
+               f'{resultado.inscricoes} inscrições em {resultado.blocos} blocos.')
+    click.echo(f'{resultado.duracao:.1f}s ({resultado.por_segundo:.0f} inscrições/s).')
+
+
+@click.command('reconciliar-pagamentos')
+@click.argument('extracto', type=click.Path(exists=True, dir_okay=False))
+@click.option('--inicio', help='Primeiro dia (AAAA-MM-DD); por omissão, o do extracto.')
+@click.option('--fim', help='Último dia (AAAA-MM-DD); por omissão, o do extracto.')
+@click.option('--tolerancia', default=0, show_default=True,
+              help='Dias de diferença aceites entre o extracto e o pagamento.')
+@click.option('--saida', type=click.Path(file_okay=False),
+              help='Pasta onde gravar os relatórios CSV.')
+@with_appcontext
+def reconciliar_pagamentos_cmd(extracto, inicio, fim, tolerancia, saida):
+    '''Concilia os pagamentos com um extracto bancário CSV (data,valor,metodo)'''
+
+    import csv
+    from datetime import date
+    from app.pagamentos.reconciliacao import (
+        escrever_relatorios, periodo_extracto, reconciliar)
+
+    def abrir():
+        return open(extracto, newline='', encoding='utf-8-sig')
+
+    if not inicio or not fim:
+        with abrir() as ficheiro:
+            periodo = periodo_extracto(csv.DictReader(ficheiro))
+        if periodo is None:
+            raise click.ClickException('O extracto não tem linhas válidas.')
+        inicio = inicio or periodo[0].isoformat()
+        fim = fim or periodo[1].isoformat()
+
+    try:
+        inicio, fim = date.fromisoformat(inicio), date.fromisoformat(fim)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    with abrir() as ficheiro:
+        resultado = reconciliar(csv.DictReader(ficheiro), inicio, fim,
+                                tolerancia_dias=tolerancia)
+
+    resumo = resultado.resumo()
+    click.echo(f'{inicio} a {fim}: {resumo["conciliados"]} conciliados, '
+               f'{resumo["extracto_sem_pagamento"]} linhas do extracto sem pagamento, '
+               f'{resumo["pagamentos_sem_extracto"]} pagamentos sem extracto, '
+               f'{resumo["erros"]} linhas inválidas.')
+
+    if saida:
+        for caminho in escrever_relatorios(resultado, saida):
+            click.echo(f'  {caminho}')
+
+
+@click.command('recalcular-tarifas')
+@click.option('--meses', type=int, help='Meses à frente (por omissão HOTEL_TARIFAS_MESES).')
+@with_appcontext
+def recalcular_tarifas_cmd(meses):
+    '''Recalcula a tabela de tarifas diárias do hotel a partir das regras'''
+
+    from app.hotel.tarifas import recalcular_tarifas
+
+    linhas = recalcular_tarifas(meses=meses)
+    click.echo(f'Tarifas diárias recalculadas: {linhas} linhas.')
+
+
+@click.command('libertar-quartos')
+@click.option('--lote', type=int,
+              help='Reservas por UPDATE (por omissão HOTEL_LIBERTACAO_LOTE).')
+@with_appcontext
+def libertar_quartos_cmd(lote):
+    '''Expira reservas do hotel por pagar e conclui os checkouts do dia'''
+
+    from app.hotel.libertacao import libertar_quartos
+
+    resultado = libertar_quartos(tamanho_lote=lote)
+    click.echo(f'{resultado.quartos_libertados} quartos libertados: '
+               f'{resultado.expiradas} reservas expiradas, '
+               f'{resultado.concluidas} checkouts.')
+
+
+@click.command('validar-horarios')
+@with_appcontext
+def validar_horarios_cmd():
+    '''Lista os horários sobrepostos do mesmo professor (sai com 1 se houver)'''
+
+    from app.academia.horarios import relatorio_conflitos
+
+    conflitos = relatorio_conflitos()
+    for conflito in conflitos:
+        click.echo(f'Professor {conflito.professor_id}, {conflito.dia_semana.value}: '
+                   f'horário {conflito.horario_id} sobrepõe-se ao horário {conflito.outro_id}')
+    if conflitos:
+        click.echo(f'{len(conflitos)} conflitos de horário.')
+        raise SystemExit(1)
+    click.echo('Sem conflitos de horário.')
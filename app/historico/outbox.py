@@ -0,0 +1,153 @@
+'''
+Fila (outbox) em memória para registos de histórico.
+
+Com HISTORICO_OUTBOX_ACTIVO, processar_pagamento não escreve o histórico
+na sua transacção: depois do commit do pagamento, o registo entra nesta
+fila e uma thread grava-o mais tarde, em lotes, com um único INSERT por
+lote. Assim cada pagamento custa um commit curto, e os commits do
+histórico são partilhados por muitos pagamentos.
+
+Se o INSERT do lote falhar, os registos são gravados um a um, para que
+um registo inválido não leve o lote inteiro; os que falham voltam à fila
+e são tentados de novo até HISTORICO_OUTBOX_TENTATIVAS vezes.
+
+Nota: a fila vive no processo. Registos ainda por gravar perdem-se se o
+processo terminar abruptamente; a fila é drenada no encerramento normal.
+'''
+import atexit
+import queue
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.historico.models import HistoricoAlteracaoPerfil
+
+
+class OutboxHistorico:
+
+    def __init__(self, tamanho_lote=200, intervalo=1.0, tentativas=3):
+        self.activo = False
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.tentativas = tentativas
+        self._fila: queue.Queue = queue.Queue()
+        self._app = None
+        self._thread: Optional[Thread] = None
+        self._parar = Event()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.activo = app.config.get('HISTORICO_OUTBOX_ACTIVO', False)
+        self.tamanho_lote = app.config.get(
+            'HISTORICO_OUTBOX_LOTE', self.tamanho_lote)
+        self.intervalo = app.config.get(
+            'HISTORICO_OUTBOX_INTERVALO', self.intervalo)
+        self.tentativas = app.config.get(
+            'HISTORICO_OUTBOX_TENTATIVAS', self.tentativas)
+        if self.activo:
+            atexit.register(self.parar)
+
+    def enfileirar(self, registo: Dict) -> None:
+        '''Agenda um registo (kwargs de HistoricoAlteracaoPerfil) para gravação.'''
+        registo.setdefault('data_alteracao', datetime.now(timezone.utc))
+        # (tentativas falhadas, registo)
+        self._fila.put((0, registo))
+        self._garantir_thread()
+
+    def pendentes(self) -> int:
+        return self._fila.qsize()
+
+    def drenar(self) -> int:
+        '''Grava já todos os registos pendentes. Retorna quantos gravou.'''
+        total = 0
+        while True:
+            lote = self._retirar_lote(bloquear=False)
+            if not lote:
+                return total
+            total += self._gravar(lote)
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._app is not None:
+            with self._app.app_context():
+                self.drenar()
+
+    def _garantir_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._parar.clear()
+                self._thread = Thread(target=self._executar, daemon=True,
+                                      name='outbox-historico')
+                self._thread.start()
+
+    def _retirar_lote(self, bloquear=True) -> List[Tuple[int, Dict]]:
+        lote = []
+        try:
+            lote.append(self._fila.get(
+                timeout=self.intervalo) if bloquear else self._fila.get_nowait())
+            while len(lote) < self.tamanho_lote:
+                lote.append(self._fila.get_nowait())
+        except queue.Empty:
+            pass
+        return lote
+
+    def _gravar(self, lote: List[Tuple[int, Dict]]) -> int:
+        '''
+        Grava o lote num só INSERT; se falhar, grava registo a registo e
+        devolve à fila os que falharem. Retorna quantos registos gravou.
+        '''
+        try:
+            db.session.execute(insert(HistoricoAlteracaoPerfil),
+                               [registo for _, registo in lote])
+            db.session.commit()
+            return len(lote)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(
+                f'Falha ao gravar {len(lote)} registos de histórico: {e}')
+            if len(lote) == 1:
+                self._repetir(*lote[0], e)
+                return 0
+
+        gravados = 0
+        for tentativas, registo in lote:
+            try:
+                db.session.execute(insert(HistoricoAlteracaoPerfil), [registo])
+                db.session.commit()
+                gravados += 1
+            except Exception as e:
+                db.session.rollback()
+                self._repetir(tentativas, registo, e)
+        return gravados
+
+    def _repetir(self, tentativas: int, registo: Dict, erro: Exception) -> None:
+        '''Devolve o registo à fila ou, esgotadas as tentativas, descarta-o.'''
+        tentativas += 1
+        if tentativas < self.tentativas:
+            self._fila.put((tentativas, registo))
+            return
+        # Futuramente deverá enviar logs para um serviço externo (ex.: Sentry)
+        current_app.logger.error(
+            f'Registo de histórico descartado após {tentativas} tentativas: '
+            f'{registo} ({erro})')
+
+    def _executar(self):
+        with self._app.app_context():  # type: ignore
+            while not self._parar.is_set():
+                lote = self._retirar_lote()
+                if lote:
+                    gravados = self._gravar(lote)
+                    db.session.remove()
+                    if gravados < len(lote):
+                        # dar tempo à base de dados antes de repetir
+                        self._parar.wait(self.intervalo)
+
+
+outbox_historico = OutboxHistorico()
@@ -8,6 +8,31 @@ from app.pagamentos.models import Pagamento
 from app.academia.models import Inscricao
 
 
+def adicionar_alteracao_perfil(
+    utilizador_id: int,
+    motivo: str,
+    perfil_antigo: Optional[str] = None,
+    perfil_novo: Optional[str] = None,
+    dados_extra: Optional[dict] = None,
+) -> HistoricoAlteracaoPerfil:
+    '''
+    Adiciona o registo de histórico à sessão, sem commit.
+
+    Para gravar o histórico na mesma transacção da operação que o origina
+    (ex.: processar_pagamento); o commit fica a cargo de quem chama.
+    '''
+    novo_registo = HistoricoAlteracaoPerfil(
+        utilizador_id=utilizador_id,  # type: ignore
+        motivo=motivo,  # type: ignore
+        perfil_antigo=perfil_antigo,  # type: ignore
+        perfil_novo=perfil_novo,  # type: ignore
+        data_alteracao=datetime.now(timezone.utc),  # type: ignore
+        dados_extra=dados_extra or {},  # type: ignore
+    )
+    db.session.add(novo_registo)
+    return novo_registo
+
+
 def registar_alteracao_perfil(
     utilizador_id: int,
     motivo: str,
@@ -36,16 +61,8 @@ def registar_alteracao_perfil(
     '''
 
     try:
-        novo_registo = HistoricoAlteracaoPerfil(
-            utilizador_id=utilizador_id,  # type: ignore
-            motivo=motivo,  # type: ignore
-            perfil_antigo=perfil_antigo,  # type: ignore
-            perfil_novo=perfil_novo,  # type: ignore
-            data_alteracao=datetime.now(timezone.utc),  # type: ignore
-            dados_extra=dados_extra or {},  # type: ignore
-        )
-
-        db.session.add(novo_registo)
+        adicionar_alteracao_perfil(
+            utilizador_id, motivo, perfil_antigo, perfil_novo, dados_extra)
         db.session.commit()
 
     except SQLAlchemyError as e:
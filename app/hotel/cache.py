@@ -0,0 +1,9 @@
+'''
+Cache do módulo hotel (calendário de ocupação, catálogo de quartos).
+
+Usa a mesma implementação da cache dos relatórios, com prefixo próprio:
+invalidar o hotel não afecta os relatórios e vice-versa.
+'''
+from app.relatorios.cache import CacheRelatorios
+
+cache_hotel = CacheRelatorios(prefixo='hotel')
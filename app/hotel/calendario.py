@@ -0,0 +1,91 @@
+'''
+Calendário de ocupação dos quartos (recepção).
+
+A ocupação de uma janela [inicio, fim) é uma matriz quartos × dias em que
+cada célula tem o id da reserva que ocupa essa noite (0 = livre). É
+calculada com uma consulta aos quartos e uma às reservas que tocam a
+janela, e preenchida sem percorrer dia a dia: cada reserva soma +id na
+coluna de entrada e -id na de saída, e a soma acumulada ao longo dos dias
+dá o id em todas as noites da estadia (as reservas de um quarto não se
+sobrepõem, por isso nunca se somam duas).
+
+O resultado fica em cache por janela e é invalidado sempre que se grava
+uma reserva (ver services.reservar_quarto).
+'''
+from datetime import date, timedelta
+from typing import Dict
+
+import numpy as np
+from sqlalchemy import select
+
+from app.extensions import db
+from app.hotel.disponibilidade import sobrepoe_periodo, validar_periodo
+from app.hotel.models import Quarto, ReservaHotel, TipoQuarto
+from app.hotel.tarifas import fatores_periodo
+from app.hotel.cache import cache_hotel
+
+MAX_DIAS_CALENDARIO = 93
+
+
+def grelha_ocupacao(inicio: date, fim: date):
+    '''
+    Devolve (quartos, grelha): a lista [(id, numero)] pela ordem das linhas
+    e a matriz int64 quartos × dias com o id da reserva de cada noite.
+    '''
+    validar_periodo(inicio, fim)
+    dias = (fim - inicio).days
+
+    quartos = db.session.execute(
+        select(Quarto.id, Quarto.numero).order_by(Quarto.numero)).tuples().all()
+    reservas = db.session.execute(
+        select(ReservaHotel.quarto_id, ReservaHotel.data_checkin,
+               ReservaHotel.data_checkout, ReservaHotel.id)
+        .where(sobrepoe_periodo(inicio, fim))).tuples().all()
+
+    # uma coluna a mais para as saídas no último dia da janela
+    grelha = np.zeros((len(quartos), dias + 1), dtype=np.int64)
+    if reservas and quartos:
+        linha_do_quarto = {quarto_id: i for i, (quarto_id, _) in enumerate(quartos)}
+        quarto_ids, checkins, checkouts, reserva_ids = zip(*reservas)
+        linhas = np.array([linha_do_quarto[q] for q in quarto_ids])
+        entradas = np.array([d.toordinal() for d in checkins]) - inicio.toordinal()
+        saidas = np.array([d.toordinal() for d in checkouts]) - inicio.toordinal()
+        ids = np.array(reserva_ids, dtype=np.int64)
+
+        np.add.at(grelha, (linhas, np.clip(entradas, 0, dias)), ids)
+        np.add.at(grelha, (linhas, np.clip(saidas, 0, dias)), -ids)
+        np.cumsum(grelha, axis=1, out=grelha)
+
+    return quartos, grelha[:, :dias]
+
+
+@cache_hotel.memorizar
+def calendario_ocupacao(inicio: date, fim: date) -> Dict:
+    '''
+    Calendário da janela [inicio, fim), pronto para JSON: dias, uma linha
+    por quarto com a reserva de cada noite (None = livre), a taxa de
+    ocupação de cada dia e o factor de preço de cada noite por tipo.
+    '''
+    dias = (fim - inicio).days
+    if dias > MAX_DIAS_CALENDARIO:
+        raise ValueError(
+            f'A janela do calendário não pode exceder {MAX_DIAS_CALENDARIO} dias.')
+
+    quartos, grelha = grelha_ocupacao(inicio, fim)
+    ocupados = (grelha > 0)
+    taxa = ocupados.mean(axis=0) if len(quartos) else np.zeros(dias)
+
+    return {
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'dias': [(inicio + timedelta(days=n)).isoformat() for n in range(dias)],
+        'quartos': [
+            {'id': quarto_id, 'numero': numero,
+             'reservas': [r or None for r in linha]}
+            for (quarto_id, numero), linha in zip(quartos, grelha.tolist())
+        ],
+        'taxa_ocupacao': np.round(taxa, 4).tolist(),
+        'noites_ocupadas': int(ocupados.sum()),
+        'fatores_preco': {tipo.value: np.round(fatores_periodo(tipo, inicio, fim), 4).tolist()
+                          for tipo in TipoQuarto},
+    }
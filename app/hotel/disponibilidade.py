@@ -0,0 +1,140 @@
+'''
+Disponibilidade dos quartos por datas.
+
+Uma reserva ocupa as noites de data_checkin (inclusive) a data_checkout
+(exclusive): quem sai num dia não impede quem entra nesse mesmo dia.
+Duas estadias [a, b) e [c, d) sobrepõem-se quando a < d e c < b.
+As reservas expiradas (não pagas a tempo, ver app/hotel/libertacao.py)
+já não ocupam o quarto.
+
+As consultas à base de dados usam essa condição sobre o índice
+ix_reservas_hotel_quarto_datas (quarto_id, data_checkin, data_checkout).
+Para o calendário, IndiceReservas carrega as reservas de uma janela numa
+única consulta e responde em memória, por busca binária, sem voltar à
+base de dados por cada quarto e dia.
+'''
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, exists, select
+
+from app.extensions import db
+from app.hotel.models import EstadoReservaHotel, Quarto, ReservaHotel
+
+
+def sobrepoe_periodo(checkin: date, checkout: date):
+    '''Condição SQL: a reserva ocupa alguma noite de [checkin, checkout).'''
+    return and_(ReservaHotel.data_checkin < checkout,
+                ReservaHotel.data_checkout > checkin,
+                ReservaHotel.estado != EstadoReservaHotel.expirada)
+
+
+def validar_periodo(checkin: date, checkout: date) -> None:
+    '''Levanta ValueError se o período não tiver pelo menos uma noite.'''
+    if checkin is None or checkout is None or checkout <= checkin:
+        raise ValueError(
+            'A data de checkout deve ser posterior à data de checkin.')
+
+
+def quartos_ocupados(checkin: date, checkout: date,
+                     quarto_ids: Optional[Iterable[int]] = None) -> Set[int]:
+    '''Ids dos quartos com alguma reserva entre checkin e checkout.'''
+    validar_periodo(checkin, checkout)
+    stmt = select(ReservaHotel.quarto_id).where(
+        sobrepoe_periodo(checkin, checkout)).distinct()
+    if quarto_ids is not None:
+        stmt = stmt.where(ReservaHotel.quarto_id.in_(list(quarto_ids)))
+    return set(db.session.scalars(stmt))
+
+
+def consulta_quartos_livres(checkin: date, checkout: date):
+    '''
+    SELECT dos quartos em serviço sem reservas no período (NOT EXISTS
+    correlacionado, resolvido pelo índice de cada quarto). Pode receber
+    mais filtros e ordenação antes de ser executado.
+    '''
+    validar_periodo(checkin, checkout)
+    ocupado = exists().where(ReservaHotel.quarto_id == Quarto.id,
+                             sobrepoe_periodo(checkin, checkout))
+    return select(Quarto).where(Quarto.disponivel.is_(True), ~ocupado)
+
+
+def quartos_livres(checkin: date, checkout: date) -> List[Quarto]:
+    '''Quartos em serviço livres em todas as noites de [checkin, checkout).'''
+    stmt = consulta_quartos_livres(checkin, checkout).order_by(Quarto.numero)
+    return list(db.session.scalars(stmt))
+
+
+def quarto_livre(quarto_id: int, checkin: date, checkout: date) -> bool:
+    '''True se o quarto existir, estiver em serviço e livre no período.'''
+    stmt = consulta_quartos_livres(checkin, checkout).where(
+        Quarto.id == quarto_id)
+    return db.session.scalars(stmt).first() is not None
+
+
+class IndiceReservas:
+    '''
+    Reservas de uma janela de datas, por quarto, em memória.
+
+    Dentro de cada quarto as reservas não se sobrepõem, por isso ficam
+    ordenadas por checkin e a busca de sobreposição é uma busca binária:
+    O(log r) por consulta, com r = reservas do quarto na janela.
+
+    Uso:
+        indice = IndiceReservas.carregar(date(2025, 3, 1), date(2025, 4, 1))
+        indice.livre(quarto_id, date(2025, 3, 10), date(2025, 3, 12))
+    '''
+
+    def __init__(self, inicio: date, fim: date,
+                 reservas: Iterable[Tuple[int, date, date, int]] = ()):
+        self.inicio = inicio
+        self.fim = fim
+        # quarto_id -> listas paralelas ordenadas por checkin
+        self._checkins: Dict[int, List[date]] = defaultdict(list)
+        self._checkouts: Dict[int, List[date]] = defaultdict(list)
+        self._ids: Dict[int, List[int]] = defaultdict(list)
+        for quarto_id, checkin, checkout, reserva_id in sorted(
+                reservas, key=lambda r: (r[0], r[1])):
+            self._checkins[quarto_id].append(checkin)
+            self._checkouts[quarto_id].append(checkout)
+            self._ids[quarto_id].append(reserva_id)
+
+    @classmethod
+    def carregar(cls, inicio: date, fim: date) -> 'IndiceReservas':
+        '''Lê numa só consulta as reservas que tocam [inicio, fim).'''
+        validar_periodo(inicio, fim)
+        stmt = (select(ReservaHotel.quarto_id, ReservaHotel.data_checkin,
+                       ReservaHotel.data_checkout, ReservaHotel.id)
+                .where(sobrepoe_periodo(inicio, fim)))
+        return cls(inicio, fim, db.session.execute(stmt).tuples())
+
+    def reserva_em(self, quarto_id: int, dia: date) -> Optional[int]:
+        '''Id da reserva que ocupa a noite de `dia`, ou None.'''
+        checkins = self._checkins.get(quarto_id)
+        if not checkins:
+            return None
+        # última reserva com checkin <= dia
+        i = bisect_right(checkins, dia) - 1
+        if i >= 0 and self._checkouts[quarto_id][i] > dia:
+            return self._ids[quarto_id][i]
+        return None
+
+    def livre(self, quarto_id: int, checkin: date, checkout: date) -> bool:
+        '''True se nenhuma reserva do quarto ocupa noites de [checkin, checkout).'''
+        if checkin < self.inicio or checkout > self.fim:
+            raise ValueError('Período fora da janela carregada.')
+        checkins = self._checkins.get(quarto_id)
+        if not checkins:
+            return True
+        # reservas [0, i) começam antes do checkout; sem sobreposições, a
+        # última delas é a que sai mais tarde e basta compará-la com o checkin
+        i = bisect_left(checkins, checkout)
+        return i == 0 or self._checkouts[quarto_id][i - 1] <= checkin
+
+    def ocupacao(self, quarto_id: int) -> List[Optional[int]]:
+        '''Reserva (ou None) de cada noite da janela, para o calendário.'''
+        dias = (self.fim - self.inicio).days
+        return [self.reserva_em(quarto_id, self.inicio + timedelta(days=n))
+                for n in range(dias)]
@@ -0,0 +1,167 @@
+'''
+Libertação automática dos quartos do hotel.
+
+Dois casos deixam um quarto livre sem que ninguém o marque à mão:
+  - reservas pendentes (por pagar) cujo prazo expira_em já passou:
+    passam a expiradas e deixam de ocupar o quarto;
+  - reservas confirmadas cuja data de checkout já chegou: passam a
+    concluídas (o quarto fica livre a partir dessa noite).
+
+libertar_quartos trata os dois casos em lotes, com um UPDATE ... WHERE id
+IN (...) RETURNING quarto_id por lote e um commit por lote, sem carregar
+as reservas como objectos. Corre pelo comando `flask libertar-quartos`
+(cron) ou numa thread da aplicação, com HOTEL_LIBERTACAO_ACTIVA.
+'''
+import atexit
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+from typing import Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from app.extensions import db
+from app.hotel.cache import cache_hotel
+from app.hotel.models import EstadoReservaHotel, ReservaHotel
+
+LOTE_LIBERTACAO = 500
+
+
+@dataclass
+class ResultadoLibertacao:
+    expiradas: int = 0
+    concluidas: int = 0
+    quartos: Set[int] = field(default_factory=set)
+
+    @property
+    def quartos_libertados(self) -> int:
+        return len(self.quartos)
+
+    def to_dict(self):
+        return {
+            'expiradas': self.expiradas,
+            'concluidas': self.concluidas,
+            'quartos_libertados': self.quartos_libertados,
+        }
+
+
+def _actualizar_em_lotes(condicao, novo_estado: EstadoReservaHotel,
+                         tamanho_lote: int) -> Tuple[int, Set[int]]:
+    '''
+    Passa a `novo_estado` as reservas que cumprem `condicao`, um lote de
+    cada vez. Retorna (reservas actualizadas, quartos dessas reservas).
+    '''
+    total, quartos = 0, set()
+    ultimo_id = 0
+    while True:
+        ids = db.session.scalars(
+            select(ReservaHotel.id)
+            .where(condicao, ReservaHotel.id > ultimo_id)
+            .order_by(ReservaHotel.id).limit(tamanho_lote)).all()
+        if not ids:
+            return total, quartos
+
+        # a condição repete-se no UPDATE: uma reserva paga entretanto
+        # (confirmar_reserva) já não é expirada
+        try:
+            lote = db.session.scalars(
+                update(ReservaHotel)
+                .where(ReservaHotel.id.in_(ids), condicao)
+                .values(estado=novo_estado)
+                .returning(ReservaHotel.quarto_id),
+                execution_options={'synchronize_session': False}).all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        total += len(lote)
+        quartos.update(lote)
+        ultimo_id = ids[-1]
+
+
+def libertar_quartos(agora: Optional[datetime] = None,
+                     tamanho_lote: Optional[int] = None) -> ResultadoLibertacao:
+    '''
+    Expira as reservas pendentes fora de prazo e conclui as estadias cujo
+    checkout já chegou (`agora`, por omissão o momento actual). Regista no
+    log quantos quartos foram libertados.
+    '''
+    agora = agora or datetime.now(timezone.utc)
+    tamanho_lote = tamanho_lote or current_app.config.get(
+        'HOTEL_LIBERTACAO_LOTE', LOTE_LIBERTACAO)
+    resultado = ResultadoLibertacao()
+
+    resultado.expiradas, quartos = _actualizar_em_lotes(
+        (ReservaHotel.estado == EstadoReservaHotel.pendente)
+        & (ReservaHotel.expira_em <= agora),
+        EstadoReservaHotel.expirada, tamanho_lote)
+    resultado.quartos |= quartos
+
+    resultado.concluidas, quartos = _actualizar_em_lotes(
+        (ReservaHotel.estado == EstadoReservaHotel.confirmada)
+        & (ReservaHotel.data_checkout <= agora.date()),
+        EstadoReservaHotel.concluida, tamanho_lote)
+    resultado.quartos |= quartos
+
+    if resultado.expiradas:
+        # as noites das reservas expiradas voltam a estar livres
+        cache_hotel.invalidar()
+
+    current_app.logger.info(
+        f'Libertação de quartos: {resultado.quartos_libertados} quartos libertados '
+        f'({resultado.expiradas} reservas expiradas, '
+        f'{resultado.concluidas} checkouts).')
+    return resultado
+
+
+class LibertacaoQuartos:
+    '''Corre libertar_quartos periodicamente numa thread da aplicação.'''
+
+    def __init__(self, intervalo=300.0):
+        self.activo = False
+        self.intervalo = intervalo
+        self._app = None
+        self._thread: Optional[Thread] = None
+        self._parar = Event()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.activo = app.config.get('HOTEL_LIBERTACAO_ACTIVA', False)
+        self.intervalo = app.config.get(
+            'HOTEL_LIBERTACAO_INTERVALO', self.intervalo)
+        if self.activo:
+            atexit.register(self.parar)
+            self.iniciar()
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._parar.clear()
+                self._thread = Thread(target=self._executar, daemon=True,
+                                      name='libertacao-quartos')
+                self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _executar(self):
+        with self._app.app_context():  # type: ignore
+            # corre logo no arranque e depois a cada intervalo
+            while True:
+                try:
+                    libertar_quartos()
+                except Exception as e:
+                    self._app.logger.error(  # type: ignore
+                        f'Falha na libertação automática de quartos: {e}')
+                finally:
+                    db.session.remove()
+                if self._parar.wait(self.intervalo):
+                    return
+
+
+libertacao_quartos = LibertacaoQuartos()
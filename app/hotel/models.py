@@ -1,9 +1,10 @@
 from __future__ import annotations
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from decimal import Decimal
-from extensions import Base
+from typing import List, Optional
+from app.extensions import Base
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Enum, Boolean, DECIMAL, DATE, ForeignKey, Numeric
+from sqlalchemy import DDL, Integer, String, Enum, Boolean, DECIMAL, DATE, DateTime, ForeignKey, Numeric, Index, event, func
 import enum
 
 
@@ -13,9 +14,24 @@ class TipoQuarto(enum.Enum):
     luxo = 'luxo'
 
 
+class EstadoReservaHotel(enum.Enum):
+    # pendente: à espera de pagamento até expira_em (ocupa o quarto)
+    pendente = 'pendente'
+    confirmada = 'confirmada'
+    # concluida: a data de checkout já passou
+    concluida = 'concluida'
+    # expirada: não foi paga a tempo; deixa de ocupar o quarto
+    expirada = 'expirada'
+
+
 class Quarto(Base):
     '''Tabela que representa os quartos disponíveis no hotel.'''
     __tablename__ = 'quartos'
+    __table_args__ = (
+        # pesquisa ordenada por preço (o id desempata a paginação)
+        Index('ix_quartos_preco', 'preco_diaria', 'id'),
+        Index('ix_quartos_tipo_preco', 'tipo', 'preco_diaria', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, autoincrement=True)
@@ -25,10 +41,12 @@ class Quarto(Base):
     preco_diaria: Mapped[Decimal] = mapped_column(
         Numeric(10, 2), nullable=False)
     capacidade: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    # quarto em serviço; a ocupação por datas vem das reservas
+    # (ver app/hotel/disponibilidade.py)
     disponivel: Mapped[bool] = mapped_column(
         Boolean, default=True, nullable=False)
 
-    reservas: Mapped['ReservaHotel'] = relationship(
+    reservas: Mapped[List['ReservaHotel']] = relationship(
         'ReservaHotel', back_populates='quarto')
 
     def __repr__(self):
@@ -38,6 +56,16 @@ class Quarto(Base):
 class ReservaHotel(Base):
     '''Tabela de reservas realizadas pelos clientes.'''
     __tablename__ = 'reservas_hotel'
+    __table_args__ = (
+        # sobreposição de datas por quarto: quarto_id = ? AND checkin < ? AND checkout > ?
+        Index('ix_reservas_hotel_quarto_datas',
+              'quarto_id', 'data_checkin', 'data_checkout'),
+        # calendário: reservas de todos os quartos que tocam uma janela
+        Index('ix_reservas_hotel_checkin', 'data_checkin'),
+        # libertação automática: pendentes por expira_em, confirmadas por checkout
+        Index('ix_reservas_hotel_estado_expira', 'estado', 'expira_em'),
+        Index('ix_reservas_hotel_estado_checkout', 'estado', 'data_checkout'),
+    )
 
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, autoincrement=True)
@@ -45,13 +73,99 @@ class ReservaHotel(Base):
         Integer, ForeignKey('utilizadores.id'), nullable=False)
     quarto_id: Mapped[int] = mapped_column(
         Integer, ForeignKey('quartos.id'), nullable=False)
-    data_checkin: Mapped[datetime] = mapped_column(DATE, nullable=False)
-    data_checkout: Mapped[datetime] = mapped_column(DATE, nullable=False)
+    data_checkin: Mapped[date] = mapped_column(DATE, nullable=False)
+    data_checkout: Mapped[date] = mapped_column(DATE, nullable=False)
     total: Mapped[Decimal] = mapped_column(DECIMAL, nullable=False)
-    criado_em: Mapped[datetime] = mapped_column(
-        DATE, default=datetime.now(timezone.utc))
+    criado_em: Mapped[date] = mapped_column(
+        DATE, nullable=False, default=lambda: datetime.now(timezone.utc).date(),
+        server_default=func.current_date())
+    estado: Mapped[EstadoReservaHotel] = mapped_column(
+        Enum(EstadoReservaHotel), nullable=False,
+        default=EstadoReservaHotel.confirmada, server_default='confirmada')
+    # fim do prazo de pagamento das reservas pendentes
+    expira_em: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True)
 
     quarto = relationship('Quarto', back_populates='reservas')
 
     def __repr__(self):
         return f'<Reserva {self.id} - Cliente {self.cliente_id}>'
+
+
+class RegraTarifa(Base):
+    '''
+    Regra de preço por noite: multiplica o preco_diaria do quarto.
+
+    Aplica-se às noites entre data_inicio e data_fim (inclusive; sem datas,
+    sempre), só nos dias da semana indicados (ex.: '45' = sexta e sábado,
+    0 = segunda-feira; vazio = todos) e só ao tipo de quarto indicado
+    (vazio = todos). Várias regras na mesma noite multiplicam-se.
+    '''
+    __tablename__ = 'regras_tarifa'
+
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    nome: Mapped[str] = mapped_column(String(100), nullable=False)
+    tipo: Mapped[Optional[TipoQuarto]] = mapped_column(
+        Enum(TipoQuarto), nullable=True)
+    data_inicio: Mapped[Optional[date]] = mapped_column(DATE, nullable=True)
+    data_fim: Mapped[Optional[date]] = mapped_column(DATE, nullable=True)
+    dias_semana: Mapped[Optional[str]] = mapped_column(String(7), nullable=True)
+    multiplicador: Mapped[Decimal] = mapped_column(
+        Numeric(6, 4), nullable=False)
+    activo: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+
+    def __repr__(self):
+        return f'<RegraTarifa {self.nome} x{self.multiplicador}>'
+
+
+class TarifaDiaria(Base):
+    '''
+    Factor de preço já calculado por (tipo de quarto, noite).
+
+    Tabela derivada de RegraTarifa, recalculada para os próximos meses
+    sempre que as regras mudam (ver app/hotel/tarifas.py).
+    '''
+    __tablename__ = 'tarifas_diarias'
+
+    tipo: Mapped[TipoQuarto] = mapped_column(
+        Enum(TipoQuarto), primary_key=True)
+    dia: Mapped[date] = mapped_column(DATE, primary_key=True)
+    fator: Mapped[Decimal] = mapped_column(Numeric(10, 6), nullable=False)
+
+
+# Nenhum quarto pode ter duas reservas nas mesmas noites, garantido pela
+# própria base de dados (e não só pela verificação em Python), para que
+# duas reservas simultâneas não passem ambas. As reservas expiradas não
+# contam: o quarto fica livre para outra reserva.
+# PostgreSQL: restrição de exclusão sobre daterange [checkin, checkout).
+event.listen(ReservaHotel.__table__, 'after_create', DDL(
+    'CREATE EXTENSION IF NOT EXISTS btree_gist; '
+    'ALTER TABLE reservas_hotel ADD CONSTRAINT ex_reservas_hotel_sobreposicao '
+    'EXCLUDE USING gist (quarto_id WITH =, '
+    'daterange(data_checkin, data_checkout) WITH &&) '
+    "WHERE (estado <> 'expirada')"
+).execute_if(dialect='postgresql'))
+
+# SQLite (sem EXCLUDE): triggers que abortam a escrita sobreposta. O
+# SQLite só tem uma escrita de cada vez, por isso a verificação no
+# trigger não sofre corridas.
+_SOBREPOSICAO_SQLITE = (
+    'SELECT 1 FROM reservas_hotel r WHERE r.quarto_id = NEW.quarto_id '
+    'AND r.data_checkin < NEW.data_checkout '
+    'AND r.data_checkout > NEW.data_checkin '
+    "AND r.estado != 'expirada'")
+
+event.listen(ReservaHotel.__table__, 'after_create', DDL(
+    'CREATE TRIGGER tr_reservas_hotel_sobreposicao_ins '
+    'BEFORE INSERT ON reservas_hotel '
+    f"WHEN NEW.estado != 'expirada' AND EXISTS ({_SOBREPOSICAO_SQLITE}) "
+    "BEGIN SELECT RAISE(ABORT, 'reserva sobreposta'); END"
+).execute_if(dialect='sqlite'))
+
+event.listen(ReservaHotel.__table__, 'after_create', DDL(
+    'CREATE TRIGGER tr_reservas_hotel_sobreposicao_upd '
+    'BEFORE UPDATE OF quarto_id, data_checkin, data_checkout, estado ON reservas_hotel '
+    f"WHEN NEW.estado != 'expirada' AND EXISTS ({_SOBREPOSICAO_SQLITE} AND r.id != NEW.id) "
+    "BEGIN SELECT RAISE(ABORT, 'reserva sobreposta'); END"
+).execute_if(dialect='sqlite'))
@@ -0,0 +1,184 @@
+'''
+Pesquisa de quartos com filtros, ordenada por preço e paginada.
+
+Filtros: tipo, capacidade mínima, intervalo de preço por noite e, se
+indicado, o período da estadia (só quartos livres em todas as noites).
+A paginação é por chave sobre (preco_diaria, id), apoiada nos índices
+ix_quartos_preco e ix_quartos_tipo_preco, por isso cada página custa o
+mesmo independentemente de quantas ficaram para trás.
+
+O catálogo (preço mínimo/máximo e capacidade máxima por tipo) fica em
+cache: serve os limites do formulário e evita ir à base de dados quando
+os filtros não podem ter resultados (ex.: capacidade acima da maior
+capacidade do tipo). Qualquer quarto criado, alterado ou apagado
+invalida a cache do hotel, para o catálogo não esconder quartos novos.
+'''
+import base64
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, select, tuple_
+from sqlalchemy.orm import Session, object_session
+
+from app.extensions import db
+from app.hotel.cache import cache_hotel
+from app.hotel.disponibilidade import consulta_quartos_livres
+from app.hotel.models import Quarto, TipoQuarto
+
+QUARTOS_POR_PAGINA = 20
+MAX_QUARTOS_POR_PAGINA = 100
+
+
+@dataclass
+class FiltrosQuartos:
+    tipo: Optional[TipoQuarto] = None
+    capacidade: Optional[int] = None
+    preco_min: Optional[Decimal] = None
+    preco_max: Optional[Decimal] = None
+    checkin: Optional[date] = None
+    checkout: Optional[date] = None
+
+
+@dataclass
+class PaginaQuartos:
+    itens: List[Quarto]
+    proximo_cursor: Optional[str] = None
+
+    @property
+    def tem_mais(self) -> bool:
+        return self.proximo_cursor is not None
+
+
+def ler_filtros(args) -> FiltrosQuartos:
+    '''Converte os parâmetros do pedido em filtros. Levanta ValueError.'''
+    def texto(nome):
+        return (args.get(nome) or '').strip() or None
+
+    def decimal(nome):
+        valor = texto(nome)
+        try:
+            return Decimal(valor) if valor else None
+        except InvalidOperation as e:
+            raise ValueError(f'{nome} inválido: {valor}') from e
+
+    tipo = texto('tipo')
+    if tipo and tipo not in TipoQuarto._member_names_:
+        raise ValueError(f'Tipo de quarto inválido: {tipo}')
+    capacidade = texto('capacidade')
+    checkin, checkout = texto('checkin'), texto('checkout')
+
+    return FiltrosQuartos(
+        tipo=TipoQuarto[tipo] if tipo else None,
+        capacidade=int(capacidade) if capacidade else None,
+        preco_min=decimal('preco_min'),
+        preco_max=decimal('preco_max'),
+        checkin=date.fromisoformat(checkin) if checkin else None,
+        checkout=date.fromisoformat(checkout) if checkout else None,
+    )
+
+
+@cache_hotel.memorizar
+def catalogo_quartos() -> Dict[str, Dict]:
+    '''Por tipo de quarto em serviço: quantidade, preço mínimo/máximo e capacidade máxima.'''
+    linhas = db.session.execute(
+        select(Quarto.tipo, func.count(Quarto.id), func.min(Quarto.preco_diaria),
+               func.max(Quarto.preco_diaria), func.max(Quarto.capacidade))
+        .where(Quarto.disponivel.is_(True))
+        .group_by(Quarto.tipo)).tuples()
+    return {
+        tipo.value: {'quantidade': quantidade, 'preco_min': preco_min,
+                     'preco_max': preco_max, 'capacidade_max': capacidade_max}
+        for tipo, quantidade, preco_min, preco_max, capacidade_max in linhas
+    }
+
+
+@event.listens_for(Quarto, 'after_insert')
+@event.listens_for(Quarto, 'after_update')
+@event.listens_for(Quarto, 'after_delete')
+def _quarto_alterado(mapper, connection, quarto):
+    cache_hotel.invalidar()
+    # invalida outra vez no commit: entre o flush e o commit outro pedido
+    # pode ter guardado o catálogo antigo
+    sessao = object_session(quarto)
+    if sessao is not None:
+        sessao.info['invalidar_cache_hotel'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_catalogo(session):
+    if session.info.pop('invalidar_cache_hotel', False):
+        cache_hotel.invalidar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_invalidacao(session):
+    session.info.pop('invalidar_cache_hotel', None)
+
+
+def _sem_resultados(filtros: FiltrosQuartos, catalogo: Dict[str, Dict]) -> bool:
+    '''True se, pelo catálogo, nenhum quarto pode satisfazer os filtros.'''
+    tipos = ([catalogo[filtros.tipo.value]] if filtros.tipo and filtros.tipo.value in catalogo
+             else [] if filtros.tipo else list(catalogo.values()))
+    return not any(
+        (filtros.capacidade is None or t['capacidade_max'] >= filtros.capacidade)
+        and (filtros.preco_min is None or t['preco_max'] >= filtros.preco_min)
+        and (filtros.preco_max is None or t['preco_min'] <= filtros.preco_max)
+        for t in tipos)
+
+
+def _codificar_cursor(quarto: Quarto) -> str:
+    chave = f'{quarto.preco_diaria}|{quarto.id}'
+    return base64.urlsafe_b64encode(chave.encode()).decode()
+
+
+def _descodificar_cursor(cursor: str) -> Tuple[Decimal, int]:
+    try:
+        preco, quarto_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().rsplit('|', 1)
+        return Decimal(preco), int(quarto_id)
+    except (ValueError, UnicodeDecodeError, InvalidOperation) as e:
+        raise ValueError('Cursor de paginação inválido.') from e
+
+
+def pesquisar_quartos(filtros: FiltrosQuartos, cursor: Optional[str] = None,
+                      por_pagina: int = QUARTOS_POR_PAGINA) -> PaginaQuartos:
+    '''
+    Página de quartos que satisfazem os filtros, do mais barato ao mais caro.
+
+    Levanta ValueError se o cursor ou o período forem inválidos.
+    '''
+    por_pagina = max(1, min(int(por_pagina), MAX_QUARTOS_POR_PAGINA))
+
+    if filtros.checkin or filtros.checkout:
+        stmt = consulta_quartos_livres(filtros.checkin, filtros.checkout)  # type: ignore
+    else:
+        stmt = select(Quarto).where(Quarto.disponivel.is_(True))
+
+    if _sem_resultados(filtros, catalogo_quartos()):
+        return PaginaQuartos(itens=[])
+
+    if filtros.tipo:
+        stmt = stmt.where(Quarto.tipo == filtros.tipo)
+    if filtros.capacidade:
+        stmt = stmt.where(Quarto.capacidade >= filtros.capacidade)
+    if filtros.preco_min is not None:
+        stmt = stmt.where(Quarto.preco_diaria >= filtros.preco_min)
+    if filtros.preco_max is not None:
+        stmt = stmt.where(Quarto.preco_diaria <= filtros.preco_max)
+    if cursor:
+        preco, quarto_id = _descodificar_cursor(cursor)
+        stmt = stmt.where(tuple_(Quarto.preco_diaria, Quarto.id)
+                          > tuple_(preco, quarto_id))
+
+    # pedir mais um para saber se existe página seguinte
+    stmt = stmt.order_by(Quarto.preco_diaria, Quarto.id).limit(por_pagina + 1)
+    itens = list(db.session.scalars(stmt))
+
+    proximo = None
+    if len(itens) > por_pagina:
+        itens = itens[:por_pagina]
+        proximo = _codificar_cursor(itens[-1])
+
+    return PaginaQuartos(itens=itens, proximo_cursor=proximo)
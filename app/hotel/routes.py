@@ -1,12 +1,17 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, abort, jsonify, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
-from extensions import db
-from .models import Quarto, ReservaHotel
+from app.extensions import db
+from app.decorators import roles_required
+from .models import Quarto, TipoQuarto
+from .services import reservar_grupo, reservar_quarto
+from .tarifas import cotar_estadia
+from .pesquisa import (
+    FiltrosQuartos, QUARTOS_POR_PAGINA, catalogo_quartos, ler_filtros, pesquisar_quartos)
+from .calendario import calendario_ocupacao
 from .forms import ReservaHotelForm
-from .schemas import ReservaHotelSchema
-from datetime import date
+from .schemas import QuartoSchema, ReservaHotelSchema
+from datetime import date, timedelta
 from typing import Optional
-from sqlalchemy import text
 
 hotel_bp = Blueprint('hotel', __name__, url_prefix='/hotel',
                      template_folder='templates')
@@ -15,9 +20,34 @@ hotel_bp = Blueprint('hotel', __name__, url_prefix='/hotel',
 @hotel_bp.route('/')
 @login_required
 def index():
-    '''Lista os quartos disponíveis'''
-    quartos = db.query(Quarto).filter_by(disponivel=True).all()
-    return render_template('hotel/index.html', quartos=quartos)
+    '''Pesquisa de quartos (tipo, capacidade, preço e datas), do mais barato ao mais caro'''
+    try:
+        filtros = ler_filtros(request.args)
+        pagina = pesquisar_quartos(filtros, cursor=request.args.get('cursor'))
+    except ValueError as erro:
+        flash(str(erro), 'danger')
+        filtros, pagina = FiltrosQuartos(), pesquisar_quartos(FiltrosQuartos())
+
+    return render_template('hotel/index.html', quartos=pagina.itens,
+                           pagina=pagina, filtros=filtros,
+                           catalogo=catalogo_quartos(), tipos=list(TipoQuarto))
+
+
+@hotel_bp.route('/api/quartos')
+@login_required
+def api_quartos():
+    '''Pesquisa de quartos em JSON; `proximo_cursor` dá a página seguinte.'''
+    try:
+        filtros = ler_filtros(request.args)
+        pagina = pesquisar_quartos(filtros, cursor=request.args.get('cursor'),
+                                   por_pagina=request.args.get('por_pagina', QUARTOS_POR_PAGINA, type=int))
+    except ValueError as erro:
+        abort(400, description=str(erro))
+
+    return jsonify({
+        'quartos': QuartoSchema(many=True).dump(pagina.itens),
+        'proximo_cursor': pagina.proximo_cursor,
+    })
 
 
 @hotel_bp.route('/reservar/<int:quarto_id>', methods=['GET', 'POST'])
@@ -26,6 +56,9 @@ def reservar(quarto_id):
     '''Formulário de reserva de quarto'''
     quarto = db.get_or_404(Quarto, quarto_id)
     form = ReservaHotelForm()
+    form.quarto.choices = [(quarto.id, f'Nº {quarto.numero} ({quarto.tipo.value})')]
+    if form.quarto.data is None:
+        form.quarto.data = quarto.id
 
     # GET -> mostrar form
     if not form.validate_on_submit():
@@ -44,8 +77,8 @@ def reservar(quarto_id):
         flash('A data de checkout deve ser posterior à data de checkin.', 'danger')
         return render_template('hotel/reserva.html', form=form, quarto=quarto)
 
-    # Re-verificar disponibilidade atual do quarto e criar reserva de forma atómica
-    total = quarto.preco_diaria * noites
+    # o mesmo total que reservar_quarto grava, com as regras de tarifa
+    total = cotar_estadia(quarto, inicio, fim)
     data = {
         'cliente_id': current_user.id,
         'quarto_id': quarto.id,
@@ -62,30 +95,57 @@ def reservar(quarto_id):
         return render_template('hotel/reserva.html', form=form, quarto=quarto)
 
     try:
-        # Para SQLite: força lock de escrita imediato para evitar condição de corrida
-        bind = db.session.get_bind() if hasattr(
-            db.session, "get_bind") else getattr(db.session, "bind", None)
-
-        if bind is not None and getattr(bind, "dialect", None) is not None and bind.dialect.name == "sqlite":
-            db.session.execute(text("BEGIN IMMEDIATE"))
-
-        # obter o quarto dentro da transacção/session atual
-        quarto_db = db.session.get(Quarto, quarto_id)
-        if not quarto_db or not quarto_db.disponivel:
-            # se começou uma transacção manual, rollback
-            db.session.rollback()
-            flash('O quarto já não está disponível.', 'warning')
-            return redirect(url_for('hotel.index'))
-
-        # criar reserva e marcar quarto como indisponível dentro da mesma transacção
-        reserva = ReservaHotel(**data)
-        quarto_db.disponivel = False
-        db.session.add(reserva)
-        db.session.commit()
-    except Exception as err:
+        reserva = reservar_quarto(current_user.id, quarto.id, inicio, fim)
+    except Exception:
         db.session.rollback()
         flash('Erro ao salvar reserva. Tente novamente.', 'danger')
         return render_template('hotel/reserva.html', form=form, quarto=quarto)
 
+    if reserva is None:
+        flash('O quarto já não está disponível nessas datas.', 'warning')
+        return redirect(url_for('hotel.index'))
+
     flash('Reserva efetuada com sucesso!', 'success')
     return redirect(url_for('hotel.index'))
+
+
+@hotel_bp.route('/calendario')
+@login_required
+@roles_required('administrador')
+def calendario():
+    '''
+    Ocupação quartos × dias (JSON) para o calendário da recepção.
+    Parâmetros inicio e fim (AAAA-MM-DD, fim exclusivo); por omissão
+    os próximos 30 dias.
+    '''
+    try:
+        inicio = request.args.get('inicio', type=date.fromisoformat) or date.today()
+        fim = (request.args.get('fim', type=date.fromisoformat)
+               or inicio + timedelta(days=30))
+        return jsonify(calendario_ocupacao(inicio, fim))
+    except ValueError as erro:
+        abort(400, description=str(erro))
+
+
+@hotel_bp.route('/api/grupos', methods=['POST'])
+@login_required
+def api_reservar_grupo():
+    '''
+    Reserva de grupo (JSON): {"checkin", "checkout", "quarto_ids": [...]}
+    ou {"checkin", "checkout", "quantidade", "tipo"}. Tudo ou nada:
+    201 com as reservas criadas, 409 se algum quarto não estiver livre.
+    '''
+    dados = request.get_json(silent=True) or {}
+    try:
+        tipo = dados.get('tipo')
+        resultado = reservar_grupo(
+            current_user.id,
+            date.fromisoformat(str(dados.get('checkin'))),
+            date.fromisoformat(str(dados.get('checkout'))),
+            quarto_ids=[int(i) for i in dados.get('quarto_ids') or []],
+            quantidade=int(dados['quantidade']) if dados.get('quantidade') else None,
+            tipo=TipoQuarto(tipo) if tipo else None)
+    except (TypeError, ValueError) as erro:
+        abort(400, description=str(erro))
+
+    return jsonify(resultado), 409 if 'erro' in resultado else 201
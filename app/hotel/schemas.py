@@ -1,12 +1,14 @@
 # modules/hotel/schemas.py
-from marshmallow import Schema, fields, validate, validates_schema, ValidationError
+from marshmallow import Schema, fields, validates_schema, ValidationError
 from datetime import date
 
+from app.hotel.models import EstadoReservaHotel, TipoQuarto
+
 
 class QuartoSchema(Schema):
     id = fields.Int(dump_only=True)
     numero = fields.Str(required=True)
-    tipo = fields.Str(required=True, validate=validate.Length(min=3))
+    tipo = fields.Enum(TipoQuarto, by_value=True, required=True)
     preco_diaria = fields.Float(required=True)
     capacidade = fields.Int(required=True)
     disponivel = fields.Bool()
@@ -20,6 +22,8 @@ class ReservaHotelSchema(Schema):
     data_checkout = fields.Date(required=True)
     total = fields.Float(required=True)
     criado_em = fields.DateTime(dump_only=True)
+    estado = fields.Enum(EstadoReservaHotel, by_value=True, dump_only=True)
+    expira_em = fields.DateTime(dump_only=True)
 
     @validates_schema
     def validar_datas(self, data, **kwargs):
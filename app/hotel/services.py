@@ -1,32 +1,181 @@
-from datetime import date
-from typing import Optional
-from extensions import db
-from app.hotel.models import Quarto, ReservaHotel
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.hotel.models import EstadoReservaHotel, Quarto, ReservaHotel, TipoQuarto
+from app.hotel.cache import cache_hotel
+from app.hotel.tarifas import cotar_estadia, cotar_estadias
+from app.hotel.disponibilidade import (
+    consulta_quartos_livres, quarto_livre, quartos_livres, validar_periodo)
 
 
-def listar_quartos_disponiveis():
-    '''Retorna todos os quartos marcados como disponíveis.'''
-    return db.session.query(Quarto).filter_by(disponivel=True).all()
+def listar_quartos_disponiveis(checkin: Optional[date] = None,
+                               checkout: Optional[date] = None) -> List[Quarto]:
+    '''
+    Retorna os quartos em serviço; com checkin e checkout, apenas os que
+    estão livres em todas as noites do período.
+    '''
+    if checkin and checkout:
+        return quartos_livres(checkin, checkout)
+    return db.session.query(Quarto).filter_by(disponivel=True).order_by(Quarto.numero).all()
 
 
-def criar_reserva(cliente_id, quarto_id, checkin, checkout) -> Optional[ReservaHotel]:
-    '''Cria uma reserva e marca o quarto como indisponível.'''
-    quarto = db.session.get(Quarto, quarto_id)
-    if not quarto or not quarto.disponivel:
-        return None
+def _estado_inicial() -> Tuple[EstadoReservaHotel, Optional[datetime]]:
+    '''
+    (estado, expira_em) de uma reserva nova. Com HOTEL_PRAZO_PAGAMENTO_MINUTOS
+    a reserva fica pendente até ser paga, e é libertada se o prazo passar;
+    sem prazo fica logo confirmada.
+    '''
+    minutos = current_app.config.get('HOTEL_PRAZO_PAGAMENTO_MINUTOS')
+    if not minutos:
+        return EstadoReservaHotel.confirmada, None
+    return (EstadoReservaHotel.pendente,
+            datetime.now(timezone.utc) + timedelta(minutes=minutos))
+
+
+def reservar_quarto(cliente_id: int, quarto_id: int, checkin: date,
+                    checkout: date) -> Optional[ReservaHotel]:
+    '''
+    Reserva o quarto no período, sem risco de reservas sobrepostas.
+
+    Bloqueia só a linha do quarto (SELECT ... FOR UPDATE): reservas
+    simultâneas do mesmo quarto esperam umas pelas outras, as de outros
+    quartos seguem em paralelo. A restrição de exclusão (PostgreSQL) ou o
+    trigger (SQLite) em reservas_hotel é a última garantia: se a escrita
+    sobreposta chegar à base de dados, é recusada e a função retorna None.
+
+    Retorna a reserva criada, ou None se o quarto não existir, não estiver
+    em serviço ou já estiver reservado em alguma das noites.
+    '''
+    validar_periodo(checkin, checkout)
 
-    dias = (checkout - checkin).days
-    total = dias * quarto.preco_diaria
+    try:
+        # no SQLite o FOR UPDATE é omitido; aí valem o trigger e a escrita única
+        quarto = db.session.scalars(
+            select(Quarto).where(Quarto.id == quarto_id).with_for_update()).first()
+        if not quarto or not quarto_livre(quarto_id, checkin, checkout):
+            db.session.rollback()
+            return None
 
-    reserva = ReservaHotel()
-    reserva.cliente_id = cliente_id
-    reserva.quarto_id = quarto_id
-    reserva.data_checkin = checkin
-    reserva.data_checkout = checkout
-    reserva.total = total
+        reserva = ReservaHotel()
+        reserva.cliente_id = cliente_id
+        reserva.quarto_id = quarto_id
+        reserva.data_checkin = checkin
+        reserva.data_checkout = checkout
+        reserva.total = cotar_estadia(quarto, checkin, checkout)
+        reserva.estado, reserva.expira_em = _estado_inicial()
 
-    db.session.add(reserva)
-    quarto.disponivel = False
+        db.session.add(reserva)
+        db.session.commit()
 
+        # o calendário de ocupação em cache deixa de estar certo
+        cache_hotel.invalidar()
+        return reserva
+
+    except IntegrityError:
+        db.session.rollback()
+        return None
+
+
+def confirmar_reserva(reserva_id: int) -> bool:
+    '''
+    Confirma (após pagamento) uma reserva pendente ainda dentro do prazo.
+    Retorna False se a reserva não existir, já tiver expirado ou já não
+    estiver pendente.
+    '''
+    resultado = db.session.execute(
+        update(ReservaHotel)
+        .where(ReservaHotel.id == reserva_id,
+               ReservaHotel.estado == EstadoReservaHotel.pendente,
+               ReservaHotel.expira_em > datetime.now(timezone.utc))
+        .values(estado=EstadoReservaHotel.confirmada, expira_em=None)
+        .execution_options(synchronize_session='fetch'))
     db.session.commit()
-    return reserva
+    return resultado.rowcount == 1  # type: ignore
+
+
+def criar_reserva(cliente_id, quarto_id, checkin, checkout) -> Optional[ReservaHotel]:
+    '''Cria uma reserva se o quarto estiver livre no período.'''
+    return reservar_quarto(cliente_id, quarto_id, checkin, checkout)
+
+
+MAX_QUARTOS_GRUPO = 200
+
+
+def reservar_grupo(cliente_id: int, checkin: date, checkout: date,
+                   quarto_ids: Optional[Sequence[int]] = None,
+                   quantidade: Optional[int] = None,
+                   tipo: Optional[TipoQuarto] = None) -> Dict:
+    '''
+    Reserva vários quartos para o mesmo período, tudo ou nada.
+
+    Indica-se `quarto_ids` (quartos escolhidos) ou `quantidade` (os
+    quartos livres mais baratos, opcionalmente de um `tipo`). Os quartos
+    são bloqueados por ordem de id (sem deadlocks entre grupos), a
+    disponibilidade de todos é confirmada numa única consulta, os preços
+    numa leitura por tipo e as reservas gravadas num INSERT em lote, numa
+    só transacção. Se algum quarto falhar, nenhum é reservado.
+
+    Retorna {'mensagem', 'reservas': [ids], 'total'} ou
+    {'erro', 'indisponiveis': [ids]}.
+    '''
+    validar_periodo(checkin, checkout)
+    if not quarto_ids and not quantidade:
+        raise ValueError('Indique os quartos ou a quantidade a reservar.')
+    pedidos = len(set(quarto_ids)) if quarto_ids else int(quantidade or 0)
+    if not 0 < pedidos <= MAX_QUARTOS_GRUPO:
+        raise ValueError(f'Um grupo pode reservar de 1 a {MAX_QUARTOS_GRUPO} quartos.')
+
+    try:
+        livres = consulta_quartos_livres(checkin, checkout)
+        if quarto_ids:
+            ids = sorted(set(quarto_ids))
+            # no SQLite o FOR UPDATE é omitido; aí valem o trigger e a escrita única
+            db.session.execute(select(Quarto.id).where(Quarto.id.in_(ids))
+                               .order_by(Quarto.id).with_for_update())
+            quartos = list(db.session.scalars(livres.where(Quarto.id.in_(ids))))
+            indisponiveis = sorted(set(ids) - {q.id for q in quartos})
+            if indisponiveis:
+                db.session.rollback()
+                return {'erro': 'Há quartos indisponíveis no período.',
+                        'indisponiveis': indisponiveis}
+        else:
+            if tipo:
+                livres = livres.where(Quarto.tipo == tipo)
+            quartos = list(db.session.scalars(
+                livres.order_by(Quarto.preco_diaria, Quarto.id)
+                .limit(pedidos).with_for_update(of=Quarto)))
+            if len(quartos) < pedidos:
+                db.session.rollback()
+                return {'erro': f'Só há {len(quartos)} quartos livres no período.',
+                        'indisponiveis': []}
+
+        totais = cotar_estadias(quartos, checkin, checkout)
+        estado, expira_em = _estado_inicial()
+        linhas = [{
+            'cliente_id': cliente_id,
+            'quarto_id': quarto.id,
+            'data_checkin': checkin,
+            'data_checkout': checkout,
+            'total': totais[quarto.id],
+            'estado': estado,
+            'expira_em': expira_em,
+        } for quarto in quartos]
+        reservas = list(db.session.scalars(
+            insert(ReservaHotel).returning(ReservaHotel.id), linhas))
+        db.session.commit()
+
+    except IntegrityError:
+        # outra reserva ocupou um dos quartos entre a verificação e o INSERT
+        db.session.rollback()
+        return {'erro': 'Um dos quartos foi reservado entretanto. Tente novamente.',
+                'indisponiveis': []}
+
+    cache_hotel.invalidar()
+    return {
+        'mensagem': f'{len(reservas)} quartos reservados.',
+        'reservas': sorted(reservas),
+        'total': sum(totais.values()),
+    }
@@ -0,0 +1,160 @@
+'''
+Preços dinâmicos por noite (época alta, fins de semana, ...).
+
+O preço de uma noite é preco_diaria do quarto × o factor da noite para o
+tipo de quarto. O factor é o produto dos multiplicadores das RegraTarifa
+activas que se aplicam a essa noite (1 sem regras).
+
+Para não avaliar as regras noite a noite em cada cotação, os factores
+dos próximos meses ficam calculados na tabela tarifas_diarias, e são
+recalculados quando as regras mudam. O cálculo é feito com máscaras NumPy
+sobre todos os dias de uma vez, uma por regra; a cotação de uma estadia é
+uma consulta por intervalo a essa tabela e uma soma do vector de factores.
+Noites para lá do horizonte calculado são avaliadas pelas regras na hora.
+'''
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, insert, select
+
+from app.extensions import db
+from app.hotel.cache import cache_hotel
+from app.hotel.disponibilidade import validar_periodo
+from app.hotel.models import Quarto, RegraTarifa, TarifaDiaria, TipoQuarto
+
+TARIFAS_MESES = 12
+
+
+def _datas(inicio: date, dias: int) -> np.ndarray:
+    return np.arange(np.datetime64(inicio, 'D'), np.datetime64(inicio, 'D') + dias)
+
+
+def calcular_fatores(regras: Sequence[RegraTarifa], tipo: TipoQuarto,
+                     inicio: date, dias: int) -> np.ndarray:
+    '''Factor de cada noite de [inicio, inicio + dias) para o tipo, pelas regras.'''
+    datas = _datas(inicio, dias)
+    # 1970-01-01 foi uma quinta-feira (weekday 3)
+    dia_semana = (datas.astype(np.int64) + 3) % 7
+    fatores = np.ones(dias)
+
+    for regra in regras:
+        if regra.tipo is not None and regra.tipo != tipo:
+            continue
+        mascara = np.ones(dias, dtype=bool)
+        if regra.data_inicio:
+            mascara &= datas >= np.datetime64(regra.data_inicio, 'D')
+        if regra.data_fim:
+            mascara &= datas <= np.datetime64(regra.data_fim, 'D')
+        if regra.dias_semana:
+            mascara &= np.isin(dia_semana, [int(d) for d in regra.dias_semana])
+        fatores[mascara] *= float(regra.multiplicador)
+
+    return fatores
+
+
+def _regras_activas() -> List[RegraTarifa]:
+    return list(db.session.scalars(
+        select(RegraTarifa).where(RegraTarifa.activo.is_(True))))
+
+
+def _somar_meses(dia: date, meses: int) -> date:
+    mes = dia.month - 1 + meses
+    return date(dia.year + mes // 12, mes % 12 + 1, 1)
+
+
+def recalcular_tarifas(inicio: Optional[date] = None,
+                       meses: Optional[int] = None) -> int:
+    '''
+    Recalcula tarifas_diarias, para todos os tipos de quarto, de `inicio`
+    (hoje) até ao fim do mês `meses` meses depois (HOTEL_TARIFAS_MESES).
+    Retorna o número de linhas gravadas.
+    '''
+    inicio = inicio or date.today()
+    if meses is None:
+        meses = current_app.config.get('HOTEL_TARIFAS_MESES', TARIFAS_MESES)
+    dias = (_somar_meses(inicio, meses + 1) - inicio).days
+    regras = _regras_activas()
+    datas = [inicio + timedelta(days=n) for n in range(dias)]
+
+    linhas = []
+    for tipo in TipoQuarto:
+        fatores = np.round(calcular_fatores(regras, tipo, inicio, dias), 6)
+        linhas.extend({'tipo': tipo, 'dia': dia, 'fator': Decimal(str(fator))}
+                      for dia, fator in zip(datas, fatores.tolist()))
+
+    try:
+        db.session.execute(delete(TarifaDiaria).where(TarifaDiaria.dia >= inicio))
+        db.session.execute(insert(TarifaDiaria), linhas)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    cache_hotel.invalidar()
+    return len(linhas)
+
+
+def fatores_periodo(tipo: TipoQuarto, checkin: date, checkout: date) -> np.ndarray:
+    '''Factores das noites de [checkin, checkout), da tabela ou, se faltar algum, das regras.'''
+    validar_periodo(checkin, checkout)
+    noites = (checkout - checkin).days
+    fatores = db.session.scalars(
+        select(TarifaDiaria.fator)
+        .where(TarifaDiaria.tipo == tipo, TarifaDiaria.dia >= checkin,
+               TarifaDiaria.dia < checkout)
+        .order_by(TarifaDiaria.dia)).all()
+
+    if len(fatores) == noites:
+        return np.array(fatores, dtype=np.float64)
+    return calcular_fatores(_regras_activas(), tipo, checkin, noites)
+
+
+def cotar_estadias(quartos: Iterable[Quarto], checkin: date,
+                   checkout: date) -> Dict[int, Decimal]:
+    '''Preço total da estadia em cada quarto (id -> total), uma leitura por tipo.'''
+    somas: Dict[TipoQuarto, Decimal] = {}
+    totais = {}
+    for quarto in quartos:
+        if quarto.tipo not in somas:
+            soma = float(fatores_periodo(quarto.tipo, checkin, checkout).sum())
+            somas[quarto.tipo] = Decimal(str(round(soma, 6)))
+        totais[quarto.id] = (quarto.preco_diaria * somas[quarto.tipo]
+                             ).quantize(Decimal('0.01'))
+    return totais
+
+
+def cotar_estadia(quarto: Quarto, checkin: date, checkout: date) -> Decimal:
+    '''Preço total da estadia no quarto, com as regras de tarifa aplicadas.'''
+    return cotar_estadias([quarto], checkin, checkout)[quarto.id]
+
+
+def criar_regra_tarifa(**dados) -> RegraTarifa:
+    '''Grava uma nova regra e recalcula a tabela de tarifas. Levanta ValueError.'''
+    dias_semana = dados.get('dias_semana') or ''
+    if any(d not in '0123456' for d in dias_semana):
+        raise ValueError(f'Dias da semana inválidos: {dias_semana}')
+    if Decimal(str(dados.get('multiplicador', 0))) <= 0:
+        raise ValueError('O multiplicador deve ser positivo.')
+    inicio, fim = dados.get('data_inicio'), dados.get('data_fim')
+    if inicio and fim and fim < inicio:
+        raise ValueError('A data de fim da regra é anterior à de início.')
+
+    regra = RegraTarifa(**dados)
+    db.session.add(regra)
+    db.session.commit()
+    recalcular_tarifas()
+    return regra
+
+
+def desactivar_regra_tarifa(regra_id: int) -> bool:
+    '''Desactiva a regra e recalcula a tabela. False se não existir.'''
+    regra = db.session.get(RegraTarifa, regra_id)
+    if regra is None:
+        return False
+    regra.activo = False
+    db.session.commit()
+    recalcular_tarifas()
+    return True
@@ -1,6 +1,6 @@
 # app/pagamentos/forms.py
 from flask_wtf import FlaskForm
-from wtforms import DecimalField, SelectField, TextAreaField, SubmitField
+from wtforms import DecimalField, HiddenField, SelectField, TextAreaField, SubmitField
 from wtforms.validators import DataRequired, NumberRange
 from app.pagamentos.models import TipoServicoEnum
 
@@ -30,4 +30,6 @@ class PagamentoForm(FlaskForm):
     )
 
     observacoes = TextAreaField('Observações (opcional)')
+    # gerada ao abrir o formulário; protege contra submissões repetidas
+    chave_idempotencia = HiddenField()
     submit = SubmitField('Concluir Pagamento')
@@ -0,0 +1,167 @@
+'''
+Geração mensal das cobranças de mensalidade.
+
+Para um mês (AAAA-MM), cria uma CobrancaMensalidade por cada inscrição
+activa feita até ao fim desse mês. As inscrições são lidas em blocos por
+chave (id > último id lido), sem cursor aberto durante toda a execução,
+e cada bloco é gravado numa transacção própria, por uma pool de threads
+com um contexto de aplicação (e uma sessão) por thread.
+
+A gravação usa INSERT ... ON CONFLICT DO NOTHING sobre a restrição
+(inscricao_id, ano, mes): se o processo for interrompido, basta repetir
+o comando; os blocos já gravados são ignorados e só se criam as
+cobranças em falta.
+'''
+import time
+from calendar import monthrange
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.academia.models import Inscricao
+from app.extensions import db
+from app.pagamentos.models import CobrancaMensalidade
+
+TAMANHO_BLOCO_MENSALIDADES = 1000
+TRABALHADORES_MENSALIDADES = 4
+
+
+@dataclass
+class ResultadoMensalidades:
+    ano: int
+    mes: int
+    inscricoes: int = 0
+    criadas: int = 0
+    blocos: int = 0
+    duracao: float = 0.0
+
+    @property
+    def existentes(self) -> int:
+        '''Cobranças que já tinham sido geradas numa execução anterior.'''
+        return self.inscricoes - self.criadas
+
+    @property
+    def por_segundo(self) -> float:
+        return self.inscricoes / self.duracao if self.duracao else 0.0
+
+
+def ler_referencia(texto: str) -> Tuple[int, int]:
+    '''Converte 'AAAA-MM' em (ano, mes). Levanta ValueError se inválido.'''
+    try:
+        referencia = datetime.strptime(texto.strip(), '%Y-%m')
+    except ValueError as e:
+        raise ValueError(f'Mês inválido (use AAAA-MM): {texto}') from e
+    return referencia.year, referencia.month
+
+
+def _ler_bloco(fim_mes: datetime, ultimo_id: int, tamanho: int) -> List[Tuple[int, int]]:
+    '''Próximo bloco de (inscricao_id, aluno_id) activos, por ordem de id.'''
+    stmt = (select(Inscricao.id, Inscricao.aluno_id)
+            .where(Inscricao.activo.is_(True),
+                   Inscricao.data_inscricao < fim_mes,
+                   Inscricao.id > ultimo_id)
+            .order_by(Inscricao.id)
+            .limit(tamanho))
+    return list(db.session.execute(stmt).tuples())
+
+
+def _gravar_bloco(bloco: List[Tuple[int, int]], ano: int, mes: int,
+                  valor: Decimal, vencimento: date) -> int:
+    '''Grava as cobranças de um bloco numa transacção. Retorna quantas criou.'''
+    agora = datetime.now(timezone.utc)
+    linhas = [{
+        'inscricao_id': inscricao_id,
+        'aluno_id': aluno_id,
+        'ano': ano,
+        'mes': mes,
+        'valor': valor,
+        'data_vencimento': vencimento,
+        'criada_em': agora,
+    } for inscricao_id, aluno_id in bloco]
+
+    dialecto = db.session.get_bind().dialect.name
+    insert_fn = pg_insert if dialecto == 'postgresql' else sqlite_insert
+    # RETURNING só devolve as linhas realmente inseridas
+    stmt = (insert_fn(CobrancaMensalidade)
+            .on_conflict_do_nothing(index_elements=['inscricao_id', 'ano', 'mes'])
+            .returning(CobrancaMensalidade.id))
+
+    try:
+        criadas = len(db.session.scalars(stmt, linhas).all())
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return criadas
+
+
+def _gravar_bloco_em_thread(aplicacao, *args) -> int:
+    with aplicacao.app_context():
+        return _gravar_bloco(*args)
+
+
+def gerar_mensalidades(ano: int, mes: int,
+                       tamanho_bloco: int = TAMANHO_BLOCO_MENSALIDADES,
+                       trabalhadores: int = TRABALHADORES_MENSALIDADES,
+                       valor: Optional[Decimal] = None) -> ResultadoMensalidades:
+    '''
+    Gera as cobranças de mensalidade do mês para as inscrições activas.
+
+    Com `trabalhadores` > 1 os blocos são gravados em paralelo; o número de
+    blocos em espera é limitado para a memória não crescer com o número
+    de inscrições. No SQLite (uma só escrita de cada vez) os blocos são
+    gravados em sequência, na thread actual.
+
+    Se um bloco falhar, a excepção é propagada; os blocos já gravados
+    ficam, e uma nova execução completa o mês.
+    '''
+    configuracao = current_app.config
+    valor = Decimal(str(valor if valor is not None
+                        else configuracao.get('MENSALIDADE_VALOR', '50.00'))).quantize(Decimal('0.01'))
+    ultimo_dia = monthrange(ano, mes)[1]
+    vencimento = date(ano, mes, min(
+        configuracao.get('MENSALIDADE_DIA_VENCIMENTO', 8), ultimo_dia))
+    # inscrições feitas até ao fim do mês (exclusivo: 1.º dia do mês seguinte)
+    fim_mes = datetime(ano + mes // 12, mes % 12 + 1, 1, tzinfo=timezone.utc)
+
+    resultado = ResultadoMensalidades(ano=ano, mes=mes)
+    inicio = time.perf_counter()
+
+    if db.session.get_bind().dialect.name == 'sqlite':
+        trabalhadores = 1
+
+    ultimo_id = 0
+    if trabalhadores <= 1:
+        while bloco := _ler_bloco(fim_mes, ultimo_id, tamanho_bloco):
+            ultimo_id = bloco[-1][0]
+            resultado.inscricoes += len(bloco)
+            resultado.blocos += 1
+            resultado.criadas += _gravar_bloco(bloco, ano, mes, valor, vencimento)
+    else:
+        aplicacao = current_app._get_current_object()  # type: ignore
+        with ThreadPoolExecutor(max_workers=trabalhadores,
+                                thread_name_prefix='mensalidades') as executor:
+            pendentes = set()
+            while bloco := _ler_bloco(fim_mes, ultimo_id, tamanho_bloco):
+                ultimo_id = bloco[-1][0]
+                resultado.inscricoes += len(bloco)
+                resultado.blocos += 1
+                pendentes.add(executor.submit(
+                    _gravar_bloco_em_thread, aplicacao,
+                    bloco, ano, mes, valor, vencimento))
+
+                if len(pendentes) >= trabalhadores * 2:
+                    feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                    resultado.criadas += sum(f.result() for f in feitos)
+
+            resultado.criadas += sum(f.result() for f in pendentes)
+
+    resultado.duracao = time.perf_counter() - inicio
+    return resultado
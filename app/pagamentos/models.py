@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 from decimal import Decimal
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 import enum
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import Integer, String, Numeric, DateTime, Enum, ForeignKey
+from sqlalchemy import Boolean, Date, Integer, String, Numeric, DateTime, Enum, ForeignKey, Index, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.extensions import Base
@@ -24,6 +24,13 @@ class TipoServicoEnum(str, enum.Enum):
 
 class Pagamento(Base):
     __tablename__ = "pagamentos"
+    __table_args__ = (
+        # relatórios: filtro por intervalo de datas; cobre sum/avg/min/max(valor)
+        Index('ix_pagamentos_data_pagamento_valor', 'data_pagamento', 'valor'),
+        # histórico por utilizador ordenado por data (id desempata a paginação)
+        Index('ix_pagamentos_utilizador_data', 'utilizador_id',
+              'data_pagamento', 'id'),
+    )
 
     # importar no escopo da classe para evitar importação circular
     from app.utilizadores.models import Utilizador
@@ -37,7 +44,7 @@ class Pagamento(Base):
 
     metodo_pagamento: Mapped[str] = mapped_column(String(50), nullable=False)
     data_pagamento: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), default=datetime.now(timezone.utc)
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
 
     utilizador: Mapped['Utilizador'] = relationship(
@@ -45,3 +52,100 @@ class Pagamento(Base):
 
     def __repr__(self):
         return f"<Pagamento {self.tipo_servico} - {self.valor} USD>"
+
+
+class ResumoPagamentosUtilizador(Base):
+    '''
+    Totais acumulados dos pagamentos de cada utilizador (desnormalizado).
+
+    Actualizado na mesma transacção que grava cada pagamento, para que o
+    painel do aluno não precise de agregar a tabela de pagamentos.
+    total_ano refere-se ao ano em ano_referencia.
+    '''
+    __tablename__ = "resumo_pagamentos_utilizador"
+
+    utilizador_id: Mapped[int] = mapped_column(
+        ForeignKey("utilizadores.id"), primary_key=True)
+    total_pago: Mapped[Decimal] = mapped_column(
+        Numeric(14, 2), nullable=False, default=0)
+    quantidade: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    ano_referencia: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_ano: Mapped[Decimal] = mapped_column(
+        Numeric(14, 2), nullable=False, default=0)
+    ultimo_pagamento: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True)
+
+    # número de pagamentos por TipoServicoEnum
+    qtd_matricula: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0)
+    qtd_mensalidade: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0)
+    qtd_aluguer_campo: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0)
+    qtd_hospedagem: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0)
+    qtd_piscina_balneario: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ResumoPagamentosUtilizador {self.utilizador_id}: {self.total_pago}>"
+
+
+class ChaveIdempotencia(Base):
+    '''
+    Chaves de idempotência das submissões de pagamento.
+
+    Cada submissão bem-sucedida grava a chave (do formulário ou do cabeçalho
+    Idempotency-Key) na mesma transacção do pagamento. Uma nova submissão
+    com a mesma chave devolve o resultado guardado, por consulta à chave
+    primária, sem voltar a processar o pagamento.
+    '''
+    __tablename__ = "chaves_idempotencia"
+
+    chave: Mapped[str] = mapped_column(String(64), primary_key=True)
+    utilizador_id: Mapped[int] = mapped_column(
+        ForeignKey("utilizadores.id"), nullable=False)
+    pagamento_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("pagamentos.id"), nullable=True)
+    sucesso: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    mensagem: Mapped[str] = mapped_column(String(255), nullable=False)
+    criado_em: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+        server_default=func.now())
+
+    def __repr__(self):
+        return f"<ChaveIdempotencia {self.chave} -> pagamento {self.pagamento_id}>"
+
+
+class CobrancaMensalidade(Base):
+    '''
+    Mensalidade esperada de uma inscrição activa num mês.
+
+    Gerada em lote por `flask gerar-mensalidades`. A restrição única
+    (inscricao_id, ano, mes) torna a geração idempotente: repetir o
+    comando para o mesmo mês só cria as cobranças que faltam.
+    '''
+    __tablename__ = "cobrancas_mensalidade"
+    __table_args__ = (
+        UniqueConstraint('inscricao_id', 'ano', 'mes',
+                         name='uq_cobrancas_mensalidade_inscricao_mes'),
+    )
+
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    inscricao_id: Mapped[int] = mapped_column(
+        ForeignKey("inscricoes.id"), nullable=False)
+    aluno_id: Mapped[int] = mapped_column(
+        ForeignKey("dados_alunos.id"), nullable=False)
+    ano: Mapped[int] = mapped_column(Integer, nullable=False)
+    mes: Mapped[int] = mapped_column(Integer, nullable=False)
+    valor: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+    data_vencimento: Mapped[date] = mapped_column(Date, nullable=False)
+    pagamento_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("pagamentos.id"), nullable=True)
+    criada_em: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
+        server_default=func.now())
+
+    def __repr__(self):
+        return f"<CobrancaMensalidade {self.inscricao_id} {self.ano}-{self.mes:02d}: {self.valor}>"
@@ -0,0 +1,188 @@
+'''
+Reconciliação dos pagamentos com extractos bancários (banco / Multicaixa).
+
+O extracto é um CSV com, pelo menos, as colunas data (AAAA-MM-DD), valor
+e metodo; outras colunas (ex.: referencia, descricao) são mantidas nos
+relatórios. É lido linha a linha, sem o carregar em memória.
+
+Os pagamentos do período são indexados num dicionário pela chave
+(valor, data, método) -> ids, lido da base de dados em blocos. Cada linha
+do extracto procura a sua chave no índice em O(1), por isso o custo total
+é O(pagamentos + linhas) em vez de comparar todas as linhas com todos os
+pagamentos.
+'''
+import csv
+import os
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.extensions import db
+from app.pagamentos.models import Pagamento
+
+TAMANHO_LOTE_RECONCILIACAO = 1000
+
+ChaveReconciliacao = Tuple[Decimal, date, str]
+
+
+@dataclass
+class ResultadoReconciliacao:
+    # (número da linha do extracto, id do pagamento)
+    conciliados: List[Tuple[int, int]] = field(default_factory=list)
+    # (número da linha, linha original) sem pagamento correspondente
+    extracto_sem_pagamento: List[Tuple[int, Dict]] = field(default_factory=list)
+    # ids dos pagamentos do período que não aparecem no extracto
+    pagamentos_sem_extracto: List[int] = field(default_factory=list)
+    # (número da linha, motivo) das linhas que não foi possível ler
+    erros: List[Tuple[int, str]] = field(default_factory=list)
+
+    def resumo(self) -> Dict[str, int]:
+        return {
+            'conciliados': len(self.conciliados),
+            'extracto_sem_pagamento': len(self.extracto_sem_pagamento),
+            'pagamentos_sem_extracto': len(self.pagamentos_sem_extracto),
+            'erros': len(self.erros),
+        }
+
+
+def _normalizar_metodo(metodo) -> str:
+    return str(metodo or '').strip().casefold()
+
+
+def _chave(valor: Decimal, dia: date, metodo) -> ChaveReconciliacao:
+    return valor.quantize(Decimal('0.01')), dia, _normalizar_metodo(metodo)
+
+
+def ler_linha_extracto(linha: Mapping) -> ChaveReconciliacao:
+    '''Chave (valor, data, método) de uma linha do extracto. Levanta ValueError.'''
+    try:
+        valor = Decimal(str(linha.get('valor') or '').strip().replace(',', '.'))
+    except InvalidOperation as e:
+        raise ValueError('valor inválido') from e
+    if not valor.is_finite():
+        raise ValueError('valor inválido')
+
+    texto = (linha.get('data') or '').strip()
+    try:
+        dia = date.fromisoformat(texto[:10])
+    except ValueError as e:
+        raise ValueError(f'data inválida: {texto}') from e
+
+    metodo = _normalizar_metodo(linha.get('metodo'))
+    if not metodo:
+        raise ValueError('método de pagamento em falta')
+
+    return _chave(valor, dia, metodo)
+
+
+def indexar_pagamentos(inicio: date, fim: date,
+                       tamanho_lote: int = TAMANHO_LOTE_RECONCILIACAO) -> Dict[ChaveReconciliacao, Deque[int]]:
+    '''
+    Índice (valor, data, método) -> ids dos pagamentos entre inicio e fim
+    (inclusive). Vários pagamentos iguais no mesmo dia ficam na mesma
+    fila, por ordem de id, e são consumidos um a um.
+    '''
+    stmt = (select(Pagamento.id, Pagamento.valor, Pagamento.data_pagamento,
+                   Pagamento.metodo_pagamento)
+            .where(Pagamento.data_pagamento >= datetime.combine(inicio, time.min),
+                   Pagamento.data_pagamento <= datetime.combine(fim, time.max))
+            .order_by(Pagamento.id)
+            .execution_options(yield_per=tamanho_lote))
+
+    indice: Dict[ChaveReconciliacao, Deque[int]] = defaultdict(deque)
+    for pagamento_id, valor, data_pagamento, metodo in db.session.execute(stmt):
+        indice[_chave(valor, data_pagamento.date(), metodo)].append(pagamento_id)
+    return indice
+
+
+def _procurar(indice: Dict[ChaveReconciliacao, Deque[int]], chave: ChaveReconciliacao,
+              tolerancia_dias: int) -> Optional[int]:
+    valor, dia, metodo = chave
+    # primeiro o mesmo dia; depois os dias vizinhos, do mais próximo ao mais afastado
+    for desvio in range(tolerancia_dias + 1):
+        for sinal in ((0,) if desvio == 0 else (-1, 1)):
+            fila = indice.get((valor, dia + timedelta(days=desvio * sinal), metodo))
+            if fila:
+                return fila.popleft()
+    return None
+
+
+def reconciliar(linhas: Iterable[Mapping], inicio: date, fim: date,
+                tolerancia_dias: int = 0) -> ResultadoReconciliacao:
+    '''
+    Concilia as linhas de um extracto com os pagamentos de [inicio, fim].
+
+    Cada pagamento concilia no máximo uma linha. Com `tolerancia_dias` > 0,
+    uma linha sem correspondência no próprio dia pode conciliar com um
+    pagamento até esse número de dias antes ou depois (ex.: transferências
+    que o banco só regista no dia útil seguinte); o índice inclui então os
+    pagamentos dessa margem fora do período.
+    '''
+    margem = timedelta(days=tolerancia_dias)
+    indice = indexar_pagamentos(inicio - margem, fim + margem)
+    resultado = ResultadoReconciliacao()
+
+    # a linha 1 do ficheiro é o cabeçalho
+    for numero, linha in enumerate(linhas, start=2):
+        try:
+            chave = ler_linha_extracto(linha)
+        except ValueError as e:
+            resultado.erros.append((numero, str(e)))
+            continue
+
+        pagamento_id = _procurar(indice, chave, tolerancia_dias)
+        if pagamento_id is None:
+            resultado.extracto_sem_pagamento.append((numero, dict(linha)))
+        else:
+            resultado.conciliados.append((numero, pagamento_id))
+
+    resultado.pagamentos_sem_extracto = sorted(
+        pagamento_id
+        for (_, dia, _), fila in indice.items()
+        if inicio <= dia <= fim
+        for pagamento_id in fila)
+    return resultado
+
+
+def periodo_extracto(linhas: Iterable[Mapping]) -> Optional[Tuple[date, date]]:
+    '''Primeira e última data das linhas válidas de um extracto, ou None.'''
+    datas = []
+    for linha in linhas:
+        try:
+            datas.append(ler_linha_extracto(linha)[1])
+        except ValueError:
+            continue
+    return (min(datas), max(datas)) if datas else None
+
+
+def _escrever_csv(caminho: str, cabecalho: List[str], linhas: Iterator[List]) -> None:
+    with open(caminho, 'w', newline='', encoding='utf-8') as ficheiro:
+        escritor = csv.writer(ficheiro)
+        escritor.writerow(cabecalho)
+        escritor.writerows(linhas)
+
+
+def escrever_relatorios(resultado: ResultadoReconciliacao, pasta: str) -> List[str]:
+    '''Grava os relatórios CSV da reconciliação em `pasta`. Retorna os caminhos.'''
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = [os.path.join(pasta, nome) for nome in (
+        'conciliados.csv', 'extracto_sem_pagamento.csv',
+        'pagamentos_sem_extracto.csv', 'erros.csv')]
+
+    _escrever_csv(caminhos[0], ['linha', 'pagamento_id'],
+                  ([n, p] for n, p in resultado.conciliados))
+
+    colunas = sorted({c for _, linha in resultado.extracto_sem_pagamento for c in linha})
+    _escrever_csv(caminhos[1], ['linha'] + colunas,
+                  ([n] + [linha.get(c, '') for c in colunas]
+                   for n, linha in resultado.extracto_sem_pagamento))
+
+    _escrever_csv(caminhos[2], ['pagamento_id'],
+                  ([p] for p in resultado.pagamentos_sem_extracto))
+    _escrever_csv(caminhos[3], ['linha', 'motivo'],
+                  ([n, m] for n, m in resultado.erros))
+    return caminhos
@@ -1,7 +1,9 @@
+import uuid
+
 from flask import Blueprint, abort, render_template, flash, redirect, url_for, request
 from flask_login import login_required, current_user
 from app.pagamentos.forms import PagamentoForm
-from app.pagamentos.services import processar_pagamento
+from app.pagamentos.services import chave_idempotencia_valida, processar_pagamento
 from app.utilizadores.models import Utilizador
 from app.extensions import db
 
@@ -9,6 +11,15 @@ from app.extensions import db
 pagamentos_bp = Blueprint('pagamentos', __name__)
 
 
+def ler_chave_idempotencia(form):
+    '''Chave do cabeçalho Idempotency-Key ou do formulário; 400 se inválida.'''
+    chave = request.headers.get('Idempotency-Key') or form.chave_idempotencia.data
+    if chave and not chave_idempotencia_valida(chave):
+        abort(400, description='Idempotency-Key inválida: até 64 letras, '
+                               'algarismos, "-" ou "_".')
+    return chave or None
+
+
 @pagamentos_bp.route('/<int:id>/novo', methods=['GET', 'POST'])
 @login_required
 def novo_pagamento(id):
@@ -32,13 +43,17 @@ def novo_pagamento(id):
             valor=valor_raw,
             tipo_servico=form.tipo_servico.data,
             metodo_pagamento=form.metodo_pagamento.data,
-            observacoes=form.observacoes.data
+            observacoes=form.observacoes.data,
+            chave_idempotencia=ler_chave_idempotencia(form)
         )
 
         flash(mensagem, 'success' if sucesso else 'danger')
         if sucesso:
             return redirect(url_for('pagamentos.ver_pagamentos', id=utilizador.id))
-    else:
+    elif form.is_submitted():
         flash('Por favor, verifique os dados do formulário.', 'warning')
 
+    if not form.chave_idempotencia.data:
+        form.chave_idempotencia.data = uuid.uuid4().hex
+
     return render_template('pagamento_novo.html', form=form, utilizador=utilizador)
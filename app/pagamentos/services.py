@@ -1,16 +1,80 @@
 from app.extensions import db
 from app.utilizadores.models import PerfilEnum, Utilizador
-from app.historico.services import registar_alteracao_perfil
-from app.pagamentos.models import Pagamento, TipoServicoEnum
-from typing import Optional
-from decimal import Decimal
+from app.historico.services import adicionar_alteracao_perfil
+from app.historico.outbox import outbox_historico
+from app.pagamentos.models import ChaveIdempotencia, Pagamento, ResumoPagamentosUtilizador, TipoServicoEnum
+from app.relatorios.cache import cache_relatorios
+from app.historico.models import HistoricoAlteracaoPerfil
+from app.relatorios.services import actualizar_resumo_mensal, actualizar_resumo_mensal_em_lote
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from dataclasses import dataclass
+import base64
+from decimal import Decimal, InvalidOperation
+from datetime import datetime, timezone
+from itertools import islice
+import re
 
+from sqlalchemy import case, delete, func, insert, literal, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 
-def processar_pagamento(utilizador_id: int, valor: Decimal, tipo_servico: str, metodo_pagamento: str, observacoes: Optional[str]):
+# pagamentos gravados por transacção na importação em lote
+TAMANHO_LOTE_IMPORTACAO = 1000
+
+# limites da paginação do histórico de pagamentos
+PAGAMENTOS_POR_PAGINA = 20
+MAX_PAGAMENTOS_POR_PAGINA = 100
+
+# chaves de idempotência: até 64 caracteres (ChaveIdempotencia.chave), por
+# exemplo um UUID, com ou sem hífens
+FORMATO_CHAVE_IDEMPOTENCIA = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+def chave_idempotencia_valida(chave: str) -> bool:
+    '''True se a chave pode ser gravada em ChaveIdempotencia.'''
+    return FORMATO_CHAVE_IDEMPOTENCIA.fullmatch(chave) is not None
+
+
+def _em_utc(data: datetime) -> datetime:
+    '''Data com fuso UTC; as datas sem fuso são tomadas como UTC.'''
+    if data.tzinfo is None:
+        return data.replace(tzinfo=timezone.utc)
+    return data.astimezone(timezone.utc)
+
+
+def _resultado_idempotente(chave: str, utilizador_id: int) -> Optional[Tuple[bool, str]]:
+    '''Resultado já guardado para a chave, ou None se a chave é nova.'''
+    registo = db.session.get(ChaveIdempotencia, chave)
+    if registo is None:
+        return None
+    if registo.utilizador_id != utilizador_id:
+        return False, 'Chave de idempotência inválida.'
+    return registo.sucesso, registo.mensagem
+
+
+def processar_pagamento(utilizador_id: int, valor: Decimal, tipo_servico: str,
+                        metodo_pagamento: str, observacoes: Optional[str],
+                        chave_idempotencia: Optional[str] = None):
     '''
     Processa o pagamento, regista histórico e atualiza o perfil do utilizador, se necessário.
+
+    Pagamento, resumo mensal, alteração de perfil e histórico são gravados
+    num único commit. Com HISTORICO_OUTBOX_ACTIVO o histórico é gravado
+    depois, em lote, pela outbox (ver app/historico/outbox.py).
+
+    Com `chave_idempotencia`, uma repetição da mesma submissão (duplo clique,
+    reenvio após timeout) devolve o resultado original sem criar outro
+    pagamento. Só as submissões bem-sucedidas guardam a chave.
     '''
 
+    if chave_idempotencia:
+        if not chave_idempotencia_valida(chave_idempotencia):
+            return False, 'Chave de idempotência inválida.'
+        anterior = _resultado_idempotente(chave_idempotencia, utilizador_id)
+        if anterior is not None:
+            return anterior
+
     try:
         utilizador = db.session.get(Utilizador, utilizador_id)
         if not utilizador:
@@ -22,12 +86,21 @@ def processar_pagamento(utilizador_id: int, valor: Decimal, tipo_servico: str, m
         # Cria e grava o pagamento
         pagamento = Pagamento(
             utilizador_id=utilizador_id,  # type:ignore
-            tipo_servico=TipoServicoEnum[tipo_servico.upper()],  # type:ignore
+            tipo_servico=TipoServicoEnum[tipo_servico],  # type:ignore
             valor=valor,  # type:ignore
             metodo_pagamento=metodo_pagamento,  # type:ignore
-            observacoes=observacoes or None  # type:ignore
         )
         db.session.add(pagamento)
+        db.session.flush()
+
+        # Resumos (relatórios e painel do utilizador), na mesma transacção
+        actualizar_resumo_mensal(pagamento)
+        actualizar_resumo_utilizadores([{
+            'utilizador_id': utilizador_id,
+            'tipo_servico': pagamento.tipo_servico,
+            'valor': pagamento.valor,
+            'data_pagamento': pagamento.data_pagamento,
+        }])
 
         # --- Atualização automática do perfil ---
         perfil_antigo = utilizador.perfil
@@ -41,22 +114,52 @@ def processar_pagamento(utilizador_id: int, valor: Decimal, tipo_servico: str, m
             utilizador.perfil = PerfilEnum.cliente
             perfil_novo = PerfilEnum.cliente
 
-        db.session.commit()
-
         # Registo no histórico
-        registar_alteracao_perfil(
-            utilizador_id=utilizador.id,
-            motivo=f'Pagamento de {tipo_servico}',
-            perfil_antigo=perfil_antigo.value,
-            perfil_novo=perfil_novo.value,
-            dados_extra={
-                'valor': valor,
+        historico = {
+            'utilizador_id': utilizador.id,
+            'motivo': f'Pagamento de {tipo_servico}',
+            'perfil_antigo': perfil_antigo.value,
+            'perfil_novo': perfil_novo.value,
+            'dados_extra': {
+                'pagamento_id': pagamento.id,
+                'valor': str(valor),
                 'metodo_pagamento': metodo_pagamento,
                 'observacoes': observacoes
             }
-        )
+        }
+
+        mensagem = f'Pagamento de {tipo_servico} concluído com sucesso.'
+        if chave_idempotencia:
+            # chave primária: duas submissões simultâneas não passam ambas
+            db.session.add(ChaveIdempotencia(
+                chave=chave_idempotencia,  # type:ignore
+                utilizador_id=utilizador_id,  # type:ignore
+                pagamento_id=pagamento.id,  # type:ignore
+                sucesso=True,  # type:ignore
+                mensagem=mensagem,  # type:ignore
+            ))
 
-        return True, f'Pagamento de {tipo_servico} concluído com sucesso.'
+        if outbox_historico.activo:
+            db.session.commit()
+            # só depois do commit: nunca há histórico de um pagamento anulado
+            outbox_historico.enfileirar(historico)
+        else:
+            adicionar_alteracao_perfil(**historico)
+            db.session.commit()
+
+        # os relatórios em cache deixam de reflectir os pagamentos
+        cache_relatorios.invalidar()
+
+        return True, mensagem
+
+    except IntegrityError as e:
+        db.session.rollback()
+        if chave_idempotencia:
+            # outra submissão com a mesma chave foi gravada entretanto
+            anterior = _resultado_idempotente(chave_idempotencia, utilizador_id)
+            if anterior is not None:
+                return anterior
+        return False, str(e)
 
     except Exception as e:
         db.session.rollback()
@@ -65,11 +168,349 @@ def processar_pagamento(utilizador_id: int, valor: Decimal, tipo_servico: str, m
 
 def get_pag_por_utilizador(utilizador_id):
     lista_pagamentos = db.session.query(Pagamento).filter_by(utilizador_id=utilizador_id).order_by(
-        Pagamento.data_pagamento.desc().all())
+        Pagamento.data_pagamento.desc()).all()
     return lista_pagamentos
 
 
 def get_pag_recentes(utilizador_id, limite=5):
     pagamentos_recentes = db.session.query(Pagamento).filter_by(utilizador_id=utilizador_id).order_by(
-        Pagamento.data_pagamento.desc().limit(limite).all())
+        Pagamento.data_pagamento.desc()).limit(limite).all()
     return pagamentos_recentes
+
+
+def _coluna_quantidade(tipo) -> str:
+    return f'qtd_{getattr(tipo, "value", tipo)}'
+
+
+def actualizar_resumo_utilizadores(pagamentos) -> None:
+    '''
+    Soma pagamentos (dicts com utilizador_id, tipo_servico, valor e
+    data_pagamento) aos totais acumulados de cada utilizador.
+
+    Um único INSERT ... ON CONFLICT DO UPDATE por chamada (executemany,
+    uma linha por utilizador). Não faz commit: é chamado dentro da
+    transacção que grava os pagamentos.
+    '''
+    ano = datetime.now(timezone.utc).year
+    tipos = [_coluna_quantidade(t) for t in TipoServicoEnum]
+    linhas: Dict[int, Dict] = {}
+
+    for p in pagamentos:
+        # datas com e sem fuso não se comparam; tudo em UTC
+        data = _em_utc(p['data_pagamento'])
+        linha = linhas.get(p['utilizador_id'])
+        if linha is None:
+            linha = linhas[p['utilizador_id']] = {
+                'utilizador_id': p['utilizador_id'], 'total_pago': Decimal(0),
+                'quantidade': 0, 'ano_referencia': ano, 'total_ano': Decimal(0),
+                'ultimo_pagamento': data,
+                **{coluna: 0 for coluna in tipos}}
+        linha['total_pago'] += p['valor']
+        linha['quantidade'] += 1
+        linha[_coluna_quantidade(p['tipo_servico'])] += 1
+        if data.year == ano:
+            linha['total_ano'] += p['valor']
+        if data > linha['ultimo_pagamento']:
+            linha['ultimo_pagamento'] = data
+
+    if not linhas:
+        return
+
+    tabela = ResumoPagamentosUtilizador.__table__
+    dialecto = db.session.get_bind().dialect.name
+    stmt = (pg_insert if dialecto == 'postgresql' else sqlite_insert)(tabela)
+    novo = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['utilizador_id'],
+        set_={
+            'total_pago': tabela.c.total_pago + novo.total_pago,
+            'quantidade': tabela.c.quantidade + novo.quantidade,
+            'total_ano': case(
+                (tabela.c.ano_referencia == novo.ano_referencia,
+                 tabela.c.total_ano + novo.total_ano),
+                else_=novo.total_ano),
+            'ano_referencia': novo.ano_referencia,
+            'ultimo_pagamento': case(
+                (tabela.c.ultimo_pagamento.is_(None), novo.ultimo_pagamento),
+                (novo.ultimo_pagamento > tabela.c.ultimo_pagamento,
+                 novo.ultimo_pagamento),
+                else_=tabela.c.ultimo_pagamento),
+            **{coluna: tabela.c[coluna] + novo[coluna] for coluna in tipos},
+        }
+    )
+    db.session.execute(stmt, list(linhas.values()))
+
+
+def get_resumo_utilizador(utilizador_id: int) -> Dict:
+    '''
+    Totais de pagamentos do utilizador, lidos da tabela desnormalizada
+    (uma leitura por chave primária, sem agregações).
+
+    Retorna {'total_pago', 'total_ano', 'quantidade', 'ultimo_pagamento',
+    'por_tipo': {tipo: quantidade}}.
+    '''
+    resumo = db.session.get(ResumoPagamentosUtilizador, utilizador_id)
+    ano = datetime.now(timezone.utc).year
+
+    if resumo is None:
+        return {'total_pago': Decimal(0), 'total_ano': Decimal(0),
+                'quantidade': 0, 'ultimo_pagamento': None,
+                'por_tipo': {t.value: 0 for t in TipoServicoEnum}}
+
+    return {
+        'total_pago': resumo.total_pago,
+        # o total do ano só vale para o ano em que foi acumulado
+        'total_ano': resumo.total_ano if resumo.ano_referencia == ano else Decimal(0),
+        'quantidade': resumo.quantidade,
+        'ultimo_pagamento': resumo.ultimo_pagamento,
+        'por_tipo': {t.value: getattr(resumo, _coluna_quantidade(t))
+                     for t in TipoServicoEnum},
+    }
+
+
+def reconstruir_resumo_utilizadores() -> int:
+    '''
+    Recalcula os totais de todos os utilizadores a partir da tabela de
+    pagamentos, com um único INSERT ... SELECT agrupado.
+    Retorna o número de utilizadores com resumo.
+    '''
+    ano = datetime.now(timezone.utc).year
+    inicio_ano = datetime(ano, 1, 1)
+
+    agregado = select(
+        Pagamento.utilizador_id,
+        func.sum(Pagamento.valor),
+        func.count(Pagamento.id),
+        literal(ano),
+        func.coalesce(func.sum(case(
+            (Pagamento.data_pagamento >= inicio_ano, Pagamento.valor),
+            else_=0)), 0),
+        func.max(Pagamento.data_pagamento),
+        *[func.sum(case((Pagamento.tipo_servico == t, 1), else_=0))
+          for t in TipoServicoEnum],
+    ).group_by(Pagamento.utilizador_id)
+
+    tabela = ResumoPagamentosUtilizador.__table__
+    colunas = ['utilizador_id', 'total_pago', 'quantidade', 'ano_referencia',
+               'total_ano', 'ultimo_pagamento'] + [
+        _coluna_quantidade(t) for t in TipoServicoEnum]
+    try:
+        db.session.execute(delete(tabela))
+        db.session.execute(tabela.insert().from_select(colunas, agregado))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return db.session.query(func.count(ResumoPagamentosUtilizador.utilizador_id)).scalar() or 0
+
+
+@dataclass
+class PaginaPagamentos:
+    itens: List[Pagamento]
+    proximo_cursor: Optional[str] = None
+
+    @property
+    def tem_mais(self) -> bool:
+        return self.proximo_cursor is not None
+
+
+def _codificar_cursor(pagamento: Pagamento) -> str:
+    chave = f'{pagamento.data_pagamento.isoformat()}|{pagamento.id}'
+    return base64.urlsafe_b64encode(chave.encode()).decode()
+
+
+def _descodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        data, pagamento_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(data), int(pagamento_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor de paginação inválido.') from e
+
+
+def paginar_pag_por_utilizador(utilizador_id: int, cursor: Optional[str] = None,
+                               por_pagina: int = PAGAMENTOS_POR_PAGINA) -> PaginaPagamentos:
+    '''
+    Página de pagamentos do utilizador, do mais recente para o mais antigo.
+
+    Paginação por chave (keyset) sobre (data_pagamento, id): o cursor
+    identifica o último pagamento da página anterior e a consulta continua
+    a partir dele no índice ix_pagamentos_utilizador_data, por isso o
+    custo de cada página não depende de quantas páginas ficaram para trás
+    (ao contrário de OFFSET).
+
+    Levanta ValueError se o cursor for inválido.
+    '''
+    por_pagina = max(1, min(int(por_pagina), MAX_PAGAMENTOS_POR_PAGINA))
+
+    stmt = select(Pagamento).where(Pagamento.utilizador_id == utilizador_id)
+    if cursor:
+        data, pagamento_id = _descodificar_cursor(cursor)
+        stmt = stmt.where(tuple_(Pagamento.data_pagamento, Pagamento.id)
+                          < tuple_(data, pagamento_id))
+
+    # pedir mais um para saber se existe página seguinte
+    stmt = stmt.order_by(Pagamento.data_pagamento.desc(),
+                         Pagamento.id.desc()).limit(por_pagina + 1)
+    itens = list(db.session.execute(stmt).scalars())
+
+    proximo = None
+    if len(itens) > por_pagina:
+        itens = itens[:por_pagina]
+        proximo = _codificar_cursor(itens[-1])
+
+    return PaginaPagamentos(itens=itens, proximo_cursor=proximo)
+
+
+def _validar_linha_importacao(linha: Mapping) -> Tuple[Optional[Dict], Optional[str]]:
+    '''Converte uma linha do ficheiro num dict de Pagamento, ou devolve o erro.'''
+    try:
+        utilizador_id = int(linha.get('utilizador_id') or '')
+    except ValueError:
+        return None, 'utilizador_id inválido'
+
+    try:
+        valor = Decimal(str(linha.get('valor') or '').strip())
+    except InvalidOperation:
+        return None, 'valor inválido'
+    if not valor.is_finite() or valor <= 0:
+        return None, 'valor deve ser positivo'
+
+    tipo_servico = (linha.get('tipo_servico') or '').strip()
+    if tipo_servico not in TipoServicoEnum._member_names_:
+        return None, f'tipo de serviço inválido: {tipo_servico}'
+
+    metodo_pagamento = (linha.get('metodo_pagamento') or '').strip()
+    if not metodo_pagamento:
+        return None, 'método de pagamento em falta'
+
+    data_texto = (linha.get('data_pagamento') or '').strip()
+    try:
+        # sem fuso no ficheiro, a data é UTC (como as gravadas pela aplicação)
+        data = _em_utc(datetime.fromisoformat(
+            data_texto)) if data_texto else datetime.now(timezone.utc)
+    except ValueError:
+        return None, f'data inválida: {data_texto}'
+
+    return {
+        'utilizador_id': utilizador_id,
+        'tipo_servico': TipoServicoEnum[tipo_servico],
+        'valor': valor.quantize(Decimal('0.01')),
+        'metodo_pagamento': metodo_pagamento,
+        'data_pagamento': data,
+    }, None
+
+
+def _gravar_lote_importacao(pagamentos: List[Dict], perfis: Dict[int, PerfilEnum]) -> None:
+    '''
+    Grava um lote já validado numa única transacção: pagamentos e histórico
+    com INSERTs em lote, resumo mensal, e promoção cliente -> aluno num
+    único UPDATE para todos os utilizadores que pagaram matrícula.
+    '''
+    agora = datetime.now(timezone.utc)
+    historico = []
+    promover = set()
+
+    # percorrer pela ordem do ficheiro, como processar_pagamento faria
+    for p in pagamentos:
+        uid = p['utilizador_id']
+        perfil_antigo = perfis[uid]
+        perfil_novo = perfil_antigo
+        if p['tipo_servico'] == TipoServicoEnum.matricula and perfil_antigo == PerfilEnum.cliente:
+            perfil_novo = PerfilEnum.aluno
+            perfis[uid] = perfil_novo
+            promover.add(uid)
+
+        historico.append({
+            'utilizador_id': uid,
+            'motivo': f'Pagamento de {p["tipo_servico"].value}',
+            'perfil_antigo': perfil_antigo.value,
+            'perfil_novo': perfil_novo.value,
+            'data_alteracao': agora,
+            'dados_extra': {
+                'valor': str(p['valor']),
+                'metodo_pagamento': p['metodo_pagamento'],
+                'origem': 'importacao',
+            },
+        })
+
+    try:
+        db.session.execute(insert(Pagamento), pagamentos)
+        db.session.execute(insert(HistoricoAlteracaoPerfil), historico)
+        actualizar_resumo_mensal_em_lote(pagamentos)
+        actualizar_resumo_utilizadores(pagamentos)
+
+        if promover:
+            db.session.execute(
+                update(Utilizador)
+                .where(Utilizador.id.in_(promover),
+                       Utilizador.perfil == PerfilEnum.cliente)
+                .values(perfil=PerfilEnum.aluno)
+                .execution_options(synchronize_session=False))
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def importar_pagamentos(linhas: Iterable[Mapping], tamanho_lote: int = TAMANHO_LOTE_IMPORTACAO) -> Dict:
+    '''
+    Importa pagamentos em lote (ex.: reconciliação mensal com o banco).
+
+    `linhas` é um iterável de dicts com utilizador_id, valor, tipo_servico,
+    metodo_pagamento e, opcionalmente, data_pagamento (ISO). É lido em
+    blocos de `tamanho_lote`: cada bloco é validado de uma vez (incluindo
+    a existência dos utilizadores, numa só consulta) e gravado numa única
+    transacção. Se um bloco falhar na base de dados, só esse bloco é
+    descartado.
+
+    Retorna {'importados': int, 'rejeitados': int, 'erros': [(linha, motivo)]}.
+    '''
+    resultado = {'importados': 0, 'rejeitados': 0, 'erros': []}
+    iterador = iter(linhas)
+    numero = 0
+
+    while True:
+        bloco = list(islice(iterador, tamanho_lote))
+        if not bloco:
+            break
+
+        validos = []
+        for linha in bloco:
+            numero += 1
+            pagamento, erro = _validar_linha_importacao(linha)
+            if erro:
+                resultado['erros'].append((numero, erro))
+            else:
+                validos.append((numero, pagamento))
+
+        ids = {p['utilizador_id'] for _, p in validos}
+        perfis = dict(db.session.execute(
+            select(Utilizador.id, Utilizador.perfil).where(Utilizador.id.in_(ids))
+        ).tuples().all()) if ids else {}
+
+        pagamentos = []
+        for n, p in validos:
+            if p['utilizador_id'] in perfis:
+                pagamentos.append(p)
+            else:
+                resultado['erros'].append((n, 'utilizador não encontrado'))
+
+        if pagamentos:
+            try:
+                _gravar_lote_importacao(pagamentos, perfis)
+                resultado['importados'] += len(pagamentos)
+            except Exception as e:
+                primeira = numero - len(bloco) + 1
+                resultado['erros'].append(
+                    (primeira, f'lote {primeira}-{numero} descartado: {e}'))
+
+        resultado['rejeitados'] = numero - resultado['importados']
+
+    if resultado['importados']:
+        cache_relatorios.invalidar()
+
+    resultado['erros'].sort(key=lambda erro: erro[0])
+    return resultado
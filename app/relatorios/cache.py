@@ -0,0 +1,154 @@
+'''
+Cache dos relatórios.
+
+As funções de relatório são funções puras dos argumentos (ano, inicio,
+fim) e do conteúdo da tabela de pagamentos. O resultado fica em cache
+com uma chave que inclui uma versão global; processar_pagamento
+incrementa a versão e as entradas antigas deixam de ser usadas (expiram
+pelo TTL ou saem pelo LRU).
+
+Por omissão o backend é um LRU em memória do processo. Qualquer objecto
+com get/set/incrementar (ex.: um adaptador para Redis) pode ser usado
+para partilhar a cache entre workers.
+
+Outros módulos podem ter a sua própria cache (ex.: o calendário do hotel)
+com outro prefixo: a versão e as chaves de cada uma são independentes.
+'''
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from typing import Any, Optional, Protocol
+
+_AUSENTE = object()
+
+
+class BackendCache(Protocol):
+    def get(self, chave: str) -> Any: ...
+    def set(self, chave: str, valor: Any, ttl: Optional[float] = None) -> None: ...
+    def incrementar(self, chave: str) -> int: ...
+    def limpar(self) -> None: ...
+
+
+class CacheLRU:
+    '''Cache LRU em memória, com TTL, segura para várias threads.'''
+
+    def __init__(self, max_entradas=512, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._dados: OrderedDict = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, chave):
+        with self._lock:
+            entrada = self._dados.get(chave, _AUSENTE)
+            if entrada is _AUSENTE:
+                return _AUSENTE
+            expira, valor = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._dados[chave]
+                return _AUSENTE
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._dados[chave] = (expira, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+
+    def incrementar(self, chave):
+        with self._lock:
+            _, valor = self._dados.get(chave, (None, 0))
+            valor += 1
+            # contadores não expiram nem contam para o LRU
+            self._dados[chave] = (None, valor)
+            return valor
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+
+class CacheRelatorios:
+    '''
+    Memoriza funções de relatório com invalidação por versão.
+
+    Uso:
+        @cache_relatorios.memorizar
+        def get_total_por_mes(ano): ...
+
+        cache_relatorios.invalidar()  # depois de gravar um pagamento
+    '''
+
+    def __init__(self, backend: Optional[BackendCache] = None,
+                 prefixo: str = 'relatorios'):
+        self.backend: Any = backend or CacheLRU()
+        self.prefixo = prefixo
+        self.chave_versao = f'{prefixo}:versao'
+        self.activo = True
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app, backend: Optional[BackendCache] = None):
+        self.activo = app.config.get('RELATORIOS_CACHE_ACTIVO', True)
+        if backend is not None:
+            self.backend = backend
+        elif isinstance(self.backend, CacheLRU):
+            self.backend = CacheLRU(
+                max_entradas=app.config.get('RELATORIOS_CACHE_MAX', 512),
+                ttl=app.config.get('RELATORIOS_CACHE_TTL', 300))
+
+    def versao(self) -> int:
+        versao = self.backend.get(self.chave_versao)
+        return 0 if versao is _AUSENTE or versao is None else int(versao)
+
+    def invalidar(self):
+        '''Torna obsoletos todos os resultados guardados.'''
+        self.backend.incrementar(self.chave_versao)
+
+    def limpar(self):
+        self.backend.limpar()
+        self.hits = 0
+        self.misses = 0
+
+    def memorizar(self, funcao):
+        '''Decorador: guarda o resultado por (função, argumentos, versão).'''
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not self.activo:
+                return funcao(*args, **kwargs)
+
+            argumentos = repr((args, sorted(kwargs.items())))
+            chave = f'{self.prefixo}:{self.versao()}:{funcao.__name__}:{argumentos}'
+
+            valor = self.backend.get(chave)
+            if valor is not _AUSENTE and valor is not None:
+                self.hits += 1
+                return valor
+
+            self.misses += 1
+            valor = funcao(*args, **kwargs)
+            self.backend.set(chave, valor)
+            return valor
+
+        return envolvida
+
+    def estatisticas(self):
+        pedidos = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': round(self.hits / pedidos, 4) if pedidos else 0.0,
+            'versao': self.versao(),
+            'entradas': len(self.backend) if hasattr(self.backend, '__len__') else None,
+        }
+
+
+cache_relatorios = CacheRelatorios()
@@ -0,0 +1,141 @@
+'''
+Camada de consultas dos relatórios.
+
+Expressões SQL portáveis para agrupar pagamentos por períodos de tempo.
+Cada expressão é compilada de acordo com o dialecto da base de dados:
+EXTRACT no PostgreSQL (produção) e strftime no SQLite (desenvolvimento
+e testes), para que a mesma consulta corra nos dois motores.
+'''
+from datetime import date, datetime
+
+from sqlalchemy import Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+# campos suportados -> formato strftime equivalente no SQLite
+_CAMPOS_SQLITE = {
+    'year': '%Y',
+    'month': '%m',
+    'day': '%d',
+}
+
+CAMPOS_DATA = ('year', 'quarter', 'month', 'day')
+
+
+class parte_data(FunctionElement):
+    '''
+    Extrai uma parte inteira (ano, trimestre, mês, dia) de uma coluna de data.
+
+    Uso:
+        parte_data('quarter', Pagamento.data_pagamento).label('trimestre')
+    '''
+    type = Integer()
+    inherit_cache = True
+    name = 'parte_data'
+    # o campo faz parte da chave da cache de SQL compilado
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ('campo', InternalTraversal.dp_string)]
+
+    def __init__(self, campo, coluna, **kwargs):
+        if campo not in CAMPOS_DATA:
+            raise ValueError(f'Campo de data inválido: {campo}')
+        self.campo = campo
+        super().__init__(coluna, **kwargs)
+
+
+@compiles(parte_data)
+def _parte_data_padrao(element, compiler, **kw):
+    coluna = compiler.process(list(element.clauses)[0], **kw)
+    return f'CAST(EXTRACT({element.campo.upper()} FROM {coluna}) AS INTEGER)'
+
+
+@compiles(parte_data, 'sqlite')
+def _parte_data_sqlite(element, compiler, **kw):
+    coluna = compiler.process(list(element.clauses)[0], **kw)
+    if element.campo == 'quarter':
+        return f"((CAST(strftime('%m', {coluna}) AS INTEGER) + 2) / 3)"
+    formato = _CAMPOS_SQLITE[element.campo]
+    return f"CAST(strftime('{formato}', {coluna}) AS INTEGER)"
+
+
+GRANULARIDADES = ('day', 'week', 'month', 'quarter', 'year')
+
+
+class truncar_data(FunctionElement):
+    '''
+    Trunca uma coluna de data ao início do período da granularidade
+    (dia, semana a começar à segunda-feira, mês, trimestre ou ano).
+
+    No PostgreSQL usa date_trunc; no SQLite devolve o texto 'AAAA-MM-DD'.
+    Use periodo_para_date() para normalizar o valor lido.
+    '''
+    inherit_cache = True
+    name = 'truncar_data'
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ('granularidade', InternalTraversal.dp_string)]
+
+    def __init__(self, granularidade, coluna, **kwargs):
+        if granularidade not in GRANULARIDADES:
+            raise ValueError(f'Granularidade inválida: {granularidade}')
+        self.granularidade = granularidade
+        super().__init__(coluna, **kwargs)
+
+
+@compiles(truncar_data)
+def _truncar_data_padrao(element, compiler, **kw):
+    coluna = compiler.process(list(element.clauses)[0], **kw)
+    return f"date_trunc('{element.granularidade}', {coluna})"
+
+
+@compiles(truncar_data, 'sqlite')
+def _truncar_data_sqlite(element, compiler, **kw):
+    coluna = compiler.process(list(element.clauses)[0], **kw)
+    granularidade = element.granularidade
+    if granularidade == 'day':
+        return f'date({coluna})'
+    if granularidade == 'week':
+        # %w: 0 = domingo; recuar até à segunda-feira, como o date_trunc
+        return (f"date({coluna}, '-' || ((CAST(strftime('%w', {coluna}) AS INTEGER) + 6) % 7)"
+                f" || ' days')")
+    if granularidade == 'month':
+        return f"strftime('%Y-%m-01', {coluna})"
+    if granularidade == 'quarter':
+        return (f"printf('%s-%02d-01', strftime('%Y', {coluna}), "
+                f"((CAST(strftime('%m', {coluna}) AS INTEGER) - 1) / 3) * 3 + 1)")
+    return f"strftime('%Y-01-01', {coluna})"
+
+
+def periodo_para_date(valor) -> date:
+    '''Normaliza o resultado de truncar_data (datetime ou texto) para date.'''
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def inicio_periodo(dia: date, granularidade: str) -> date:
+    '''Equivalente em Python de truncar_data, para gerar os períodos vazios.'''
+    if granularidade == 'day':
+        return dia
+    if granularidade == 'week':
+        return date.fromordinal(dia.toordinal() - dia.weekday())
+    if granularidade == 'month':
+        return dia.replace(day=1)
+    if granularidade == 'quarter':
+        return date(dia.year, (dia.month - 1) // 3 * 3 + 1, 1)
+    return date(dia.year, 1, 1)
+
+
+def proximo_periodo(dia: date, granularidade: str) -> date:
+    '''Início do período seguinte a `dia` (que já deve estar truncado).'''
+    if granularidade == 'day':
+        return date.fromordinal(dia.toordinal() + 1)
+    if granularidade == 'week':
+        return date.fromordinal(dia.toordinal() + 7)
+    if granularidade == 'year':
+        return date(dia.year + 1, 1, 1)
+    meses = 1 if granularidade == 'month' else 3
+    mes = dia.month - 1 + meses
+    return date(dia.year + mes // 12, mes % 12 + 1, 1)
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from sqlalchemy import Integer, String, Numeric, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.extensions import Base
+
+
+class ResumoMensalPagamento(Base):
+    '''
+    Agregado mensal dos pagamentos (tabela de rollup).
+
+    Uma linha por (ano, mês, tipo de serviço, método de pagamento),
+    mantida de forma incremental por processar_pagamento e reconstruída
+    com o comando `flask reconstruir-resumo-pagamentos`.
+    Os relatórios lêem daqui em vez de agregar a tabela de pagamentos.
+    '''
+
+    __tablename__ = 'resumo_mensal_pagamentos'
+    __table_args__ = (
+        UniqueConstraint('ano', 'mes', 'tipo_servico', 'metodo_pagamento',
+                         name='uq_resumo_mensal_pagamentos_chave'),
+    )
+
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    ano: Mapped[int] = mapped_column(Integer, nullable=False)
+    mes: Mapped[int] = mapped_column(Integer, nullable=False)
+    tipo_servico: Mapped[str] = mapped_column(String(50), nullable=False)
+    metodo_pagamento: Mapped[str] = mapped_column(String(50), nullable=False)
+    quantidade: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0)
+    total: Mapped[Decimal] = mapped_column(
+        Numeric(14, 2), nullable=False, default=0)
+    menor: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+    maior: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
+
+    def __repr__(self):
+        return (f'<ResumoMensalPagamento {self.ano}-{self.mes:02d} '
+                f'{self.tipo_servico}/{self.metodo_pagamento}: {self.total}>')
@@ -1,12 +1,23 @@
-from datetime import datetime
-from flask import Blueprint, render_template, request, current_app
-from flask_login import login_required, current_user
+import hashlib
+import tempfile
+from datetime import date, datetime, time
+from flask import Blueprint, Response, abort, jsonify, render_template, request, send_file, stream_with_context, url_for
+from flask_login import login_required
 
 from app.relatorios.services import (
     get_total_por_mes,
     get_total_por_trimestre,
     get_resumo_estatistico,
+    exportar_csv,
+    exportar_parquet,
+    assinatura_periodo,
+    get_serie_temporal,
+    GRANULARIDADES,
+    AGRUPAMENTOS_SERIE,
 )
+from app.decorators import roles_required
+from app.relatorios.cache import cache_relatorios
+from app.relatorios.tarefas import iniciar_exportacao_pdf, obter_tarefa, CONCLUIDA
 from app.relatorios.schemas import (
     serialize_mensais,
     serialize_trimestrais,
@@ -16,6 +27,50 @@ from app.relatorios.schemas import (
 relatorio_bp = Blueprint("relatorio", __name__, template_folder="templates")
 
 
+def _ler_data(nome):
+    '''Lê uma data ISO dos parâmetros do pedido (None se ausente ou inválida).'''
+    valor = request.args.get(nome)
+    try:
+        return datetime.fromisoformat(valor) if valor else None
+    except ValueError:
+        return None
+
+
+def _fim_de_hoje():
+    '''
+    `fim` por omissão: o fim do dia de hoje. É o mesmo em todos os pedidos
+    do dia, por isso serve de chave de cache e de ETag; os pagamentos
+    novos de hoje mudam a assinatura_periodo.
+    '''
+    return datetime.combine(date.today(), time.max)
+
+
+def _periodo_ano(ano):
+    return datetime(ano, 1, 1), datetime(ano, 12, 31, 23, 59, 59, 999999)
+
+
+def _json_condicional(chave, inicio, fim, gerar):
+    '''
+    Resposta JSON com ETag forte derivada do último pagamento do período.
+
+    A ETag é calculada antes dos dados: se o cliente enviar If-None-Match
+    com a mesma ETag responde 304 sem executar `gerar`.
+    '''
+    assinatura = assinatura_periodo(inicio, fim)
+    etag = hashlib.sha1(repr((chave, assinatura)).encode()).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        resposta = jsonify(gerar())
+
+    resposta.set_etag(etag)
+    # obriga o browser/proxy a revalidar sempre, mas permite guardar a cópia
+    resposta.cache_control.private = True
+    resposta.cache_control.no_cache = True
+    return resposta
+
+
 @relatorio_bp.route('/')
 @login_required
 def index():
@@ -29,19 +84,8 @@ def perfil(email):
     Exibe o painel de relatórios com filtros e gráficos.
     '''
     ano = request.args.get('ano', type=int, default=datetime.now().year)
-    inicio_str = request.args.get('inicio')
-    fim_str = request.args.get('fim')
-
-    inicio = None
-    fim = None
-    try:
-        inicio = datetime.fromisoformat(inicio_str) if inicio_str else None
-    except ValueError:
-        inicio = None
-    try:
-        fim = datetime.fromisoformat(fim_str) if fim_str else None
-    except ValueError:
-        fim = None
+    inicio = _ler_data('inicio')
+    fim = _ler_data('fim')
 
     raw_mensais = get_total_por_mes(ano)
     raw_trimestrais = get_total_por_trimestre(ano)
@@ -53,5 +97,160 @@ def perfil(email):
     resumo = serialize_resumo(raw_resumo)
 
     return render_template(
-        'index.html'
+        'index.html',
+        por_mes=por_mes,
+        por_trimestre=por_trimestre,
+        resumo=resumo
+    )
+
+
+@relatorio_bp.route('/exportar/csv')
+@login_required
+def exportar_pagamentos_csv():
+    '''
+    Descarrega os pagamentos do período em CSV, enviado em streaming.
+    Por omissão exporta desde o início do ano corrente até agora.
+    '''
+    fim = _ler_data('fim') or datetime.now()
+    inicio = _ler_data('inicio') or datetime(fim.year, 1, 1)
+
+    nome = f'pagamentos_{inicio:%Y%m%d}_{fim:%Y%m%d}.csv'
+    return Response(
+        stream_with_context(exportar_csv(inicio, fim)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={nome}'}
     )
+
+
+@relatorio_bp.route('/exportar/parquet')
+@login_required
+def exportar_pagamentos_parquet():
+    '''
+    Descarrega os pagamentos do período em Parquet para análise.
+    O ficheiro é montado num temporário (em disco se for grande), porque
+    o formato Parquet só fica completo quando o rodapé é escrito.
+    '''
+    fim = _ler_data('fim') or datetime.now()
+    inicio = _ler_data('inicio') or datetime(fim.year, 1, 1)
+
+    ficheiro = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    exportar_parquet(inicio, fim, ficheiro)
+    ficheiro.seek(0)
+
+    nome = f'pagamentos_{inicio:%Y%m%d}_{fim:%Y%m%d}.parquet'
+    return send_file(ficheiro, mimetype='application/vnd.apache.parquet',
+                     as_attachment=True, download_name=nome)
+
+
+@relatorio_bp.route('/exportar/pdf', methods=['POST'])
+@login_required
+def exportar_pagamentos_pdf():
+    '''
+    Pede a geração do PDF do período em segundo plano.
+    Devolve o id da tarefa e o URL para consultar o seu estado.
+    '''
+    # fim estável: os pedidos sem fim reutilizam a mesma tarefa
+    fim = _ler_data('fim') or _fim_de_hoje()
+    inicio = _ler_data('inicio') or datetime(fim.year, 1, 1)
+
+    tarefa = iniciar_exportacao_pdf(inicio, fim)
+    resposta = tarefa.to_dict()
+    resposta['url'] = url_for('relatorio.estado_exportacao_pdf',
+                              tarefa_id=tarefa.id)
+    return jsonify(resposta), 200 if tarefa.estado == CONCLUIDA else 202
+
+
+@relatorio_bp.route('/exportar/pdf/<tarefa_id>')
+@login_required
+def estado_exportacao_pdf(tarefa_id):
+    '''Estado de uma exportação PDF; inclui o URL do ficheiro quando pronta.'''
+    tarefa = obter_tarefa(tarefa_id)
+    if not tarefa:
+        abort(404)
+
+    resposta = tarefa.to_dict()
+    if tarefa.estado == CONCLUIDA:
+        resposta['ficheiro'] = url_for('relatorio.descarregar_exportacao_pdf',
+                                       tarefa_id=tarefa.id)
+    return jsonify(resposta)
+
+
+@relatorio_bp.route('/exportar/pdf/<tarefa_id>/ficheiro')
+@login_required
+def descarregar_exportacao_pdf(tarefa_id):
+    tarefa = obter_tarefa(tarefa_id)
+    if not tarefa or tarefa.estado != CONCLUIDA or not tarefa.caminho:
+        abort(404)
+
+    nome = f'pagamentos_{tarefa.inicio:%Y%m%d}_{tarefa.fim:%Y%m%d}.pdf'
+    return send_file(tarefa.caminho, mimetype='application/pdf',
+                     as_attachment=True, download_name=nome)
+
+
+@relatorio_bp.route('/cache/estatisticas')
+@login_required
+@roles_required('administrador')
+def estatisticas_cache():
+    '''Contadores de hits/misses da cache dos relatórios, para monitorização.'''
+    return jsonify(cache_relatorios.estatisticas())
+
+
+@relatorio_bp.route('/api/mensal')
+@login_required
+def api_total_por_mes():
+    '''Totais por mês do ano (?ano=), em JSON com ETag.'''
+    ano = request.args.get('ano', type=int, default=datetime.now().year)
+    inicio, fim = _periodo_ano(ano)
+    return _json_condicional(
+        ('mensal', ano), inicio, fim,
+        lambda: serialize_mensais(get_total_por_mes(ano)))
+
+
+@relatorio_bp.route('/api/trimestral')
+@login_required
+def api_total_por_trimestre():
+    '''Totais por trimestre do ano (?ano=), em JSON com ETag.'''
+    ano = request.args.get('ano', type=int, default=datetime.now().year)
+    inicio, fim = _periodo_ano(ano)
+    return _json_condicional(
+        ('trimestral', ano), inicio, fim,
+        lambda: serialize_trimestrais(get_total_por_trimestre(ano)))
+
+
+@relatorio_bp.route('/api/resumo')
+@login_required
+def api_resumo():
+    '''Resumo estatístico do período (?inicio=&fim=), em JSON com ETag.'''
+    inicio = _ler_data('inicio')
+    fim = _ler_data('fim')
+    return _json_condicional(
+        ('resumo', inicio, fim), inicio, fim,
+        lambda: serialize_resumo(get_resumo_estatistico(inicio, fim)))
+
+
+@relatorio_bp.route('/api/serie')
+@login_required
+def api_serie_temporal():
+    '''
+    Série temporal de pagamentos, em JSON com ETag.
+    Parâmetros: granularidade (day, week, month, quarter, year), inicio,
+    fim e, opcionalmente, agrupar_por (tipo_servico, metodo_pagamento, perfil).
+    '''
+    granularidade = request.args.get('granularidade', 'month')
+    agrupar_por = request.args.get('agrupar_por') or None
+    fim = _ler_data('fim') or _fim_de_hoje()
+    inicio = _ler_data('inicio') or datetime(fim.year, 1, 1)
+
+    if granularidade not in GRANULARIDADES:
+        return jsonify({'erro': f'granularidade deve ser uma de {list(GRANULARIDADES)}'}), 400
+    if agrupar_por and agrupar_por not in AGRUPAMENTOS_SERIE:
+        return jsonify({'erro': f'agrupar_por deve ser um de {list(AGRUPAMENTOS_SERIE)}'}), 400
+    if inicio > fim:
+        return jsonify({'erro': 'inicio deve ser anterior a fim'}), 400
+
+    try:
+        return _json_condicional(
+            ('serie', granularidade, agrupar_por, inicio, fim), inicio, fim,
+            lambda: get_serie_temporal(granularidade, inicio, fim, agrupar_por))
+    except ValueError as erro:
+        return jsonify({'erro': str(erro)}), 400
@@ -3,8 +3,9 @@ Serializadores Marshmallow para os relatórios.
 Normalizam dicts/iterables vindos dos services para listas/dicts JSON-serializáveis.
 '''
 from decimal import Decimal
-from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple, Union, cast
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union, cast
 
+import numpy as np
 from marshmallow import Schema, fields
 
 Number = Union[int, float, Decimal]
@@ -38,6 +39,12 @@ def _to_float_safe(value: Optional[Number]) -> float:
         return 0.0
 
 
+def _linha_par(item: Any) -> bool:
+    '''True para linhas (chave, total), como as Row do SQLAlchemy.'''
+    return (isinstance(item, Sequence) and not isinstance(item, (str, bytes))
+            and len(item) == 2)
+
+
 def _normalize_dict_to_list(raw: Mapping[Any, Number], key_name: str) -> List[Dict[str, Any]]:
     '''
     Converte um mapping {key: number} em lista ordenada
@@ -59,10 +66,59 @@ def _normalize_dict_to_list(raw: Mapping[Any, Number], key_name: str) -> List[Di
     return [{key_name: int(k), 'total': _to_float_safe(v)} for k, v in items]
 
 
+def _materializar(raw: Any) -> Any:
+    '''Mappings, listas e tuplos ficam como estão; outros iteráveis passam a lista.'''
+    return raw if isinstance(raw, (Mapping, list, tuple)) else list(raw)
+
+
+def _serializar_rapido(raw: Any, key_name: str) -> Optional[List[Dict[str, Any]]]:
+    '''
+    Caminho rápido para séries regulares: linhas (chave, total) vindas do
+    SQLAlchemy, dicts {key_name: ..., 'total': ...} ou um mapping
+    {chave: total}. Converte as duas colunas numa única passagem com NumPy
+    e devolve a lista já pronta para JSON (sem passar pelo Marshmallow).
+
+    Devolve None se a entrada não for regular, para usar o caminho tolerante.
+    '''
+    try:
+        if isinstance(raw, Mapping):
+            chaves, totais = list(raw.keys()), list(raw.values())
+        else:
+            linhas = _materializar(raw)
+            if isinstance(linhas[0], Mapping):
+                chaves = [item[key_name] for item in linhas]
+                totais = [item['total'] for item in linhas]
+            else:
+                chaves, totais = zip(*linhas)
+
+        array_chaves = np.asarray(chaves, dtype=np.int64)
+        array_totais = np.asarray(totais, dtype=np.float64)
+    except (TypeError, ValueError, KeyError, IndexError, OverflowError):
+        return None
+
+    if array_chaves.ndim != 1 or array_chaves.shape != array_totais.shape:
+        return None
+    if np.isnan(array_totais).any():
+        # None/NaN: o caminho tolerante converte-os em 0.0
+        return None
+
+    if isinstance(raw, Mapping):
+        ordem = np.argsort(array_chaves, kind='stable')
+        array_chaves, array_totais = array_chaves[ordem], array_totais[ordem]
+
+    return [{key_name: k, 'total': t}
+            for k, t in zip(array_chaves.tolist(), array_totais.tolist())]
+
+
 def serialize_mensais(raw: Any) -> List[Dict[str, Any]]:
     '''Normaliza e serializa totais mensais para lista de dicts {'mes', 'total'}.'''
     if not raw:
         return []
+    # um iterador só se percorre uma vez: os dois caminhos usam a mesma lista
+    raw = _materializar(raw)
+    rapido = _serializar_rapido(raw, 'mes')
+    if rapido is not None:
+        return rapido
     if isinstance(raw, Mapping):
         # assume {mes: total}
         data = _normalize_dict_to_list(raw, 'mes')
@@ -70,6 +126,8 @@ def serialize_mensais(raw: Any) -> List[Dict[str, Any]]:
         # assume iterable of mapping-like items
         data: List[Dict[str, Any]] = []
         for item in raw:
+            if _linha_par(item):
+                item = {'mes': item[0], 'total': item[1]}
             if not isinstance(item, Mapping):
                 continue
             mes = item.get('mes') or item.get('month') or item.get('key')
@@ -91,11 +149,18 @@ def serialize_trimestrais(raw: Any) -> List[Dict[str, Any]]:
     '''Normaliza e serializa totais trimestrais para lista de dicts {'trimestre', 'total'}.'''
     if not raw:
         return []
+    # um iterador só se percorre uma vez: os dois caminhos usam a mesma lista
+    raw = _materializar(raw)
+    rapido = _serializar_rapido(raw, 'trimestre')
+    if rapido is not None:
+        return rapido
     if isinstance(raw, Mapping):
         data = _normalize_dict_to_list(raw, 'trimestre')
     else:
         data = []
         for item in raw:
+            if _linha_par(item):
+                item = {'trimestre': item[0], 'total': item[1]}
             if not isinstance(item, Mapping):
                 continue
             tri = item.get('trimestre') or item.get(
@@ -114,12 +179,33 @@ def serialize_trimestrais(raw: Any) -> List[Dict[str, Any]]:
     return cast(List[Dict[str, Any]], TrimestralItemSchema(many=True).dump(data))
 
 
+CAMPOS_RESUMO = ('total', 'media', 'maior', 'menor')
+
+
+def _serializar_resumo_rapido(raw: Any) -> Optional[Dict[str, Any]]:
+    '''Converte os quatro campos do resumo de uma vez; None se irregular.'''
+    if isinstance(raw, Mapping):
+        valores = [raw.get(campo) for campo in CAMPOS_RESUMO]
+    else:
+        valores = [getattr(raw, campo, None) for campo in CAMPOS_RESUMO]
+    try:
+        array = np.asarray(valores, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if np.isnan(array).any():
+        return None
+    return dict(zip(CAMPOS_RESUMO, array.tolist()))
+
+
 def serialize_resumo(raw: Any) -> Dict[str, Any]:
     '''Normaliza e serializa resumo estatístico para um dict com floats.'''
     if not raw:
         return cast(Dict[str, Any], ResumoSchema().dump(
             {'total': 0.0, 'media': 0.0, 'maior': 0.0, 'menor': 0.0}
         ))
+    rapido = _serializar_resumo_rapido(raw)
+    if rapido is not None:
+        return rapido
     if isinstance(raw, Mapping):
         prepared = {
             'total': _to_float_safe(raw.get('total')),
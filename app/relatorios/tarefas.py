@@ -0,0 +1,169 @@
+'''
+Geração de relatórios PDF em segundo plano.
+
+O pedido HTTP apenas cria uma tarefa e devolve o seu id; o PDF é gerado
+numa thread (com o contexto da aplicação) e gravado em disco, na pasta
+instance/relatorios. O ficheiro fica em cache por período (inicio, fim)
+até entrar um novo pagamento nesse intervalo.
+
+As tarefas terminadas não ficam para sempre: saem (e o PDF é apagado)
+ao fim de RELATORIOS_PDF_TTL segundos sem serem consultadas, e nunca há
+mais de RELATORIOS_PDF_MAX terminadas; acima disso sai a consultada há
+mais tempo (LRU).
+'''
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app.relatorios.services import exportar_pdf, assinatura_periodo
+
+PENDENTE = 'pendente'
+EM_CURSO = 'em_curso'
+CONCLUIDA = 'concluida'
+ERRO = 'erro'
+
+# valores por omissão de RELATORIOS_PDF_TTL (segundos) e RELATORIOS_PDF_MAX
+PDF_TTL = 3600
+PDF_MAX = 32
+
+# poucas threads: a geração de PDF é pesada em CPU e não deve
+# competir com os pedidos web
+_executor = ThreadPoolExecutor(max_workers=2,
+                               thread_name_prefix='relatorio-pdf')
+_lock = Lock()
+_tarefas: Dict[str, 'TarefaRelatorio'] = {}
+# (inicio, fim) -> id da última tarefa gerada para o período
+_cache: Dict[Tuple[str, str], str] = {}
+
+
+@dataclass
+class TarefaRelatorio:
+    id: str
+    inicio: datetime
+    fim: datetime
+    assinatura: Tuple[int, int, str]
+    estado: str = PENDENTE
+    caminho: Optional[str] = None
+    erro: Optional[str] = None
+    criada_em: datetime = field(
+        default_factory=lambda: datetime.now(timezone.utc))
+    acedida_em: datetime = field(
+        default_factory=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            'tarefa_id': self.id,
+            'estado': self.estado,
+            'inicio': self.inicio.isoformat(),
+            'fim': self.fim.isoformat(),
+            'erro': self.erro,
+        }
+
+
+def _pasta_relatorios():
+    pasta = os.path.join(current_app.instance_path, 'relatorios')
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _remover_ficheiro(caminho: Optional[str]) -> None:
+    if caminho and os.path.exists(caminho):
+        os.remove(caminho)
+
+
+def _descartar_antigas(agora: datetime) -> List['TarefaRelatorio']:
+    '''
+    Retira do registo (chamar com _lock) as tarefas terminadas há mais de
+    RELATORIOS_PDF_TTL sem consultas e, acima de RELATORIOS_PDF_MAX, as
+    consultadas há mais tempo. Devolve-as para se apagarem os ficheiros.
+    '''
+    ttl = current_app.config.get('RELATORIOS_PDF_TTL', PDF_TTL)
+    maximo = current_app.config.get('RELATORIOS_PDF_MAX', PDF_MAX)
+
+    # as que estão em curso não saem: a thread ainda vai escrever o ficheiro
+    terminadas = sorted((t for t in _tarefas.values() if t.estado in (CONCLUIDA, ERRO)),
+                        key=lambda t: t.acedida_em)
+    excesso = max(0, len(terminadas) - maximo)
+    descartadas = [t for n, t in enumerate(terminadas)
+                   if n < excesso or (agora - t.acedida_em).total_seconds() > ttl]
+
+    for tarefa in descartadas:
+        del _tarefas[tarefa.id]
+        chave = (tarefa.inicio.isoformat(), tarefa.fim.isoformat())
+        if _cache.get(chave) == tarefa.id:
+            del _cache[chave]
+    return descartadas
+
+
+def _gerar(aplicacao, tarefa: TarefaRelatorio):
+    with aplicacao.app_context():
+        tarefa.estado = EM_CURSO
+        caminho = os.path.join(_pasta_relatorios(), f'{tarefa.id}.pdf')
+        try:
+            exportar_pdf(tarefa.inicio, tarefa.fim, destino=caminho)
+            tarefa.caminho = caminho
+            tarefa.acedida_em = datetime.now(timezone.utc)
+            tarefa.estado = CONCLUIDA
+            with _lock:
+                descartada = tarefa.id not in _tarefas
+            if descartada:
+                # substituída ou descartada enquanto era gerada
+                _remover_ficheiro(caminho)
+        except Exception as erro:
+            tarefa.erro = str(erro)
+            tarefa.estado = ERRO
+            aplicacao.logger.error(
+                f'Falha ao gerar relatório PDF {tarefa.id}: {erro}')
+
+
+def iniciar_exportacao_pdf(inicio: datetime, fim: datetime) -> TarefaRelatorio:
+    '''
+    Devolve a tarefa que gera o PDF do período.
+
+    Se já existir uma tarefa para o mesmo período e não tiver entrado
+    nenhum pagamento novo desde então, reutiliza-a (em curso ou concluída);
+    caso contrário agenda uma nova geração.
+    '''
+    chave = (inicio.isoformat(), fim.isoformat())
+    assinatura = assinatura_periodo(inicio, fim)
+    agora = datetime.now(timezone.utc)
+
+    with _lock:
+        descartadas = _descartar_antigas(agora)
+        anterior = _tarefas.get(_cache.get(chave, ''))
+        if anterior and anterior.assinatura == assinatura and anterior.estado != ERRO:
+            anterior.acedida_em = agora
+            tarefa = anterior
+        else:
+            if anterior:
+                # o ficheiro antigo ficou desactualizado
+                _tarefas.pop(anterior.id, None)
+                descartadas.append(anterior)
+
+            tarefa = TarefaRelatorio(id=uuid.uuid4().hex, inicio=inicio,
+                                     fim=fim, assinatura=assinatura)
+            _tarefas[tarefa.id] = tarefa
+            _cache[chave] = tarefa.id
+
+    for antiga in descartadas:
+        _remover_ficheiro(antiga.caminho)
+    if tarefa is anterior:
+        return tarefa
+
+    aplicacao = current_app._get_current_object()  # type: ignore
+    _executor.submit(_gerar, aplicacao, tarefa)
+    return tarefa
+
+
+def obter_tarefa(tarefa_id: str) -> Optional[TarefaRelatorio]:
+    '''Devolve a tarefa com o id indicado, ou None.'''
+    tarefa = _tarefas.get(tarefa_id)
+    if tarefa is not None:
+        tarefa.acedida_em = datetime.now(timezone.utc)
+    return tarefa
@@ -1,8 +1,8 @@
-from flask import Blueprint, request, flash, redirect, url_for, render_template, abort
+from flask import Blueprint, current_app, request, flash, redirect, url_for, render_template, abort
 from flask_login import login_required, current_user
 from app.utilizadores.services import Utilizador
 from app.utilizadores.models import PerfilEnum
-from app.pagamentos.services import get_pag_por_utilizador, get_pag_recentes
+from app.pagamentos.services import paginar_pag_por_utilizador, get_pag_recentes, get_resumo_utilizador
 
 utilizadores_bp = Blueprint(
     'utilizadores', __name__, template_folder='templates')
@@ -26,14 +26,26 @@ def alterar_perfil(utilizador_id):
 @utilizadores_bp.route('/<int:id>/pagamentos')
 @login_required
 def listar_pagamentos(id):
-    if current_user != id or not current_user.is_admin():
+    if current_user.id != id and not current_user.is_admin:
         abort(403)
-    pagamentos = get_pag_por_utilizador(id)
-    return render_template('utilizadores/pagamentos.html', pagamentos=pagamentos)
+
+    por_pagina = request.args.get(
+        'por_pagina', type=int,
+        default=current_app.config.get('PAGAMENTOS_POR_PAGINA', 20))
+    try:
+        pagina = paginar_pag_por_utilizador(
+            id, cursor=request.args.get('cursor'), por_pagina=por_pagina)
+    except ValueError:
+        abort(400)
+
+    return render_template('pagamentos.html', pagamentos=pagina.itens,
+                           pagina=pagina, utilizador_id=id, por_pagina=por_pagina)
 
 
 @utilizadores_bp.route('/<int:id>/painel')
 @login_required
 def painel_aluno(id):
     pagamentos_recentes = get_pag_recentes(id)
-    return render_template('painel_aluno.html', pagamentos_recentes=pagamentos_recentes)
+    resumo = get_resumo_utilizador(id)
+    return render_template('painel_aluno.html', pagamentos_recentes=pagamentos_recentes,
+                           resumo=resumo)
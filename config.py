@@ -47,6 +47,47 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     DEV_DATABASE_URI = os.getenv('DEV_DATABASE_URI')
 
+    # Configurar a cache dos relatórios (segundos / número de entradas)
+    RELATORIOS_CACHE_ACTIVO = True
+    RELATORIOS_CACHE_TTL = int(os.getenv('RELATORIOS_CACHE_TTL', '300'))
+    RELATORIOS_CACHE_MAX = int(os.getenv('RELATORIOS_CACHE_MAX', '512'))
+
+    # Relatórios PDF gerados em segundo plano: segundos sem consultas até
+    # serem apagados e número máximo de ficheiros guardados
+    RELATORIOS_PDF_TTL = int(os.getenv('RELATORIOS_PDF_TTL', '3600'))
+    RELATORIOS_PDF_MAX = int(os.getenv('RELATORIOS_PDF_MAX', '32'))
+
+    # Pagamentos por página no histórico de cada utilizador
+    PAGAMENTOS_POR_PAGINA = int(os.getenv('PAGAMENTOS_POR_PAGINA', '20'))
+
+    # Histórico dos pagamentos gravado em lote, fora da transacção do pagamento
+    HISTORICO_OUTBOX_ACTIVO = os.getenv(
+        'HISTORICO_OUTBOX_ACTIVO', 'False').lower() in ['true', 't', '1']
+    HISTORICO_OUTBOX_LOTE = int(os.getenv('HISTORICO_OUTBOX_LOTE', '200'))
+    HISTORICO_OUTBOX_INTERVALO = float(
+        os.getenv('HISTORICO_OUTBOX_INTERVALO', '1.0'))
+    HISTORICO_OUTBOX_TENTATIVAS = int(
+        os.getenv('HISTORICO_OUTBOX_TENTATIVAS', '3'))
+
+    # Geração das mensalidades (valor por inscrição activa e dia de vencimento)
+    MENSALIDADE_VALOR = os.getenv('MENSALIDADE_VALOR', '50.00')
+    MENSALIDADE_DIA_VENCIMENTO = int(
+        os.getenv('MENSALIDADE_DIA_VENCIMENTO', '8'))
+
+    # Meses à frente com tarifas diárias do hotel já calculadas
+    HOTEL_TARIFAS_MESES = int(os.getenv('HOTEL_TARIFAS_MESES', '12'))
+
+    # Minutos para pagar uma reserva do hotel antes de o quarto ser libertado
+    # (0 = as reservas ficam logo confirmadas)
+    HOTEL_PRAZO_PAGAMENTO_MINUTOS = int(
+        os.getenv('HOTEL_PRAZO_PAGAMENTO_MINUTOS', '0'))
+    # Libertação automática (reservas expiradas e checkouts) numa thread
+    HOTEL_LIBERTACAO_ACTIVA = os.getenv(
+        'HOTEL_LIBERTACAO_ACTIVA', 'False').lower() in ['true', 't', '1']
+    HOTEL_LIBERTACAO_INTERVALO = float(
+        os.getenv('HOTEL_LIBERTACAO_INTERVALO', '300'))
+    HOTEL_LIBERTACAO_LOTE = int(os.getenv('HOTEL_LIBERTACAO_LOTE', '500'))
+
     # Configurar ambiente
     DEBUG = True
 
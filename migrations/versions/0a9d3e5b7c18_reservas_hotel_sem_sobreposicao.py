@@ -0,0 +1,49 @@
+"""impedir reservas de hotel sobrepostas no mesmo quarto
+
+Revision ID: 0a9d3e5b7c18
+Revises: f1b7c0d94e62
+Create Date: 2025-11-26 15:02:31.118934
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0a9d3e5b7c18'
+down_revision = 'f1b7c0d94e62'
+branch_labels = None
+depends_on = None
+
+SOBREPOSICAO_SQLITE = (
+    'SELECT 1 FROM reservas_hotel r WHERE r.quarto_id = NEW.quarto_id '
+    'AND r.data_checkin < NEW.data_checkout '
+    'AND r.data_checkout > NEW.data_checkin')
+
+
+def upgrade():
+    # as reservas já existentes não podem estar sobrepostas; corrigir antes
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        op.execute(
+            'ALTER TABLE reservas_hotel ADD CONSTRAINT ex_reservas_hotel_sobreposicao '
+            'EXCLUDE USING gist (quarto_id WITH =, '
+            'daterange(data_checkin, data_checkout) WITH &&)')
+    else:
+        op.execute(
+            'CREATE TRIGGER tr_reservas_hotel_sobreposicao_ins '
+            'BEFORE INSERT ON reservas_hotel '
+            f'WHEN EXISTS ({SOBREPOSICAO_SQLITE}) '
+            "BEGIN SELECT RAISE(ABORT, 'reserva sobreposta'); END")
+        op.execute(
+            'CREATE TRIGGER tr_reservas_hotel_sobreposicao_upd '
+            'BEFORE UPDATE OF quarto_id, data_checkin, data_checkout ON reservas_hotel '
+            f'WHEN EXISTS ({SOBREPOSICAO_SQLITE} AND r.id != NEW.id) '
+            "BEGIN SELECT RAISE(ABORT, 'reserva sobreposta'); END")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE reservas_hotel DROP CONSTRAINT ex_reservas_hotel_sobreposicao')
+    else:
+        op.execute('DROP TRIGGER IF EXISTS tr_reservas_hotel_sobreposicao_upd')
+        op.execute('DROP TRIGGER IF EXISTS tr_reservas_hotel_sobreposicao_ins')
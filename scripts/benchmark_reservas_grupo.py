@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Benchmark das reservas de grupo do hotel.
+
+Compara reservar N quartos (50 por omissão) quarto a quarto, com
+reservar_quarto (uma transacção por quarto), com reservar_grupo (uma
+consulta de disponibilidade, um INSERT em lote e um commit para o grupo).
+
+Corre numa base SQLite temporária, sem tocar na base de desenvolvimento:
+
+    python scripts/benchmark_reservas_grupo.py [--quartos 50] [--grupos 20]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+# ver scripts/check_mappers.py: a raiz do projecto tem de estar no sys.path
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+PASTA = tempfile.mkdtemp(prefix='benchmark_hotel_')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['TEST_DATABASE_URI'] = f'sqlite:///{os.path.join(PASTA, "hotel.db")}'
+
+from app.app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+
+def preparar(numero_quartos):
+    from app.academia import models as _academia  # noqa: F401
+    from app.hotel.models import Quarto, TipoQuarto
+    from app.utilizadores.models import PerfilEnum, Utilizador
+
+    db.create_all()
+    cliente = Utilizador(nome='Grupo', sobrenome='Benchmark',  # type: ignore
+                         email='grupo@example.com', telefone='900000000',  # type: ignore
+                         perfil=PerfilEnum.cliente,  # type: ignore
+                         data_nascimento=date(1990, 1, 1))  # type: ignore
+    cliente.definir_senha('benchmark')
+    db.session.add(cliente)
+    db.session.add_all(
+        Quarto(numero=str(1000 + n), tipo=TipoQuarto.standard,  # type: ignore
+               preco_diaria=Decimal(40 + n % 10), capacidade=2)  # type: ignore
+        for n in range(numero_quartos))
+    db.session.commit()
+    return cliente.id, [q.id for q in db.session.query(Quarto).order_by(Quarto.id)]
+
+
+def medir(nome, grupos, reservar):
+    inicio = time.perf_counter()
+    for g in range(grupos):
+        checkin = date(2035, 1, 1) + timedelta(days=3 * g)
+        reservar(checkin, checkin + timedelta(days=2))
+    duracao = time.perf_counter() - inicio
+    return nome, duracao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quartos', type=int, default=50)
+    parser.add_argument('--grupos', type=int, default=20)
+    args = parser.parse_args()
+
+    from app.hotel.models import ReservaHotel
+    from app.hotel.services import reservar_grupo, reservar_quarto
+
+    app = create_app('teste')
+    with app.app_context():
+        cliente_id, quarto_ids = preparar(args.quartos)
+
+        def um_a_um(checkin, checkout):
+            for quarto_id in quarto_ids:
+                assert reservar_quarto(cliente_id, quarto_id, checkin, checkout)
+
+        def em_grupo(checkin, checkout):
+            # períodos deslocados para não colidir com os do teste anterior
+            checkin, checkout = checkin + timedelta(days=1000), checkout + timedelta(days=1000)
+            resultado = reservar_grupo(cliente_id, checkin, checkout,
+                                       quarto_ids=quarto_ids)
+            assert 'erro' not in resultado, resultado
+
+        resultados = [medir('reservar_quarto x N', args.grupos, um_a_um),
+                      medir('reservar_grupo', args.grupos, em_grupo)]
+
+        total = db.session.query(ReservaHotel).count()
+        assert total == 2 * args.grupos * args.quartos
+        motor = db.engine.url.get_backend_name()
+
+    print(f'{args.grupos} grupos de {args.quartos} quartos ({motor})')
+    for nome, duracao in resultados:
+        reservas = args.grupos * args.quartos
+        print(f'  {nome:<22} {duracao:7.2f}s  {reservas / duracao:8.0f} reservas/s  '
+              f'{duracao / args.grupos * 1000:7.1f} ms/grupo')
+
+
+if __name__ == '__main__':
+    main()
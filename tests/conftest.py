@@ -0,0 +1,67 @@
+import os
+from datetime import date
+
+import pytest
+
+# a configuração de produção exige SECRET_KEY ao importar config.py
+os.environ.setdefault('SECRET_KEY', 'chave-de-testes')
+os.environ.setdefault('TEST_DATABASE_URI', 'sqlite://')
+
+from app.app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    # o objecto Admin é global, por isso a aplicação é criada uma única vez
+    aplicacao = create_app('teste')
+
+    # garantir que todos os mappers estão registados antes do create_all
+    from app.academia import models as _academia  # noqa: F401
+    from app.hotel import models as _hotel  # noqa: F401
+    from app.pagamentos import models as _pagamentos  # noqa: F401
+    from app.publico import models as _publico  # noqa: F401
+
+    return aplicacao
+
+
+@pytest.fixture
+def base_dados(app):
+    from app.relatorios.cache import cache_relatorios
+    from app.hotel.cache import cache_hotel
+
+    with app.app_context():
+        cache_relatorios.limpar()
+        cache_hotel.limpar()
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def utilizador(base_dados):
+    from app.utilizadores.models import Utilizador, PerfilEnum
+
+    user = Utilizador(
+        nome='Ana',  # type: ignore
+        sobrenome='Silva',  # type: ignore
+        email='ana@example.com',  # type: ignore
+        telefone='923000000',  # type: ignore
+        perfil=PerfilEnum.cliente,  # type: ignore
+        data_nascimento=date(1990, 1, 1),  # type: ignore
+    )
+    user.definir_senha('segredo')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def cliente(app, utilizador):
+    '''Cliente de testes com o utilizador já autenticado.'''
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao['_user_id'] = str(utilizador.id)
+        sessao['_fresh'] = True
+    return cliente
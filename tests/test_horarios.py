@@ -0,0 +1,119 @@
+from datetime import time
+
+import pytest
+
+from app.academia.horarios import (
+    ArvoreIntervalos, HorarioSobreposto, IndiceHorarios, relatorio_conflitos)
+from app.academia.models import DiaSemanaEnum, Horario, Turma
+from app.extensions import db
+
+SEGUNDA = DiaSemanaEnum.segunda
+
+
+@pytest.fixture
+def turmas(base_dados):
+    # professor 1: turmas A e B; professor 2: turma C
+    lista = [Turma(nome=nome, professor_id=professor,  # type: ignore
+                   tipo_treino_id=1, categoria_idade_id=1)  # type: ignore
+             for nome, professor in (('A', 1), ('B', 1), ('C', 2))]
+    db.session.add_all(lista)
+    db.session.commit()
+    return lista
+
+
+def horario(turma, inicio, fim, dia=SEGUNDA):
+    return Horario(turma_id=turma.id, dia_semana=dia,  # type: ignore
+                   hora_inicio=time(*inicio), hora_fim=time(*fim))  # type: ignore
+
+
+def test_arvore_intervalos():
+    arvore = ArvoreIntervalos([(0, 10, 1), (5, 30, 2), (12, 15, 3),
+                               (20, 25, 4), (40, 50, 5)])
+    assert sorted(arvore.sobrepostos(10, 12)) == [2]
+    assert sorted(arvore.sobrepostos(14, 21)) == [2, 3, 4]
+    assert arvore.sobrepostos(30, 40) == []
+    assert sorted(arvore.sobrepostos(0, 100)) == [1, 2, 3, 4, 5]
+
+
+def test_gravar_horario_sobreposto_e_recusado(turmas):
+    a, b, c = turmas
+    db.session.add_all([horario(a, (9,), (10,)), horario(b, (10,), (11,)),
+                        horario(c, (9, 30), (10, 30))])
+    db.session.commit()
+
+    # mesmo professor, mesmo dia, a meio de outra aula
+    db.session.add(horario(b, (9, 30), (10, 30)))
+    with pytest.raises(HorarioSobreposto) as erro:
+        db.session.commit()
+    assert {c.outro_id for c in erro.value.conflitos} == {1, 2}
+    db.session.rollback()
+
+    # outro dia, ou uma aula inactiva, não colidem
+    db.session.add(horario(b, (9, 30), (10, 30), dia=DiaSemanaEnum.terca))
+    db.session.add(Horario(turma_id=b.id, dia_semana=SEGUNDA, activo=False,  # type: ignore
+                           hora_inicio=time(9), hora_fim=time(11)))  # type: ignore
+    db.session.commit()
+
+    # dois horários novos em conflito entre si, na mesma gravação
+    db.session.add_all([horario(a, (14,), (15,)), horario(b, (14, 30), (15, 30))])
+    with pytest.raises(HorarioSobreposto):
+        db.session.commit()
+    db.session.rollback()
+
+    with pytest.raises(ValueError):
+        db.session.add(horario(a, (18,), (17,)))
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_mudar_professor_ou_reactivar_turma_valida_horarios(turmas):
+    a, b, c = turmas
+    db.session.add_all([horario(a, (9,), (10,)), horario(c, (9, 30), (10, 30))])
+    db.session.commit()
+
+    # a turma C passa para o professor 1, que já dá a turma A às 9:00
+    c.professor_id = 1
+    with pytest.raises(HorarioSobreposto):
+        db.session.commit()
+    db.session.rollback()
+    assert relatorio_conflitos() == []
+
+    # reactivar uma turma cujo horário colide com outra do mesmo professor
+    c.activo = False
+    db.session.commit()
+    c.professor_id = 1
+    db.session.commit()
+    c.activo = True
+    with pytest.raises(HorarioSobreposto):
+        db.session.commit()
+    db.session.rollback()
+
+    # mudar para um professor livre a essa hora é aceite
+    c.professor_id = 3
+    db.session.commit()
+    assert relatorio_conflitos() == []
+
+
+def test_relatorio_de_conflitos_do_horario(turmas):
+    a, b, c = turmas
+    db.session.add_all([horario(a, (9,), (10,)), horario(c, (9,), (10,))])
+    db.session.commit()
+    # horários antigos, gravados sem a validação (ex.: importados)
+    db.session.execute(Horario.__table__.insert(), [
+        {'turma_id': b.id, 'dia_semana': 'segunda', 'activo': True,
+         'hora_inicio': time(9, 45), 'hora_fim': time(11)},
+        {'turma_id': b.id, 'dia_semana': 'segunda', 'activo': True,
+         'hora_inicio': time(10, 30), 'hora_fim': time(12)},
+    ])
+    db.session.commit()
+
+    conflitos = relatorio_conflitos()
+    assert [(c.horario_id, c.outro_id) for c in conflitos] == [(1, 3), (3, 4)]
+    assert IndiceHorarios.carregar([2]).conflitos(2, SEGUNDA, time(8), time(9)) == []
+
+
+def test_comando_validar_horarios(app, turmas):
+    a, _, _ = turmas
+    db.session.add(horario(a, (9,), (10,)))
+    db.session.commit()
+    assert app.test_cli_runner().invoke(args=['validar-horarios']).exit_code == 0
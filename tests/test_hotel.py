@@ -0,0 +1,391 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app.extensions import db
+from app.hotel.models import Quarto, ReservaHotel, TipoQuarto
+
+
+@pytest.fixture
+def quartos(base_dados):
+    lista = [
+        Quarto(numero=str(100 + n), tipo=TipoQuarto.standard,  # type: ignore
+               preco_diaria=Decimal('40.00'), capacidade=2)  # type: ignore
+        for n in range(1, 4)
+    ]
+    db.session.add_all(lista)
+    db.session.commit()
+    return lista
+
+
+def reservar(utilizador, quarto, checkin, checkout):
+    reserva = ReservaHotel(cliente_id=utilizador.id, quarto_id=quarto.id,  # type: ignore
+                           data_checkin=checkin, data_checkout=checkout,  # type: ignore
+                           total=Decimal('0'))  # type: ignore
+    db.session.add(reserva)
+    db.session.commit()
+    return reserva
+
+
+def test_quartos_livres_por_datas(utilizador, quartos):
+    from app.hotel.disponibilidade import quartos_livres, quarto_livre
+
+    reservar(utilizador, quartos[0], date(2030, 3, 10), date(2030, 3, 13))
+
+    livres = {q.numero for q in quartos_livres(date(2030, 3, 12), date(2030, 3, 14))}
+    assert livres == {'102', '103'}
+    # o checkout liberta o quarto nesse mesmo dia
+    assert quarto_livre(quartos[0].id, date(2030, 3, 13), date(2030, 3, 15))
+    assert quarto_livre(quartos[0].id, date(2030, 3, 5), date(2030, 3, 10))
+    assert not quarto_livre(quartos[0].id, date(2030, 3, 1), date(2030, 3, 20))
+
+    with pytest.raises(ValueError):
+        quartos_livres(date(2030, 3, 12), date(2030, 3, 12))
+
+
+def test_criar_reserva_nao_bloqueia_outras_datas(utilizador, quartos):
+    from app.hotel.services import criar_reserva
+
+    primeira = criar_reserva(utilizador.id, quartos[0].id,
+                             date(2030, 5, 1), date(2030, 5, 4))
+    assert primeira is not None and primeira.total == Decimal('120.00')
+    assert criar_reserva(utilizador.id, quartos[0].id,
+                         date(2030, 5, 3), date(2030, 5, 5)) is None
+    assert criar_reserva(utilizador.id, quartos[0].id,
+                         date(2030, 5, 4), date(2030, 5, 6)) is not None
+    assert db.session.get(Quarto, quartos[0].id).disponivel
+
+
+def test_indice_reservas_em_memoria(utilizador, quartos):
+    from app.hotel.disponibilidade import IndiceReservas
+
+    a = reservar(utilizador, quartos[0], date(2030, 3, 2), date(2030, 3, 4))
+    b = reservar(utilizador, quartos[0], date(2030, 3, 6), date(2030, 3, 9))
+    reservar(utilizador, quartos[1], date(2030, 4, 1), date(2030, 4, 3))
+
+    indice = IndiceReservas.carregar(date(2030, 3, 1), date(2030, 3, 11))
+
+    assert indice.livre(quartos[0].id, date(2030, 3, 4), date(2030, 3, 6))
+    assert not indice.livre(quartos[0].id, date(2030, 3, 3), date(2030, 3, 5))
+    assert not indice.livre(quartos[0].id, date(2030, 3, 8), date(2030, 3, 10))
+    assert indice.livre(quartos[1].id, date(2030, 3, 1), date(2030, 3, 11))
+    assert indice.ocupacao(quartos[0].id) == [
+        None, a.id, a.id, None, None, b.id, b.id, b.id, None, None]
+
+
+def test_rota_index_hotel(cliente, quartos):
+    resposta = cliente.get('/hotel/?checkin=2030-03-01&checkout=2030-03-03')
+
+    assert resposta.status_code == 200
+    assert b'101' in resposta.data
+
+
+def test_base_dados_recusa_reserva_sobreposta(utilizador, quartos):
+    from sqlalchemy.exc import IntegrityError
+
+    reservar(utilizador, quartos[0], date(2030, 6, 1), date(2030, 6, 5))
+    with pytest.raises(IntegrityError):
+        reservar(utilizador, quartos[0], date(2030, 6, 4), date(2030, 6, 6))
+    db.session.rollback()
+
+
+@pytest.fixture
+def base_dados_ficheiro(app, tmp_path, monkeypatch):
+    '''
+    Base de dados SQLite em ficheiro: a base em memória dos outros testes
+    usa uma única ligação partilhada, que não permite transacções paralelas.
+    '''
+    from sqlalchemy import create_engine
+
+    motor = create_engine(f'sqlite:///{tmp_path / "hotel.db"}',
+                          connect_args={'timeout': 30})
+    with app.app_context():
+        monkeypatch.setitem(db._app_engines[app], None, motor)
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+    motor.dispose()
+
+
+def test_reservas_concorrentes_apenas_uma_por_periodo(app, base_dados_ficheiro):
+    from concurrent.futures import ThreadPoolExecutor
+    from threading import Barrier
+    from app.hotel.services import reservar_quarto
+    from app.utilizadores.models import PerfilEnum, Utilizador
+
+    cliente = Utilizador(nome='Rui', sobrenome='Lopes',  # type: ignore
+                         email='rui@example.com', telefone='923111111',  # type: ignore
+                         perfil=PerfilEnum.cliente,  # type: ignore
+                         data_nascimento=date(1985, 2, 2))  # type: ignore
+    cliente.definir_senha('segredo')
+    db.session.add(cliente)
+    db.session.add_all([
+        Quarto(numero=n, tipo=TipoQuarto.suite,  # type: ignore
+               preco_diaria=Decimal('80.00'), capacidade=2)  # type: ignore
+        for n in ('201', '202')])
+    db.session.commit()
+    cliente_id = cliente.id
+    q1, q2 = [q.id for q in db.session.query(Quarto).order_by(Quarto.numero)]
+
+    # 8 pedidos sobrepostos para cada quarto, e um período disjunto no 1.º
+    pedidos = ([(q1, date(2030, 7, 1 + n % 3), date(2030, 7, 5)) for n in range(8)]
+               + [(q2, date(2030, 7, 2), date(2030, 7, 4 + n % 2)) for n in range(8)]
+               + [(q1, date(2030, 7, 10), date(2030, 7, 12))])
+    barreira = Barrier(len(pedidos))
+
+    def tentar(pedido):
+        with app.app_context():
+            barreira.wait()
+            reserva = reservar_quarto(cliente_id, *pedido)
+            return reserva.quarto_id if reserva else None
+
+    with ThreadPoolExecutor(max_workers=len(pedidos)) as executor:
+        resultados = list(executor.map(tentar, pedidos))
+
+    assert sorted(r for r in resultados if r) == [q1, q1, q2]
+    assert db.session.query(ReservaHotel).count() == 3
+
+
+def test_calendario_ocupacao(utilizador, quartos):
+    from app.hotel.calendario import calendario_ocupacao
+    from app.hotel.services import reservar_quarto
+
+    a = reservar(utilizador, quartos[0], date(2030, 2, 27), date(2030, 3, 3))
+    b = reservar(utilizador, quartos[1], date(2030, 3, 4), date(2030, 3, 9))
+
+    calendario = calendario_ocupacao(date(2030, 3, 1), date(2030, 3, 6))
+
+    assert calendario['dias'][0] == '2030-03-01'
+    assert [q['reservas'] for q in calendario['quartos']] == [
+        [a.id, a.id, None, None, None],
+        [None, None, None, b.id, b.id],
+        [None] * 5,
+    ]
+    assert calendario['taxa_ocupacao'] == [0.3333, 0.3333, 0.0, 0.3333, 0.3333]
+
+    # a nova reserva invalida o calendário em cache
+    c = reservar_quarto(utilizador.id, quartos[2].id, date(2030, 3, 3), date(2030, 3, 4))
+    calendario = calendario_ocupacao(date(2030, 3, 1), date(2030, 3, 6))
+    assert calendario['quartos'][2]['reservas'][2] == c.id
+    assert calendario['noites_ocupadas'] == 5
+
+
+def test_rota_calendario_apenas_administrador(cliente, utilizador, quartos):
+    from app.utilizadores.models import PerfilEnum
+
+    assert cliente.get('/hotel/calendario').status_code == 403
+
+    utilizador.perfil = PerfilEnum.administrador
+    db.session.commit()
+    resposta = cliente.get('/hotel/calendario?inicio=2030-03-01&fim=2030-03-08')
+    assert resposta.status_code == 200
+    assert len(resposta.get_json()['dias']) == 7
+    assert cliente.get(
+        '/hotel/calendario?inicio=2030-03-01&fim=2030-12-01').status_code == 400
+
+
+@pytest.fixture
+def inventario(base_dados):
+    precos = {TipoQuarto.standard: ('P', 40), TipoQuarto.suite: ('S', 90),
+              TipoQuarto.luxo: ('L', 150)}
+    lista = [
+        Quarto(numero=f'{prefixo}{n}', tipo=tipo,  # type: ignore
+               preco_diaria=Decimal(preco + n * 5),  # type: ignore
+               capacidade=2 + n % 3)  # type: ignore
+        for tipo, (prefixo, preco) in precos.items() for n in range(5)
+    ]
+    db.session.add_all(lista)
+    db.session.commit()
+    return lista
+
+
+def test_pesquisar_quartos_filtros_e_paginas(inventario, utilizador):
+    from app.hotel.pesquisa import FiltrosQuartos, pesquisar_quartos
+
+    filtros = FiltrosQuartos(preco_min=Decimal('45'), preco_max=Decimal('110'))
+    vistos, cursor = [], None
+    while True:
+        pagina = pesquisar_quartos(filtros, cursor=cursor, por_pagina=3)
+        vistos += [q.preco_diaria for q in pagina.itens]
+        if not pagina.tem_mais:
+            break
+        cursor = pagina.proximo_cursor
+    assert vistos == sorted(vistos)
+    assert vistos == [Decimal(p) for p in (45, 50, 55, 60, 90, 95, 100, 105, 110)]
+
+    suite = next(q for q in inventario if q.numero == 'S0')
+    reservar(utilizador, suite, date(2030, 8, 1), date(2030, 8, 3))
+    pagina = pesquisar_quartos(FiltrosQuartos(
+        tipo=TipoQuarto.suite, capacidade=3,
+        checkin=date(2030, 8, 2), checkout=date(2030, 8, 4)))
+    assert [q.numero for q in pagina.itens] == ['S1', 'S2', 'S4']
+
+
+def test_catalogo_evita_pesquisas_sem_resultados(inventario):
+    from sqlalchemy import event
+    from app.hotel.pesquisa import FiltrosQuartos, catalogo_quartos, pesquisar_quartos
+
+    catalogo = catalogo_quartos()
+    assert catalogo['luxo']['preco_min'] == Decimal('150')
+    assert catalogo['standard']['capacidade_max'] == 4
+
+    consultas = []
+
+    def contar(*args):
+        consultas.append(args)
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        pagina = pesquisar_quartos(FiltrosQuartos(tipo=TipoQuarto.standard,
+                                                  capacidade=6))
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+
+    assert pagina.itens == [] and consultas == []
+
+
+def test_catalogo_invalidado_ao_alterar_quartos(inventario):
+    from app.hotel.pesquisa import FiltrosQuartos, catalogo_quartos, pesquisar_quartos
+
+    assert catalogo_quartos()['standard']['capacidade_max'] == 4
+    filtros = FiltrosQuartos(tipo=TipoQuarto.standard, capacidade=6)
+    assert pesquisar_quartos(filtros).itens == []
+
+    novo = Quarto(numero='P9', tipo=TipoQuarto.standard,  # type: ignore
+                  preco_diaria=Decimal('70'), capacidade=6)  # type: ignore
+    db.session.add(novo)
+    db.session.commit()
+    assert [q.numero for q in pesquisar_quartos(filtros).itens] == ['P9']
+
+    novo.capacidade = 5
+    db.session.commit()
+    assert pesquisar_quartos(filtros).itens == []
+    assert catalogo_quartos()['standard']['capacidade_max'] == 5
+
+    db.session.delete(novo)
+    db.session.commit()
+    assert catalogo_quartos()['standard']['capacidade_max'] == 4
+
+
+def test_api_pesquisa_quartos(cliente, inventario):
+    resposta = cliente.get('/hotel/api/quartos?tipo=luxo&por_pagina=2')
+
+    dados = resposta.get_json()
+    assert resposta.status_code == 200
+    assert [q['numero'] for q in dados['quartos']] == ['L0', 'L1']
+    assert dados['quartos'][0]['tipo'] == 'luxo'
+    assert dados['proximo_cursor']
+    assert cliente.get('/hotel/api/quartos?tipo=castelo').status_code == 400
+    assert cliente.get('/hotel/?preco_min=60').status_code == 200
+
+
+def test_tarifas_epoca_e_fim_de_semana(quartos):
+    from app.hotel.tarifas import cotar_estadia, criar_regra_tarifa, fatores_periodo
+    from app.hotel.models import TarifaDiaria
+
+    hoje = date.today()
+    criar_regra_tarifa(nome='Fim de semana', dias_semana='45',
+                       multiplicador=Decimal('1.25'))
+    criar_regra_tarifa(nome='Época alta', tipo=TipoQuarto.standard,
+                       data_inicio=hoje, data_fim=date.fromordinal(hoje.toordinal() + 60),
+                       multiplicador=Decimal('1.5'))
+
+    assert db.session.query(TarifaDiaria).count() > 3 * 365
+
+    # próxima segunda-feira: 7 noites, sexta e sábado de fim de semana
+    segunda = date.fromordinal(hoje.toordinal() + 7 - hoje.weekday())
+    domingo = date.fromordinal(segunda.toordinal() + 7)
+    fatores = fatores_periodo(TipoQuarto.standard, segunda, domingo)
+    assert fatores.round(4).tolist() == [1.5] * 4 + [1.875, 1.875, 1.5]
+
+    # 40 × (4 × 1,5 + 2 × 1,875 + 1,5)
+    assert cotar_estadia(quartos[0], segunda, domingo) == Decimal('450.00')
+    assert fatores_periodo(TipoQuarto.suite, segunda, domingo).tolist() == \
+        [1.0] * 4 + [1.25, 1.25, 1.0]
+
+    with pytest.raises(ValueError):
+        criar_regra_tarifa(nome='Inválida', dias_semana='7', multiplicador=Decimal('2'))
+
+
+def test_tarifas_fora_do_horizonte_usam_as_regras(quartos, utilizador):
+    from app.hotel.services import reservar_quarto
+    from app.hotel.tarifas import criar_regra_tarifa
+
+    criar_regra_tarifa(nome='Natal 2040', data_inicio=date(2040, 12, 24),
+                       data_fim=date(2040, 12, 25), multiplicador=Decimal('2'))
+
+    reserva = reservar_quarto(utilizador.id, quartos[0].id,
+                              date(2040, 12, 23), date(2040, 12, 26))
+    assert reserva.total == Decimal('200.00')
+
+
+def test_reservar_grupo_tudo_ou_nada(utilizador, inventario):
+    from app.hotel.services import reservar_grupo
+
+    ids = [q.id for q in inventario[:5]]
+    periodo = (date(2031, 1, 10), date(2031, 1, 12))
+
+    resultado = reservar_grupo(utilizador.id, *periodo, quarto_ids=ids[:3])
+    assert len(resultado['reservas']) == 3
+    assert resultado['total'] == Decimal('2') * (40 + 45 + 50)
+
+    # um dos quartos já está ocupado: nenhum do grupo é reservado
+    falha = reservar_grupo(utilizador.id, *periodo, quarto_ids=ids[2:])
+    assert falha['indisponiveis'] == [ids[2]]
+    assert db.session.query(ReservaHotel).count() == 3
+
+    # por quantidade: os mais baratos ainda livres
+    resultado = reservar_grupo(utilizador.id, *periodo, quantidade=2,
+                               tipo=TipoQuarto.standard)
+    reservados = db.session.query(ReservaHotel.quarto_id).filter(
+        ReservaHotel.id.in_(resultado['reservas'])).all()
+    assert sorted(q for (q,) in reservados) == ids[3:5]
+    assert 'erro' in reservar_grupo(utilizador.id, *periodo, quantidade=1,
+                                    tipo=TipoQuarto.standard)
+
+
+def test_api_reservar_grupo(cliente, inventario):
+    pedido = {'checkin': '2031-02-01', 'checkout': '2031-02-03',
+              'quantidade': 3, 'tipo': 'suite'}
+
+    resposta = cliente.post('/hotel/api/grupos', json=pedido)
+    assert resposta.status_code == 201
+    assert len(resposta.get_json()['reservas']) == 3
+
+    assert cliente.post('/hotel/api/grupos', json=pedido).status_code == 409
+    assert cliente.post('/hotel/api/grupos', json={
+        'checkin': '2031-02-03', 'checkout': '2031-02-01', 'quantidade': 1}).status_code == 400
+
+
+def test_libertar_reservas_expiradas_e_checkouts(app, utilizador, quartos, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.hotel.disponibilidade import quarto_livre
+    from app.hotel.libertacao import libertar_quartos
+    from app.hotel.models import EstadoReservaHotel
+    from app.hotel.services import confirmar_reserva, reservar_quarto
+
+    monkeypatch.setitem(app.config, 'HOTEL_PRAZO_PAGAMENTO_MINUTOS', 30)
+    periodo = (date(2031, 6, 1), date(2031, 6, 4))
+    paga = reservar_quarto(utilizador.id, quartos[0].id, *periodo)
+    por_pagar = [reservar_quarto(utilizador.id, q.id, *periodo) for q in quartos[1:]]
+    assert por_pagar[0].estado == EstadoReservaHotel.pendente
+    assert confirmar_reserva(paga.id)
+    assert not quarto_livre(quartos[1].id, *periodo)
+
+    # dentro do prazo nada muda; depois dele, as pendentes expiram (lotes de 1)
+    assert libertar_quartos().quartos_libertados == 0
+    resultado = libertar_quartos(datetime.now(timezone.utc) + timedelta(hours=1),
+                                 tamanho_lote=1)
+    assert (resultado.expiradas, resultado.concluidas) == (2, 0)
+    assert resultado.quartos == {quartos[1].id, quartos[2].id}
+    assert not confirmar_reserva(por_pagar[0].id)
+    assert quarto_livre(quartos[1].id, *periodo)
+    assert reservar_quarto(utilizador.id, quartos[1].id, *periodo) is not None
+
+    # no dia do checkout a estadia paga fica concluída
+    resultado = libertar_quartos(datetime(2031, 6, 4, 12, tzinfo=timezone.utc))
+    assert (resultado.expiradas, resultado.concluidas) == (1, 1)
+    db.session.refresh(paga)
+    assert paga.estado == EstadoReservaHotel.concluida
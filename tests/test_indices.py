@@ -0,0 +1,63 @@
+'''
+Garante, via EXPLAIN QUERY PLAN do SQLite, que as consultas dos
+relatórios e do histórico de pagamentos usam os índices de `pagamentos`.
+'''
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from app.extensions import db
+
+
+@contextmanager
+def _capturar_sql():
+    '''Regista (sql, parâmetros) de todas as consultas executadas no bloco.'''
+    consultas = []
+
+    def registar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append((statement, parameters))
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', registar)
+    try:
+        yield consultas
+    finally:
+        event.remove(engine, 'before_cursor_execute', registar)
+
+
+def _planos(consultas):
+    conn = db.session.connection()
+    return [
+        ' '.join(str(linha[-1]) for linha in conn.exec_driver_sql(
+            f'EXPLAIN QUERY PLAN {sql}', parametros))
+        for sql, parametros in consultas
+        if 'FROM pagamentos' in sql
+    ]
+
+
+def test_resumo_estatistico_usa_indice_de_data(base_dados):
+    from app.relatorios.services import get_resumo_estatistico
+
+    with _capturar_sql() as consultas:
+        get_resumo_estatistico(datetime(2025, 1, 1), datetime(2025, 12, 31))
+
+    planos = _planos(consultas)
+    assert planos
+    assert all('ix_pagamentos_data_pagamento_valor' in p for p in planos)
+    assert all('COVERING INDEX' in p for p in planos)
+
+
+def test_historico_do_utilizador_usa_indice_composto(utilizador):
+    from app.pagamentos.services import get_pag_recentes, get_pag_por_utilizador
+
+    with _capturar_sql() as consultas:
+        get_pag_recentes(utilizador.id)
+        get_pag_por_utilizador(utilizador.id)
+
+    planos = _planos(consultas)
+    assert len(planos) == 2
+    for plano in planos:
+        assert 'ix_pagamentos_utilizador_data' in plano
+        # a ordenação vem do índice, sem ordenação temporária
+        assert 'USE TEMP B-TREE' not in plano
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, insert
+
+from app.academia.models import Inscricao
+from app.extensions import db
+from app.pagamentos.models import CobrancaMensalidade
+
+
+@pytest.fixture
+def inscricoes(base_dados):
+    linhas = [{
+        'aluno_id': 100 + i,
+        'turma_id': 1,
+        'activo': i % 5 != 0,
+        'data_inscricao': datetime(2025, 1, 10, tzinfo=timezone.utc),
+    } for i in range(25)]
+    # inscrita depois do mês: não é cobrada
+    linhas.append({'aluno_id': 999, 'turma_id': 1, 'activo': True,
+                   'data_inscricao': datetime(2025, 4, 1, tzinfo=timezone.utc)})
+    db.session.execute(insert(Inscricao), linhas)
+    db.session.commit()
+    return linhas
+
+
+def test_gerar_mensalidades_em_blocos_e_retomavel(app, inscricoes):
+    from app.pagamentos.mensalidades import gerar_mensalidades
+
+    resultado = gerar_mensalidades(2025, 3, tamanho_bloco=7)
+
+    assert resultado.inscricoes == 20
+    assert resultado.criadas == 20
+    assert resultado.blocos == 3
+    cobranca = db.session.query(CobrancaMensalidade).first()
+    assert cobranca.valor == Decimal(app.config['MENSALIDADE_VALOR'])
+    assert cobranca.data_vencimento.isoformat() == '2025-03-08'
+
+    # simular uma execução interrompida a meio
+    db.session.execute(delete(CobrancaMensalidade)
+                       .where(CobrancaMensalidade.id > 12))
+    db.session.commit()
+
+    retoma = gerar_mensalidades(2025, 3, tamanho_bloco=7)
+
+    assert retoma.criadas == 8
+    assert retoma.existentes == 12
+    assert db.session.query(CobrancaMensalidade).count() == 20
+
+
+def test_comando_gerar_mensalidades(app, inscricoes):
+    resultado = app.test_cli_runner().invoke(args=['gerar-mensalidades', '2025-03'])
+
+    assert resultado.exit_code == 0
+    assert '20 mensalidades geradas' in resultado.output
+
+    invalido = app.test_cli_runner().invoke(args=['gerar-mensalidades', '2025-13'])
+    assert invalido.exit_code != 0
@@ -0,0 +1,295 @@
+from decimal import Decimal
+
+from app.extensions import db
+from app.historico.models import HistoricoAlteracaoPerfil
+from app.pagamentos.models import Pagamento
+from app.relatorios.models import ResumoMensalPagamento
+from app.utilizadores.models import PerfilEnum
+
+
+def test_importar_pagamentos_em_lote(utilizador):
+    from app.pagamentos.services import importar_pagamentos
+
+    linhas = [
+        {'utilizador_id': str(utilizador.id), 'valor': '100',
+         'tipo_servico': 'matricula', 'metodo_pagamento': 'transferencia',
+         'data_pagamento': '2025-02-01'},
+        {'utilizador_id': str(utilizador.id), 'valor': '50.5',
+         'tipo_servico': 'mensalidade', 'metodo_pagamento': 'transferencia',
+         'data_pagamento': '2025-02-03'},
+        {'utilizador_id': '9999', 'valor': '10',
+         'tipo_servico': 'mensalidade', 'metodo_pagamento': 'dinheiro'},
+        {'utilizador_id': str(utilizador.id), 'valor': '-1',
+         'tipo_servico': 'mensalidade', 'metodo_pagamento': 'dinheiro'},
+        {'utilizador_id': str(utilizador.id), 'valor': '10',
+         'tipo_servico': 'desconhecido', 'metodo_pagamento': 'dinheiro'},
+    ]
+
+    resultado = importar_pagamentos(linhas, tamanho_lote=2)
+
+    assert resultado['importados'] == 2
+    assert resultado['rejeitados'] == 3
+    assert [n for n, _ in resultado['erros']] == [3, 4, 5]
+
+    assert db.session.query(Pagamento).count() == 2
+    assert db.session.query(HistoricoAlteracaoPerfil).count() == 2
+
+    db.session.refresh(utilizador)
+    assert utilizador.perfil == PerfilEnum.aluno
+
+    resumo = db.session.query(ResumoMensalPagamento).filter_by(
+        tipo_servico='mensalidade').one()
+    assert resumo.total == Decimal('50.50')
+
+
+def test_importacao_grava_datas_em_utc():
+    from datetime import datetime, timezone
+    from app.pagamentos.services import _validar_linha_importacao
+
+    linha = {'utilizador_id': '1', 'valor': '10', 'tipo_servico': 'mensalidade',
+             'metodo_pagamento': 'dinheiro'}
+
+    com_data, _ = _validar_linha_importacao({**linha, 'data_pagamento': '2025-02-01'})
+    assert com_data['data_pagamento'] == datetime(2025, 2, 1, tzinfo=timezone.utc)
+    com_fuso, _ = _validar_linha_importacao(
+        {**linha, 'data_pagamento': '2025-02-01T01:00:00+01:00'})
+    assert com_fuso['data_pagamento'] == datetime(2025, 2, 1, tzinfo=timezone.utc)
+    assert com_fuso['data_pagamento'].tzinfo == timezone.utc
+    sem_data, _ = _validar_linha_importacao(linha)
+    assert sem_data['data_pagamento'].tzinfo == timezone.utc
+
+
+def test_comando_importar_pagamentos(app, utilizador, tmp_path):
+    ficheiro = tmp_path / 'banco.csv'
+    ficheiro.write_text(
+        'utilizador_id,valor,tipo_servico,metodo_pagamento,data_pagamento\n'
+        f'{utilizador.id},25.00,mensalidade,transferencia,2025-03-01\n',
+        encoding='utf-8')
+
+    resultado = app.test_cli_runner().invoke(
+        args=['importar-pagamentos', str(ficheiro)])
+
+    assert '1 pagamentos importados, 0 rejeitados' in resultado.output
+
+
+def test_processar_pagamento_num_unico_commit(utilizador):
+    from sqlalchemy import event
+    from app.pagamentos.services import processar_pagamento
+
+    commits = []
+
+    def contar(sessao):
+        commits.append(sessao)
+
+    sessao = db.session()
+    event.listen(sessao, 'after_commit', contar)
+    try:
+        sucesso, _ = processar_pagamento(
+            utilizador.id, Decimal('80.00'), 'matricula', 'dinheiro', 'obs')
+    finally:
+        event.remove(sessao, 'after_commit', contar)
+
+    assert sucesso
+    assert len(commits) == 1
+    registo = db.session.query(HistoricoAlteracaoPerfil).one()
+    assert (registo.perfil_antigo, registo.perfil_novo) == ('cliente', 'aluno')
+    assert registo.dados_extra['valor'] == '80.00'
+
+
+def test_processar_pagamento_com_outbox(utilizador, monkeypatch):
+    from app.historico.outbox import outbox_historico
+    from app.pagamentos.services import processar_pagamento
+
+    monkeypatch.setattr(outbox_historico, 'activo', True)
+    # sem thread: os registos ficam na fila até drenar()
+    monkeypatch.setattr(outbox_historico, '_garantir_thread', lambda: None)
+
+    for _ in range(3):
+        processar_pagamento(utilizador.id, Decimal('10.00'),
+                            'mensalidade', 'dinheiro', None)
+
+    assert db.session.query(HistoricoAlteracaoPerfil).count() == 0
+    assert outbox_historico.drenar() == 3
+    assert db.session.query(HistoricoAlteracaoPerfil).count() == 3
+
+
+def test_outbox_repete_lote_que_falhou(utilizador, monkeypatch):
+    from app.historico.outbox import outbox_historico
+    from app.pagamentos.services import processar_pagamento
+
+    monkeypatch.setattr(outbox_historico, 'activo', True)
+    monkeypatch.setattr(outbox_historico, '_garantir_thread', lambda: None)
+    for _ in range(3):
+        processar_pagamento(utilizador.id, Decimal('10.00'),
+                            'mensalidade', 'dinheiro', None)
+
+    # a primeira escrita falha (ex.: base de dados indisponível)
+    execute = db.session.execute
+    falhas = []
+
+    def execute_falha_uma_vez(*args, **kwargs):
+        if not falhas:
+            falhas.append(args)
+            raise RuntimeError('base de dados indisponível')
+        return execute(*args, **kwargs)
+
+    monkeypatch.setattr(db.session, 'execute', execute_falha_uma_vez)
+
+    assert outbox_historico.drenar() == 3
+    assert falhas and outbox_historico.pendentes() == 0
+    assert db.session.query(HistoricoAlteracaoPerfil).count() == 3
+
+
+def test_outbox_isola_registos_invalidos(utilizador, monkeypatch):
+    from app.historico.outbox import outbox_historico
+
+    monkeypatch.setattr(outbox_historico, '_garantir_thread', lambda: None)
+    monkeypatch.setattr(outbox_historico, 'tentativas', 2)
+    base = {'utilizador_id': utilizador.id, 'perfil_antigo': 'cliente',
+            'perfil_novo': 'cliente', 'motivo': 'teste'}
+    outbox_historico.enfileirar(dict(base))
+    outbox_historico.enfileirar(dict(base, motivo=None))
+    outbox_historico.enfileirar(dict(base))
+
+    assert outbox_historico.drenar() == 2
+    assert outbox_historico.pendentes() == 0
+    assert db.session.query(HistoricoAlteracaoPerfil).count() == 2
+
+
+def test_paginacao_por_chave_do_historico(utilizador):
+    from datetime import datetime
+    from app.pagamentos.services import paginar_pag_por_utilizador
+
+    # dois pagamentos com a mesma data: o id desempata
+    for dia in (1, 2, 2, 3, 4):
+        db.session.add(Pagamento(
+            utilizador_id=utilizador.id,  # type: ignore
+            tipo_servico='mensalidade',  # type: ignore
+            valor=Decimal('10.00'),  # type: ignore
+            metodo_pagamento='dinheiro',  # type: ignore
+            data_pagamento=datetime(2025, 1, dia),  # type: ignore
+        ))
+    db.session.commit()
+
+    vistos, cursor = [], None
+    while True:
+        pagina = paginar_pag_por_utilizador(utilizador.id, cursor, por_pagina=2)
+        vistos.extend(p.id for p in pagina.itens)
+        if not pagina.tem_mais:
+            break
+        cursor = pagina.proximo_cursor
+
+    esperado = [p.id for p in db.session.query(Pagamento).order_by(
+        Pagamento.data_pagamento.desc(), Pagamento.id.desc())]
+    assert vistos == esperado
+
+
+def test_rota_listar_pagamentos(cliente, utilizador):
+    from app.pagamentos.services import processar_pagamento
+
+    for _ in range(3):
+        processar_pagamento(utilizador.id, Decimal('10.00'),
+                            'mensalidade', 'dinheiro', None)
+
+    resposta = cliente.get(f'/utilizadores/{utilizador.id}/pagamentos?por_pagina=2')
+
+    assert resposta.status_code == 200
+    assert b'cursor=' in resposta.data
+    assert cliente.get(
+        f'/utilizadores/{utilizador.id}/pagamentos?cursor=lixo').status_code == 400
+
+
+def test_resumo_do_utilizador_actualizado_por_pagamento(utilizador):
+    from app.pagamentos.services import (
+        processar_pagamento, importar_pagamentos, get_resumo_utilizador,
+        reconstruir_resumo_utilizadores)
+
+    processar_pagamento(utilizador.id, Decimal('100.00'),
+                        'matricula', 'dinheiro', None)
+    processar_pagamento(utilizador.id, Decimal('30.00'),
+                        'mensalidade', 'dinheiro', None)
+    importar_pagamentos([{
+        'utilizador_id': str(utilizador.id), 'valor': '20',
+        'tipo_servico': 'mensalidade', 'metodo_pagamento': 'dinheiro',
+        'data_pagamento': '2020-05-01'}])
+
+    resumo = get_resumo_utilizador(utilizador.id)
+
+    assert resumo['total_pago'] == Decimal('150.00')
+    assert resumo['total_ano'] == Decimal('130.00')
+    assert resumo['quantidade'] == 3
+    assert resumo['por_tipo']['mensalidade'] == 2
+    assert resumo['por_tipo']['matricula'] == 1
+
+    reconstruir_resumo_utilizadores()
+    db.session.expire_all()
+    assert get_resumo_utilizador(utilizador.id) == resumo
+
+
+def test_resumo_do_utilizador_com_datas_com_e_sem_fuso(utilizador):
+    from datetime import datetime, timezone
+    from app.pagamentos.models import TipoServicoEnum
+    from app.pagamentos.services import (
+        actualizar_resumo_utilizadores, get_resumo_utilizador, importar_pagamentos)
+
+    linha = {'utilizador_id': str(utilizador.id), 'valor': '10',
+             'tipo_servico': 'mensalidade', 'metodo_pagamento': 'dinheiro'}
+    resultado = importar_pagamentos([{**linha, 'data_pagamento': '2025-02-01'}, linha])
+    assert resultado['importados'] == 2
+    assert get_resumo_utilizador(utilizador.id)['quantidade'] == 2
+
+    # chamada directa com uma data sem fuso e outra com fuso
+    actualizar_resumo_utilizadores([
+        {'utilizador_id': utilizador.id, 'valor': Decimal('5'),
+         'tipo_servico': TipoServicoEnum.mensalidade,
+         'data_pagamento': datetime(2025, 3, 1)},
+        {'utilizador_id': utilizador.id, 'valor': Decimal('5'),
+         'tipo_servico': TipoServicoEnum.mensalidade,
+         'data_pagamento': datetime.now(timezone.utc)},
+    ])
+    db.session.commit()
+    assert get_resumo_utilizador(utilizador.id)['quantidade'] == 4
+
+
+def test_chave_idempotencia_evita_pagamento_duplicado(utilizador):
+    from app.pagamentos.services import processar_pagamento
+
+    primeiro = processar_pagamento(utilizador.id, Decimal('50.00'),
+                                   'mensalidade', 'dinheiro', None,
+                                   chave_idempotencia='abc123')
+    repetido = processar_pagamento(utilizador.id, Decimal('50.00'),
+                                   'mensalidade', 'dinheiro', None,
+                                   chave_idempotencia='abc123')
+
+    assert primeiro[0] is True
+    assert repetido == primeiro
+    assert db.session.query(Pagamento).count() == 1
+
+    outro = processar_pagamento(utilizador.id, Decimal('50.00'),
+                                'mensalidade', 'dinheiro', None,
+                                chave_idempotencia='def456')
+    assert outro[0] is True
+    assert db.session.query(Pagamento).count() == 2
+
+
+def test_chave_idempotencia_invalida_recusada(app, utilizador):
+    import pytest
+    from werkzeug.exceptions import BadRequest
+    from app.pagamentos.forms import PagamentoForm
+    from app.pagamentos.routes import ler_chave_idempotencia
+    from app.pagamentos.services import processar_pagamento
+
+    chave = 'a' * 65
+    with app.test_request_context(method='POST', headers={'Idempotency-Key': chave}):
+        with pytest.raises(BadRequest):
+            ler_chave_idempotencia(PagamentoForm(meta={'csrf': False}))
+    with app.test_request_context(method='POST', data={'chave_idempotencia': 'não válida'}):
+        with pytest.raises(BadRequest):
+            ler_chave_idempotencia(PagamentoForm(meta={'csrf': False}))
+    with app.test_request_context(method='POST', headers={
+            'Idempotency-Key': '0f9c2a1e-5b7d-4c3a-9e8f-1a2b3c4d5e6f'}):
+        assert ler_chave_idempotencia(PagamentoForm(meta={'csrf': False}))
+
+    assert processar_pagamento(utilizador.id, Decimal('5.00'), 'mensalidade',
+                               'dinheiro', None, chave_idempotencia=chave)[0] is False
+    assert db.session.query(Pagamento).count() == 0
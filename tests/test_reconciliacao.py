@@ -0,0 +1,69 @@
+import csv
+import os
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.pagamentos.models import Pagamento, TipoServicoEnum
+
+EXTRACTO = os.path.join(os.path.dirname(__file__), 'fixtures', 'extracto_banco.csv')
+
+
+@pytest.fixture
+def pagamentos(utilizador):
+    def pagamento(dia, valor, metodo):
+        return {'utilizador_id': utilizador.id,
+                'tipo_servico': TipoServicoEnum.mensalidade,
+                'valor': Decimal(valor), 'metodo_pagamento': metodo,
+                'data_pagamento': datetime(2025, 3, dia, 14, tzinfo=timezone.utc)}
+
+    linhas = [
+        pagamento(3, '100.00', 'transferencia'),  # 1
+        pagamento(3, '30.00', 'mcx'),             # 2
+        pagamento(3, '30.00', 'mcx'),             # 3
+        pagamento(5, '45.50', 'dinheiro'),        # 4: um dia antes do extracto
+        pagamento(20, '12.00', 'mcx'),            # 5: não aparece no extracto
+    ]
+    db.session.execute(insert(Pagamento), linhas)
+    db.session.commit()
+    return linhas
+
+
+def test_reconciliar_extracto(pagamentos):
+    from app.pagamentos.reconciliacao import reconciliar
+
+    with open(EXTRACTO, newline='', encoding='utf-8') as ficheiro:
+        resultado = reconciliar(csv.DictReader(ficheiro),
+                                date(2025, 3, 1), date(2025, 3, 31))
+
+    assert resultado.conciliados == [(2, 1), (3, 2), (4, 3)]
+    assert [n for n, _ in resultado.extracto_sem_pagamento] == [5, 6]
+    assert resultado.extracto_sem_pagamento[1][1]['referencia'] == 'TRF0005'
+    assert resultado.pagamentos_sem_extracto == [4, 5]
+    assert resultado.erros == [(7, 'valor inválido')]
+
+
+def test_reconciliar_com_tolerancia_de_dias(pagamentos):
+    from app.pagamentos.reconciliacao import reconciliar
+
+    with open(EXTRACTO, newline='', encoding='utf-8') as ficheiro:
+        resultado = reconciliar(csv.DictReader(ficheiro), date(2025, 3, 1),
+                                date(2025, 3, 31), tolerancia_dias=1)
+
+    assert (5, 4) in resultado.conciliados
+    assert resultado.pagamentos_sem_extracto == [5]
+
+
+def test_comando_reconciliar_pagamentos(app, pagamentos, tmp_path):
+    resultado = app.test_cli_runner().invoke(args=[
+        'reconciliar-pagamentos', EXTRACTO, '--saida', str(tmp_path)])
+
+    assert resultado.exit_code == 0, resultado.output
+    assert '3 conciliados' in resultado.output
+    # sem --inicio/--fim o período é o do extracto (3 a 10 de Março)
+    assert '1 pagamentos sem extracto' in resultado.output
+    with open(tmp_path / 'conciliados.csv', encoding='utf-8') as ficheiro:
+        assert len(ficheiro.readlines()) == 4
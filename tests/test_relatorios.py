@@ -0,0 +1,345 @@
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from app.extensions import db
+from app.pagamentos.models import Pagamento, TipoServicoEnum
+from app.relatorios.services import (
+    get_total_por_mes,
+    get_total_por_trimestre,
+    get_resumo_estatistico,
+    reconstruir_resumo_mensal,
+)
+from app.relatorios.models import ResumoMensalPagamento
+
+
+def _pagamento(utilizador, valor, data):
+    db.session.add(Pagamento(
+        utilizador_id=utilizador.id,  # type: ignore
+        tipo_servico=TipoServicoEnum.mensalidade,  # type: ignore
+        valor=Decimal(valor),  # type: ignore
+        metodo_pagamento='dinheiro',  # type: ignore
+        data_pagamento=data,  # type: ignore
+    ))
+
+
+def test_totais_por_mes_e_trimestre(utilizador):
+    _pagamento(utilizador, '100.00', datetime(2025, 1, 10))
+    _pagamento(utilizador, '50.00', datetime(2025, 1, 20))
+    _pagamento(utilizador, '30.00', datetime(2025, 5, 2))
+    _pagamento(utilizador, '999.00', datetime(2024, 12, 31))
+    db.session.commit()
+
+    assert reconstruir_resumo_mensal() == 3
+
+    assert get_total_por_mes(2025) == [
+        {'mes': 1, 'total': 150.0}, {'mes': 5, 'total': 30.0}]
+    assert get_total_por_trimestre(2025) == [
+        {'trimestre': 1, 'total': 150.0}, {'trimestre': 2, 'total': 30.0}]
+
+
+def test_resumo_estatistico(utilizador):
+    _pagamento(utilizador, '100.00', datetime(2025, 1, 10))
+    _pagamento(utilizador, '20.00', datetime(2025, 2, 10))
+    db.session.commit()
+
+    resumo = get_resumo_estatistico(datetime(2025, 1, 1), None)
+
+    assert float(resumo['total']) == 120.0
+    assert float(resumo['media']) == 60.0
+    assert float(resumo['menor']) == 20.0
+    assert float(resumo['maior']) == 100.0
+    assert resumo['quantidade'] == 2
+
+
+def test_resumo_estatistico_sem_pagamentos(base_dados):
+    assert get_resumo_estatistico(None, None)['total'] == 0
+
+
+def test_processar_pagamento_actualiza_resumo_mensal(utilizador):
+    from app.pagamentos.services import processar_pagamento
+
+    for valor in ('40.00', '10.00', '25.00'):
+        sucesso, _ = processar_pagamento(
+            utilizador.id, Decimal(valor), 'mensalidade', 'dinheiro', None)
+        assert sucesso
+
+    resumo = db.session.query(ResumoMensalPagamento).one()
+    assert resumo.quantidade == 3
+    assert resumo.total == Decimal('75.00')
+    assert resumo.menor == Decimal('10.00')
+    assert resumo.maior == Decimal('40.00')
+
+    # a reconstrução completa chega ao mesmo resultado
+    reconstruir_resumo_mensal()
+    resumo = db.session.query(ResumoMensalPagamento).one()
+    assert (resumo.quantidade, resumo.total) == (3, Decimal('75.00'))
+
+
+def test_exportar_csv_em_blocos(utilizador):
+    from app.relatorios.services import exportar_csv
+
+    for dia in range(1, 6):
+        _pagamento(utilizador, '10.00', datetime(2025, 3, dia))
+    db.session.commit()
+
+    blocos = list(exportar_csv(
+        datetime(2025, 1, 1), datetime(2025, 12, 31), tamanho_lote=2))
+    linhas = ''.join(blocos).splitlines()
+
+    assert len(blocos) == 3
+    assert linhas[0] == 'Data,Valor (Kz),Método,Serviço'
+    assert linhas[1] == '01/03/2025,10.00,dinheiro,mensalidade'
+    assert len(linhas) == 6
+
+
+def test_exportar_pdf_em_tabelas_por_bloco(utilizador):
+    from app.relatorios.services import exportar_pdf
+
+    for dia in range(1, 8):
+        _pagamento(utilizador, '10.00', datetime(2025, 3, dia))
+    db.session.commit()
+
+    pdf = exportar_pdf(datetime(2025, 1, 1), datetime(2025, 12, 31),
+                       linhas_por_tabela=3)
+
+    assert pdf.getvalue().startswith(b'%PDF')
+
+
+def test_exportar_pdf_cria_tabelas_a_medida_que_pagina(base_dados, monkeypatch):
+    from reportlab.platypus import Table
+    from app.relatorios import services
+
+    # linhas de dados de cada tabela (ou parte) desenhada
+    desenhadas = []
+    pedidos = []
+    draw_on = Table.drawOn
+
+    def contar(table, *args, **kwargs):
+        desenhadas.append(len(table._cellvalues) - table.repeatRows)
+        return draw_on(table, *args, **kwargs)
+
+    def linhas(inicio, fim, tamanho):
+        for n in range(30):
+            # linhas já desenhadas quando o bloco n é pedido
+            pedidos.append(sum(desenhadas))
+            yield [['01/03/2025', f'{n}.00', 'dinheiro', 'mensalidade']] * tamanho
+
+    monkeypatch.setattr(Table, 'drawOn', contar)
+    monkeypatch.setattr(services, '_linhas_exportacao', linhas)
+    pdf = services.exportar_pdf(datetime(2025, 1, 1), datetime(2025, 12, 31),
+                                linhas_por_tabela=7)
+
+    # cada bloco só é lido depois de desenhados todos os anteriores
+    assert pedidos == [7 * n for n in range(30)]
+    assert sum(desenhadas) == 30 * 7
+    assert pdf.getvalue().count(b'/Type /Page\n') > 1
+
+
+def _esperar(tarefa):
+    from app.relatorios import tarefas
+    for _ in range(100):
+        if tarefa.estado in (tarefas.CONCLUIDA, tarefas.ERRO):
+            break
+        time.sleep(0.05)
+    assert tarefa.estado == tarefas.CONCLUIDA, tarefa.erro
+
+
+def test_tarefas_pdf_descartadas_por_ttl_e_lru(app, utilizador, tmp_path, monkeypatch):
+    import os
+    from app.relatorios import tarefas
+
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    monkeypatch.setattr(tarefas, '_tarefas', {})
+    monkeypatch.setattr(tarefas, '_cache', {})
+    monkeypatch.setitem(app.config, 'RELATORIOS_PDF_MAX', 2)
+    _pagamento(utilizador, '10.00', datetime(2025, 3, 1))
+    db.session.commit()
+
+    geradas = []
+    for mes in (1, 2, 3):
+        geradas.append(tarefas.iniciar_exportacao_pdf(
+            datetime(2025, mes, 1), datetime(2025, mes, 28)))
+        _esperar(geradas[-1])
+    # a de Janeiro volta a ser pedida: a menos usada passa a ser a de Fevereiro
+    assert tarefas.obter_tarefa(geradas[0].id) is geradas[0]
+
+    tarefas.iniciar_exportacao_pdf(datetime(2025, 4, 1), datetime(2025, 4, 28))
+    assert tarefas.obter_tarefa(geradas[1].id) is None
+    assert not os.path.exists(geradas[1].caminho)
+    assert os.path.exists(geradas[0].caminho)
+
+    # sem consultas dentro do TTL saem todas as terminadas
+    monkeypatch.setitem(app.config, 'RELATORIOS_PDF_TTL', 0)
+    time.sleep(0.01)
+    _esperar(tarefas.iniciar_exportacao_pdf(datetime(2025, 5, 1), datetime(2025, 5, 28)))
+    tarefas.iniciar_exportacao_pdf(datetime(2025, 6, 1), datetime(2025, 6, 28))
+    assert tarefas.obter_tarefa(geradas[0].id) is None
+    assert not os.path.exists(geradas[0].caminho)
+    assert len(os.listdir(tmp_path / 'relatorios')) <= 1
+
+
+def test_exportacao_pdf_em_cache_ate_novo_pagamento(app, utilizador, tmp_path, monkeypatch):
+    from app.relatorios import tarefas
+
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    inicio, fim = datetime(2025, 1, 1), datetime(2025, 12, 31)
+    _pagamento(utilizador, '10.00', datetime(2025, 3, 1))
+    db.session.commit()
+
+    tarefa = tarefas.iniciar_exportacao_pdf(inicio, fim)
+    for _ in range(100):
+        if tarefa.estado in (tarefas.CONCLUIDA, tarefas.ERRO):
+            break
+        time.sleep(0.05)
+
+    assert tarefa.estado == tarefas.CONCLUIDA, tarefa.erro
+    assert tarefas.iniciar_exportacao_pdf(inicio, fim) is tarefa
+
+    _pagamento(utilizador, '20.00', datetime(2025, 4, 1))
+    db.session.commit()
+
+    assert tarefas.iniciar_exportacao_pdf(inicio, fim) is not tarefa
+
+
+def test_exportacao_pdf_sem_fim_reutiliza_tarefa(app, cliente, utilizador, tmp_path, monkeypatch):
+    from app.relatorios import tarefas
+
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    monkeypatch.setattr(tarefas, '_tarefas', {})
+    monkeypatch.setattr(tarefas, '_cache', {})
+    _pagamento(utilizador, '10.00', datetime.now().replace(month=1, day=1))
+    db.session.commit()
+
+    primeira = cliente.post('/perfil/exportar/pdf').get_json()
+    _esperar(tarefas.obter_tarefa(primeira['tarefa_id']))
+    segunda = cliente.post('/perfil/exportar/pdf')
+
+    assert segunda.status_code == 200
+    assert segunda.get_json()['tarefa_id'] == primeira['tarefa_id']
+    assert len(tarefas._tarefas) == 1
+
+
+def test_exportar_parquet(utilizador, tmp_path):
+    import pyarrow.parquet as pq
+    from app.relatorios.services import exportar_parquet
+
+    for dia in range(1, 6):
+        _pagamento(utilizador, '12.50', datetime(2025, 3, dia))
+    db.session.commit()
+
+    destino = tmp_path / 'pagamentos.parquet'
+    total = exportar_parquet(datetime(2025, 1, 1), datetime(2025, 12, 31),
+                             str(destino), tamanho_lote=2)
+    tabela = pq.read_table(destino)
+
+    assert total == tabela.num_rows == 5
+    assert tabela.column('perfil').to_pylist() == ['cliente'] * 5
+    assert tabela.column('tipo_servico')[0].as_py() == 'mensalidade'
+    assert float(tabela.column('valor')[0].as_py()) == 12.5
+
+
+def test_cache_invalidado_por_novo_pagamento(utilizador):
+    from app.pagamentos.services import processar_pagamento
+    from app.relatorios.cache import cache_relatorios
+
+    processar_pagamento(utilizador.id, Decimal('10.00'),
+                        'mensalidade', 'dinheiro', None)
+    ano = datetime.now().year
+
+    assert get_total_por_mes(ano)[0]['total'] == 10.0
+    assert get_total_por_mes(ano)[0]['total'] == 10.0
+    assert cache_relatorios.estatisticas()['hits'] == 1
+
+    processar_pagamento(utilizador.id, Decimal('5.00'),
+                        'mensalidade', 'dinheiro', None)
+
+    assert get_total_por_mes(ano)[0]['total'] == 15.0
+    assert cache_relatorios.estatisticas()['misses'] == 2
+
+
+def test_cache_lru_expira_e_descarta():
+    from app.relatorios.cache import CacheLRU, _AUSENTE
+
+    cache = CacheLRU(max_entradas=2, ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is _AUSENTE
+    assert cache.get('a') == 1
+    time.sleep(0.06)
+    assert cache.get('a') is _AUSENTE
+
+
+def test_api_mensal_com_etag(cliente, utilizador):
+    _pagamento(utilizador, '10.00', datetime(2025, 3, 1))
+    db.session.commit()
+    reconstruir_resumo_mensal()
+
+    resposta = cliente.get('/perfil/api/mensal?ano=2025')
+    etag = resposta.headers['ETag']
+
+    assert resposta.status_code == 200
+    assert resposta.get_json() == [{'mes': 3, 'total': 10.0}]
+
+    resposta = cliente.get('/perfil/api/mensal?ano=2025',
+                           headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+
+    _pagamento(utilizador, '5.00', datetime(2025, 3, 2))
+    db.session.commit()
+
+    resposta = cliente.get('/perfil/api/mensal?ano=2025',
+                           headers={'If-None-Match': etag})
+    assert resposta.status_code == 200
+    assert resposta.headers['ETag'] != etag
+
+
+def test_api_serie_sem_fim_responde_304(cliente, utilizador):
+    _pagamento(utilizador, '10.00', datetime.now().replace(month=1, day=1))
+    db.session.commit()
+
+    resposta = cliente.get('/perfil/api/serie?granularidade=month')
+    assert resposta.status_code == 200
+    assert resposta.get_json()['series']['total'][0] == 10.0
+
+    resposta = cliente.get('/perfil/api/serie?granularidade=month',
+                           headers={'If-None-Match': resposta.headers['ETag']})
+    assert resposta.status_code == 304
+
+
+def test_serie_temporal_diaria_preenche_periodos_vazios(utilizador):
+    from app.relatorios.services import get_serie_temporal
+
+    _pagamento(utilizador, '10.00', datetime(2025, 3, 1, 9))
+    _pagamento(utilizador, '5.00', datetime(2025, 3, 1, 18))
+    _pagamento(utilizador, '7.00', datetime(2025, 3, 3, 12))
+    db.session.commit()
+
+    serie = get_serie_temporal(
+        'day', datetime(2025, 3, 1), datetime(2025, 3, 4))
+
+    assert serie['periodos'] == [
+        '2025-03-01', '2025-03-02', '2025-03-03', '2025-03-04']
+    assert serie['series'] == {'total': [15.0, 0.0, 7.0, 0.0]}
+
+
+def test_serie_temporal_semanal_agrupada(utilizador):
+    from app.relatorios.services import get_serie_temporal
+
+    # 2025-03-05 é quarta-feira: pertence à semana de segunda 2025-03-03
+    _pagamento(utilizador, '10.00', datetime(2025, 3, 5))
+    _pagamento(utilizador, '4.00', datetime(2025, 3, 12))
+    db.session.commit()
+
+    serie = get_serie_temporal('week', datetime(2025, 3, 3),
+                               datetime(2025, 3, 16), agrupar_por='perfil')
+
+    assert serie['periodos'] == ['2025-03-03', '2025-03-10']
+    assert serie['series'] == {'cliente': [10.0, 4.0]}
+
+    trimestral = get_serie_temporal(
+        'quarter', datetime(2025, 1, 1), datetime(2025, 12, 31))
+    assert trimestral['series']['total'] == [14.0, 0.0, 0.0, 0.0]
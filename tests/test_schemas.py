@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from app.relatorios.schemas import (
+    serialize_mensais,
+    serialize_trimestrais,
+    serialize_resumo,
+)
+
+
+def test_serialize_mensais_linhas_regulares():
+    linhas = [(1, Decimal('10.50')), (2, 3)]
+
+    assert serialize_mensais(linhas) == [
+        {'mes': 1, 'total': 10.5}, {'mes': 2, 'total': 3.0}]
+
+
+def test_serialize_mensais_mapping_ordenado():
+    assert serialize_mensais({'3': 1, 1: Decimal('2')}) == [
+        {'mes': 1, 'total': 2.0}, {'mes': 3, 'total': 1.0}]
+
+
+def test_serialize_trimestrais_entradas_irregulares():
+    raw = [(1, None), {'quarter': '2', 'value': '7'}, 'lixo',
+           {'trimestre': 'x', 'total': 1}]
+
+    assert serialize_trimestrais(raw) == [
+        {'trimestre': 1, 'total': 0.0}, {'trimestre': 2, 'total': 7.0}]
+
+
+def test_serialize_iterador_usa_caminho_tolerante():
+    linhas = [(1, None), (2, 5)]
+    esperado = [{'mes': 1, 'total': 0.0}, {'mes': 2, 'total': 5.0}]
+
+    assert serialize_mensais(iter(linhas)) == esperado
+    assert serialize_mensais(linha for linha in linhas) == esperado
+    assert serialize_trimestrais(iter(linhas)) == [
+        {'trimestre': 1, 'total': 0.0}, {'trimestre': 2, 'total': 5.0}]
+
+
+def test_serialize_resumo():
+    raw = {'total': Decimal('30'), 'media': 15, 'maior': 20, 'menor': 10,
+           'quantidade': 2}
+
+    assert serialize_resumo(raw) == {
+        'total': 30.0, 'media': 15.0, 'maior': 20.0, 'menor': 10.0}
+    assert serialize_resumo({'total': None}) == {
+        'total': 0.0, 'media': 0.0, 'maior': 0.0, 'menor': 0.0}